@@ -0,0 +1,284 @@
+import functools
+import threading
+
+import numpy as np
+import pandas as pd
+
+from datastore import get_dataset
+import metrics
+
+# ---- Aggregation cube ----
+# A dense count/sum array over a few discrete dimensions, built once from the raw rows.
+# Queries slice and sum the (small) cube, so their cost depends on the number of distinct
+# dimension values and not on the number of rows.
+#
+# New rows are added with `add`, which only touches the cells (and memoized marginals) the
+# rows fall into. Labels, arrays and marginals are swapped in together as one snapshot, so
+# queries running during an update see either the old or the new data, never a mix.
+
+
+class _Snapshot:
+    def __init__(self, labels, arrays, marginals=None):
+        self.labels = labels
+        self.arrays = arrays
+        self.shape = arrays[None].shape
+        self.marginals = {} if marginals is None else marginals
+
+
+class Cube:
+    def __init__(self, df, dims, measures=()):
+        self.dims = list(dims)
+        self.measures = list(measures)
+        labels = {}
+        codes = []
+        for dim in self.dims:
+            col = df[dim]
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                labels[dim] = col.cat.categories
+                codes.append(col.cat.codes.to_numpy())
+            else:
+                labels[dim] = pd.Index(np.unique(col.to_numpy()))
+                codes.append(labels[dim].get_indexer(col))
+
+        shape = tuple(len(labels[dim]) for dim in self.dims)
+        size = int(np.prod(shape))
+        flat = np.ravel_multi_index(codes, shape)
+        # stored compactly; marginals are accumulated in 64-bit
+        arrays = {None: np.bincount(flat, minlength=size).astype(np.int32).reshape(shape)}
+        for measure in self.measures:
+            weights = df[measure].to_numpy(dtype='float64')
+            sums = np.bincount(flat, weights=weights, minlength=size)
+            arrays[measure] = sums.astype(np.float32).reshape(shape)
+        self._snapshot = _Snapshot(labels, arrays)
+        self._lock = threading.Lock()
+
+    @property
+    def labels(self):
+        return self._snapshot.labels
+
+    @property
+    def shape(self):
+        return self._snapshot.shape
+
+    def _marginal(self, snapshot, measure, keep):
+        """Array for `measure` with every axis not in `keep` summed out (memoized)."""
+        key = (measure, keep)
+        arr = snapshot.marginals.get(key)
+        metrics.cache_access('cube_marginal', arr is not None)
+        if arr is None:
+            drop = tuple(i for i, dim in enumerate(self.dims) if dim not in keep)
+            source = snapshot.arrays[measure]
+            arr = source.sum(axis=drop, dtype=np.float64 if measure else np.int64)
+            with self._lock:
+                snapshot.marginals[key] = arr
+        return arr
+
+    def _indexer(self, labels, value):
+        if isinstance(value, slice):
+            # inclusive label range on an ordered dimension
+            start = 0 if value.start is None else labels.searchsorted(value.start, side='left')
+            stop = len(labels) if value.stop is None else labels.searchsorted(value.stop, side='right')
+            return np.arange(start, stop)
+        if isinstance(value, (list, tuple, set, np.ndarray, pd.Index)):
+            idx = labels.get_indexer(list(value))
+            return idx[idx >= 0]
+        idx = labels.get_indexer([value])
+        return idx[idx >= 0]
+
+    def aggregate(self, by, measure=None, **filters):
+        """Sum `measure` (row count if None) grouped by dimension `by`.
+
+        `by` may also be a list of dimensions, giving a Series with a MultiIndex in that
+        order. Filters map dimension names to a label, a list of labels, or an inclusive
+        `slice(low, high)` of labels. Only groups that contain at least one row are returned,
+        sorted by their labels like a pandas groupby.
+        """
+        snapshot = self._snapshot
+        by_dims = [by] if isinstance(by, str) else list(by)
+        keep = tuple(dim for dim in self.dims if dim in by_dims or dim in filters)
+        counts = self._marginal(snapshot, None, keep)
+        values = counts if measure is None else self._marginal(snapshot, measure, keep)
+
+        positions = [
+            self._indexer(snapshot.labels[dim], filters[dim]) if dim in filters else np.arange(n)
+            for dim, n in zip(keep, counts.shape)
+        ]
+        index = np.ix_(*positions)
+        other = tuple(i for i, dim in enumerate(keep) if dim not in by_dims)
+        # remaining axes in the order of `by`
+        order = [sorted(by_dims, key=keep.index).index(dim) for dim in by_dims]
+        counts = counts[index].sum(axis=other).transpose(order)
+        values = values[index].sum(axis=other).transpose(order)
+
+        present = np.nonzero(counts > 0)
+        group_labels = [
+            snapshot.labels[dim][positions[keep.index(dim)][axis_positions]]
+            for dim, axis_positions in zip(by_dims, present)
+        ]
+        if isinstance(by, str):
+            index = group_labels[0]
+        else:
+            index = pd.MultiIndex.from_arrays(group_labels, names=by_dims)
+        return pd.Series(values[present], index=index, name=measure or 'Count')
+
+    def export(self, dims, measure=None):
+        """JSON-ready marginal over `dims` for clientside aggregation.
+
+        Returns the dimension order, their labels and the nested count (or `measure` sum) lists.
+        """
+        snapshot = self._snapshot
+        keep = tuple(dim for dim in self.dims if dim in dims)
+        return {
+            'dims': list(keep),
+            'labels': {dim: snapshot.labels[dim].tolist() for dim in keep},
+            'values': self._marginal(snapshot, measure, keep).tolist(),
+        }
+
+    def add(self, df):
+        """Count new rows into the cube, growing a dimension when they bring new labels.
+
+        Rows missing a dimension or measure value are skipped; returns the rows added.
+        """
+        df = df[self.dims + self.measures].dropna()
+        if df.empty:
+            return 0
+        with self._lock:
+            old = self._snapshot
+            labels = dict(old.labels)
+            codes = []
+            for dim in self.dims:
+                idx = _codes(labels[dim], df[dim])
+                if (idx < 0).any():
+                    labels[dim] = _grown(labels[dim], df[dim].to_numpy()[idx < 0])
+                    idx = _codes(labels[dim], df[dim])
+                codes.append(idx)
+
+            weights = {measure: df[measure].to_numpy(dtype='float64') for measure in self.measures}
+            if all(labels[dim] is old.labels[dim] for dim in self.dims):
+                # the usual case: same cells, update the arrays and every memoized marginal
+                flat = np.ravel_multi_index(codes, old.shape)
+                arrays = {m: _added(arr, flat, weights.get(m)) for m, arr in old.arrays.items()}
+                marginals = {}
+                for (measure, keep), arr in list(old.marginals.items()):
+                    keep_codes = [c for dim, c in zip(self.dims, codes) if dim in keep]
+                    marginals[measure, keep] = _added(
+                        arr, np.ravel_multi_index(keep_codes, arr.shape), weights.get(measure))
+                self._snapshot = _Snapshot(labels, arrays, marginals)
+            else:
+                # new labels: move the old cells into a larger grid, marginals are rebuilt lazily
+                shape = tuple(len(labels[dim]) for dim in self.dims)
+                cells = np.ix_(*[labels[dim].get_indexer(old.labels[dim]) for dim in self.dims])
+                flat = np.ravel_multi_index(codes, shape)
+                arrays = {}
+                for measure, arr in old.arrays.items():
+                    grid = np.zeros(shape, dtype=arr.dtype)
+                    grid[cells] = arr
+                    arrays[measure] = _added(grid, flat, weights.get(measure), copy=False)
+                self._snapshot = _Snapshot(labels, arrays)
+        return len(df)
+
+
+def _codes(labels, col):
+    """Position of every value of `col` in `labels`, -1 for values not in them."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        # look up each category once instead of each row
+        return labels.get_indexer(col.cat.categories)[col.cat.codes.to_numpy()]
+    return labels.get_indexer(col.to_numpy())
+
+
+def _grown(labels, values):
+    """`labels` with the distinct `values` added, kept sorted if they were sorted."""
+    merged = labels.append(pd.Index(pd.unique(values)))
+    return merged.sort_values() if labels.is_monotonic_increasing else merged
+
+
+def _added(arr, flat, weights=None, copy=True):
+    """`arr` (a copy unless `copy` is False) with `weights`, or 1 per row, added at the flat cells."""
+    out = arr.copy() if copy else arr
+    np.add.at(out.reshape(-1), flat, 1 if weights is None else weights.astype(out.dtype))
+    return out
+
+
+CUSTOMER_DIMS = ['Season', 'Gender', 'State_abbr', 'Age', 'Amount']
+
+_cubes = {}
+# cubes the pages use, built before the first rows are appended to their dataset
+_declared = set()
+_versions = {}
+_lock = threading.Lock()
+
+
+def declare(dataset, dims, measures=()):
+    """Declare (at import time) a cube that `get_cube` will be asked for.
+
+    Appended rows are not kept, so a cube has to exist before rows are appended to its
+    dataset: `append` builds the declared cubes first.
+    """
+    _declared.add((dataset, tuple(dims), tuple(measures)))
+
+
+def _build(key):
+    dataset, dims, measures = key
+    if _versions.get(dataset):
+        raise ValueError(f'cube {key} was not declared before rows were appended to {dataset}')
+    cube = _cubes[key] = Cube(get_dataset(dataset), dims, measures)
+    return cube
+
+
+def get_cube(dataset, dims, measures=()):
+    """Cube over a registered dataset, built once per process for each dims/measures pair."""
+    key = (dataset, tuple(dims), tuple(measures))
+    cube = _cubes.get(key)
+    if cube is None:
+        with _lock:
+            cube = _cubes.get(key)
+            if cube is None:
+                cube = _build(key)
+    return cube
+
+
+declare('customers', CUSTOMER_DIMS, ['Review_Rating'])
+
+
+def get_customer_cube():
+    """Count/Review_Rating-sum cube over the customers dataset."""
+    return get_cube('customers', CUSTOMER_DIMS, ['Review_Rating'])
+
+
+# ---- Incremental updates ----
+# The version of a dataset is the position its rows were read up to (see ingest.py), so
+# every server process that added the same rows reports the same version.
+
+def append(dataset, df, version):
+    """Add new rows of `dataset`, read up to `version`, to every cube over it."""
+    with _lock:
+        if not _versions.get(dataset):
+            for key in _declared:
+                if key[0] == dataset and key not in _cubes:
+                    _build(key)
+        for (name, _, _), cube in _cubes.items():
+            if name == dataset:
+                cube.add(df)
+        _versions[dataset] = version
+
+
+def version(dataset):
+    """Position the rows added to `dataset` were read up to; changes whenever its cubes do."""
+    return _versions.get(dataset, 0)
+
+
+def versioned(dataset):
+    """Decorator caching a zero-argument function's result until `dataset` gets new rows."""
+    def decorate(func):
+        cached = None
+
+        @functools.wraps(func)
+        def wrapper():
+            nonlocal cached
+            current = version(dataset)
+            if cached is None or cached[0] != current:
+                # (version, value) swapped in as one; concurrent callers may both compute it
+                cached = (current, func())
+            return cached[1]
+        return wrapper
+    return decorate
@@ -3,17 +3,39 @@ import dash_bootstrap_components as dbc
 from dash import Dash, dcc, html
 import plotly.io as pio
 
+import ingest
+import lazy
+import metrics
+import settings
+import transport
+
 # ---- Global color scheme for graphs ----
 pio.templates['pastel_trio'] = pio.templates['plotly_white']
 pio.templates['pastel_trio'].layout.colorway = ['#A8DADC', '#C5a3D9', '#F6BD60']
 pio.templates.default = 'pastel_trio'
 # ----
 
+if settings.METRICS:
+    # before the pages are imported, so their callbacks are registered instrumented
+    metrics.instrument()
+
 app = Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.SPACELAB], suppress_callback_exceptions=True, 
                meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}])
 app.title = 'Dashboard'
 app._favicon = ('./dashboard.png')
 
+if settings.METRICS:
+    # registered first so its after_request hook runs last and sees the encoded response
+    metrics.install(app.server, log_json=settings.METRICS_LOG, directory=settings.METRICS_DIR)
+
+if settings.TYPED_ARRAYS or settings.COMPRESS_RESPONSES:
+    transport.install(
+        app.server,
+        typed_arrays=settings.TYPED_ARRAYS,
+        min_bytes=settings.COMPRESS_MIN_BYTES if settings.COMPRESS_RESPONSES else None,
+        level=settings.COMPRESS_LEVEL,
+    )
+
 sidebar = html.Div(
     [
         # ---- title with icon ----
@@ -45,4 +67,6 @@ app.layout = html.Div([
 ])
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    lazy.start(settings.PAGE_WARMUP)
+    ingest.start()
+    app.run(host=settings.HOST, port=settings.PORT, debug=settings.DEBUG)
\ No newline at end of file
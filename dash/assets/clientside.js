@@ -0,0 +1,156 @@
+// ---- Clientside filtering ----
+// Used when the app runs with DASH_CLIENTSIDE_FILTERING=1. The pages ship pre-aggregated
+// marginals and figure skeletons in a dcc.Store once; the callbacks below only sum the
+// selected cells and copy the results into the skeleton traces.
+
+(function () {
+    // Sum a nested marginal grouped by one dimension.
+    // `filters` maps dimension names to predicates over the dimension labels.
+    function aggregate(marginal, by, filters) {
+        const dims = marginal.dims;
+        const allowed = dims.map(function (dim) {
+            const keep = filters[dim];
+            return marginal.labels[dim].map(function (label) {
+                return keep === undefined || keep(label);
+            });
+        });
+        const byAxis = dims.indexOf(by);
+        const totals = new Array(marginal.labels[by].length).fill(0);
+
+        (function walk(node, axis, byIndex) {
+            if (axis === dims.length) {
+                totals[byIndex] += node;
+                return;
+            }
+            for (let i = 0; i < node.length; i++) {
+                if (allowed[axis][i]) {
+                    walk(node[i], axis + 1, axis === byAxis ? i : byIndex);
+                }
+            }
+        })(marginal.values, 0, -1);
+
+        return {labels: marginal.labels[by], values: totals};
+    }
+
+    // Drop the groups without any rows, like a pandas groupby does
+    function nonEmpty(result, counts) {
+        const labels = [];
+        const values = [];
+        (counts || result.values).forEach(function (count, i) {
+            if (count > 0) {
+                labels.push(result.labels[i]);
+                values.push(result.values[i]);
+            }
+        });
+        return {labels: labels, values: values};
+    }
+
+    function isIn(selected) {
+        const values = selected || [];
+        return function (label) { return values.indexOf(label) !== -1; };
+    }
+
+    function equals(selected) {
+        return function (label) { return label === selected; };
+    }
+
+    function between(range) {
+        return function (label) { return label >= range[0] && label <= range[1]; };
+    }
+
+    function copy(skeleton) {
+        return JSON.parse(JSON.stringify(skeleton));
+    }
+
+    // Fill one trace per series (e.g. per gender) of a grouped bar skeleton
+    function fillSeries(fig, series) {
+        fig.data.forEach(function (trace) {
+            const result = series(trace.name);
+            trace.x = result.labels;
+            trace.y = result.values;
+        });
+        return fig;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        customers: {
+            gender_pie: function (payload, seasons, location) {
+                const m = payload.marginals;
+                const result = nonEmpty(aggregate(m.gender_pie, 'Gender', {
+                    Season: isIn(seasons),
+                    State_abbr: equals(payload.state_abbr[location]),
+                }));
+                const fig = copy(payload.skeletons.gender_pie);
+                fig.data[0].labels = result.labels;
+                fig.data[0].values = result.values;
+                return fig;
+            },
+            location_choropleth: function (payload, seasons, ageRange) {
+                const m = payload.marginals;
+                const result = nonEmpty(aggregate(m.location_choropleth, 'State_abbr', {
+                    Season: isIn(seasons),
+                    Age: between(ageRange),
+                }));
+                const fig = copy(payload.skeletons.location_choropleth);
+                fig.data[0].locations = result.labels;
+                fig.data[0].z = result.values;
+                return fig;
+            },
+            review_line: function (payload, seasons) {
+                const m = payload.marginals;
+                const filters = {Season: isIn(seasons)};
+                const counts = aggregate(m.review_count, 'Amount', filters);
+                const sums = aggregate(m.review_sum, 'Amount', filters);
+                const means = {
+                    labels: sums.labels,
+                    values: sums.values.map(function (sum, i) { return sum / counts.values[i]; }),
+                };
+                const result = nonEmpty(means, counts.values);
+                const fig = copy(payload.skeletons.review_line);
+                fig.data[0].x = result.labels;
+                fig.data[0].y = result.values;
+                return fig;
+            },
+            age_hist: function (payload, seasons, gender) {
+                const m = payload.marginals;
+                const result = nonEmpty(aggregate(m.age_hist, 'Age', {
+                    Season: isIn(seasons),
+                    Gender: equals(gender),
+                }));
+                const fig = copy(payload.skeletons.age_hist);
+                fig.data[0].x = result.labels;
+                fig.data[0].y = result.values;
+                return fig;
+            },
+        },
+        purchases: {
+            orders_bar: function (payload, seasons, groupBy) {
+                const marginal = payload.marginals.orders_bar[groupBy];
+                return fillSeries(copy(payload.skeletons.orders_bar[groupBy]), function (gender) {
+                    return nonEmpty(aggregate(marginal, groupBy, {
+                        Season: isIn(seasons),
+                        Gender: equals(gender),
+                    }));
+                });
+            },
+            discount_freq_bar: function (payload, genders) {
+                const marginal = payload.marginals.discount_freq_bar;
+                return fillSeries(copy(payload.skeletons.discount_freq_bar), function (discount) {
+                    return nonEmpty(aggregate(marginal, 'Frequency', {
+                        Gender: isIn(genders),
+                        Discount: equals(discount),
+                    }));
+                });
+            },
+            payment_donut: function (payload, ageRange) {
+                const result = nonEmpty(aggregate(payload.marginals.payment_donut, 'Payment', {
+                    Age: between(ageRange),
+                }));
+                const fig = copy(payload.skeletons.payment_donut);
+                fig.data[0].labels = result.labels;
+                fig.data[0].values = result.values;
+                return fig;
+            },
+        },
+    });
+})();
@@ -0,0 +1,139 @@
+"""Per-call figure build time: plotly express vs the figure skeletons (figures.py).
+
+The page callbacks are called for a grid of inputs to collect the frames they hand to their
+figure skeletons. Each frame is then turned into a figure by the skeleton's px build
+function (the old path) and by the skeleton (after its first build), timed, and both
+results are checked to describe the same figure.
+
+    python benchmarks/bench_figures.py
+    python benchmarks/bench_figures.py --repeat 200 --compare benchmarks/results/figures-<commit>.json
+"""
+import argparse
+import base64
+import json
+import time
+
+import numpy as np
+
+import common  # noqa: F401  (puts dash/ on sys.path)
+from common import compare, latency_stats, write_results
+
+SEASONS = ['Spring', 'Summer', 'Fall', 'Winter']
+
+# (page, callback, arguments)
+CASES = [
+    ('customers', 'gender_pie', (SEASONS, 'California')),
+    ('customers', 'gender_pie', (['Summer'], 'Texas')),
+    ('customers', 'location_choropleth', (SEASONS, [18, 70])),
+    ('customers', 'location_choropleth', (['Fall', 'Winter'], [30, 40])),
+    ('customers', 'review_line', (SEASONS,)),
+    ('customers', 'age_hist', (SEASONS, 'Female')),
+    ('purchases', 'orders_bar', (SEASONS, 'Item')),
+    ('purchases', 'orders_bar', (['Spring'], 'Category')),
+    ('purchases', 'discount_freq_bar', (['Male', 'Female'],)),
+    ('purchases', 'discount_freq_bar', (['Female'],)),
+    ('purchases', 'payment_donut', ([18, 70],)),
+    ('purchases', 'payment_donut', ([25, 35],)),
+    ('iris', 'update_scatter_plot', ([0, 2.5],)),
+    ('iris', 'update_scatter_plot', ([0.5, 1.5],)),
+    ('iris', 'update_scatter_plot2', ('Kmeans',)),
+    ('iris', 'update_scatter_plot2', ('Agglomerative',)),
+    ('meteorites', 'update_scatter_plot', ([1800, 2013],)),
+    ('meteorites', 'update_scatter_plot', ([1950, 1990],)),
+]
+
+
+def collect_frames():
+    """(case, skeleton, frame, key) for every case, captured from the page callbacks."""
+    import importlib
+
+    import app  # noqa: F401  (registers every page)
+    import figures
+    from callbacks import fit_iris_labels
+
+    fit_iris_labels()
+
+    captured = []
+    call = figures.FigureSkeleton.__call__
+
+    def capture(self, frame, *key):
+        captured.append((self, frame, key))
+        return call(self, frame, *key)
+
+    figures.FigureSkeleton.__call__ = capture
+    try:
+        rows = []
+        for page, name, args in CASES:
+            del captured[:]
+            getattr(importlib.import_module(f'pages.{page}'), name)(*args)
+            for skeleton, frame, key in captured:
+                rows.append((f'{page}.{name}{args!r}', skeleton, frame, key))
+    finally:
+        figures.FigureSkeleton.__call__ = call
+    return rows
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if 'bdata' in value and 'dtype' in value:
+            array = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+            if 'shape' in value:
+                array = array.reshape([int(n) for n in str(value['shape']).split(',')])
+            return array.tolist()
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def normalized(figure):
+    """JSON text of a figure or figure dict with typed arrays decoded, for comparisons."""
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    # as text, NaN equals NaN
+    return json.dumps(_decode(json.loads(pio.to_json(go.Figure(figure), validate=True))), sort_keys=True)
+
+
+def time_calls(func, repeat):
+    durations = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - t)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', help='results file (default benchmarks/results/figures-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare skeleton p50 latencies with')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'case':<70} {'px p50 ms':>10} {'skeleton p50 ms':>16} {'speedup':>8}  same")
+    for case, skeleton, frame, key in collect_frames():
+        skeleton(frame, *key)
+        px_stats = latency_stats(time_calls(lambda: skeleton.build(frame, *key), args.repeat))
+        skeleton_stats = latency_stats(time_calls(lambda: skeleton(frame, *key), args.repeat))
+        same = normalized(skeleton.build(frame, *key)) == normalized(skeleton(frame, *key))
+        speedup = px_stats['p50_ms'] / skeleton_stats['p50_ms']
+        print(f"{case:<70} {px_stats['p50_ms']:>10.3f} {skeleton_stats['p50_ms']:>16.3f} {speedup:>7.0f}x  "
+              f"{'yes' if same else 'NO'}")
+        results.append({
+            'case': case,
+            'px_p50_ms': px_stats['p50_ms'],
+            'px_p99_ms': px_stats['p99_ms'],
+            'p50_ms': skeleton_stats['p50_ms'],
+            'p99_ms': skeleton_stats['p99_ms'],
+            'same_figure': same,
+        })
+
+    print('\nwrote', write_results('figures', results, args.output))
+    if args.compare:
+        compare(results, args.compare, ['case'], metric='p50_ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Streaming ingestion (ingest.py): rows per second and callback latency while ingesting.
+
+A CSV of synthetic customers rows is written once (resampled like synthetic.py), then
+
+  1. for every chunk size the whole file is tailed into the aggregates of the
+     /customers and /purchases pages and the rows per second are reported;
+  2. the pages' update_graphs callbacks are timed with no ingestion, and again while a
+     thread keeps ingesting the file, to show how much slower dashboards get meanwhile.
+
+    python benchmarks/bench_ingest.py
+    python benchmarks/bench_ingest.py --rows 2000000 --chunk-rows 10000 50000 200000
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+import common  # noqa: F401  (puts dash/ on sys.path)
+from common import latency_stats, write_results
+from synthetic import _customers_chunk, _write_chunks
+
+SEASONS = ['Spring', 'Summer', 'Fall', 'Winter']
+
+# (page, arguments of update_graphs)
+CALLBACKS = [
+    ('customers', (SEASONS, 'Kentucky', 'Male', [18, 70])),
+    ('purchases', (SEASONS, 'Item', ['Male', 'Female'], [18, 70])),
+]
+
+
+def stream_file(n_rows):
+    from datastore import dataset_path
+
+    path = os.path.join(tempfile.gettempdir(), 'dash-benchmark-data', f'stream-{n_rows}.csv')
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        source = pd.read_csv(dataset_path('customers'))
+        source = source.loc[:, ~source.columns.str.startswith('Unnamed:')]
+        _write_chunks(source, n_rows, path + '.tmp', _customers_chunk, seed=1)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def ingest_file(path, chunk_rows):
+    """Tail the whole file into the aggregates; returns the rows added."""
+    import ingest
+
+    return ingest.Ingester([ingest.CsvTail(path, chunk_rows, ingest.DTYPE)], interval=0).poll()
+
+
+def time_callbacks(repeat):
+    import importlib
+
+    results = {}
+    for page, args in CALLBACKS:
+        update_graphs = importlib.import_module(f'pages.{page}').update_graphs
+        durations = []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            update_graphs(*args)
+            durations.append(time.perf_counter() - t)
+        results[page] = latency_stats(durations)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows in the streamed file')
+    parser.add_argument('--chunk-rows', type=int, nargs='+', default=[10_000, 50_000, 200_000])
+    parser.add_argument('--repeat', type=int, default=200, help='callback calls per page and phase')
+    parser.add_argument('--output', help='results file (default benchmarks/results/ingest-<commit>.json)')
+    args = parser.parse_args()
+
+    import app  # noqa: F401  (registers every page)
+    import lazy
+
+    path = stream_file(args.rows)
+    lazy.load_all()
+
+    results = []
+    print(f"{'chunk rows':>10} {'rows':>10} {'seconds':>8} {'rows/s':>10}")
+    for chunk_rows in args.chunk_rows:
+        t = time.perf_counter()
+        rows = ingest_file(path, chunk_rows)
+        seconds = time.perf_counter() - t
+        print(f'{chunk_rows:>10} {rows:>10} {seconds:>8.2f} {rows / seconds:>10.0f}')
+        results.append({'phase': 'throughput', 'chunk_rows': chunk_rows, 'rows': rows,
+                        'seconds': round(seconds, 3), 'rows_per_s': round(rows / seconds)})
+
+    idle = time_callbacks(args.repeat)
+    stop = threading.Event()
+    ingested = []
+
+    def keep_ingesting():
+        while not stop.is_set():
+            ingested.append(ingest_file(path, args.chunk_rows[0]))
+
+    thread = threading.Thread(target=keep_ingesting, daemon=True)
+    t = time.perf_counter()
+    thread.start()
+    busy = time_callbacks(args.repeat)
+    stop.set()
+    thread.join()
+    rate = sum(ingested) / (time.perf_counter() - t)
+
+    print(f"\n{'page':<10} {'idle p50 ms':>12} {'idle p99 ms':>12} {'ingesting p50 ms':>17} {'ingesting p99 ms':>17}")
+    for page, _ in CALLBACKS:
+        print(f"{page:<10} {idle[page]['p50_ms']:>12.2f} {idle[page]['p99_ms']:>12.2f} "
+              f"{busy[page]['p50_ms']:>17.2f} {busy[page]['p99_ms']:>17.2f}")
+        results.append({'phase': 'callbacks', 'page': page, 'idle': idle[page], 'ingesting': busy[page]})
+    print(f'ingesting at {rate:.0f} rows/s meanwhile')
+    results.append({'phase': 'concurrent', 'rows_per_s': round(rate)})
+
+    print('\nwrote', write_results('ingest', results, args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Latency of fast callbacks while slow ones run as background jobs (jobs.py).
+
+A server is started with exchange rates read from the offline fixtures, each fetch delayed
+by --delay seconds to stand in for the network. Slow clients keep picking new date ranges on
+/exchange-rate and poll their fetch job until the chart arrives, while fast clients replay
+the /customers scenario. The run is repeated for every number of slow clients, and reports
+the fast callbacks' latency and how long the slow clients waited for their charts.
+
+    python benchmarks/bench_jobs.py
+    python benchmarks/bench_jobs.py --slow-clients 0 4 16 --threads 4 --delay 3
+"""
+import argparse
+import datetime as dt
+import json
+import random
+import threading
+import time
+
+import requests
+
+import common  # noqa: F401  (puts dash/ on sys.path)
+from common import latency_stats, write_results
+from loadtest import SCENARIOS_PATH, Callback, Recorder, _free_port, replay, start_server
+
+RATES_OUTPUT = '..exchange-rate-chart.figure...rates-job.data'
+
+
+def rate_callbacks(base_url):
+    """The /exchange-rate (submit, poll) callbacks."""
+    callbacks = [Callback(spec) for spec in requests.get(f'{base_url}/_dash-dependencies').json()]
+    submit = next(cb for cb in callbacks if cb.output.startswith(RATES_OUTPUT))
+    poll = next(cb for cb in callbacks if cb.inputs == ['rates-poll.n_intervals'])
+    return submit, poll
+
+
+def slow_client(base_url, submit, poll, stop, waits, seed):
+    """Pick random date ranges and wait for each chart; appends the seconds waited."""
+    rng = random.Random(seed)
+    with requests.Session() as session:
+        job = None
+        while not stop.is_set():
+            start = dt.date(2020, 1, 1) + dt.timedelta(days=rng.randrange(1800))
+            values = {
+                'date-picker.start_date': start.isoformat(),
+                'date-picker.end_date': (start + dt.timedelta(days=rng.randrange(30, 365))).isoformat(),
+                'rates-job.data': job,
+                'rates-poll.n_intervals': 0,
+            }
+            t = time.perf_counter()
+            response = session.post(f'{base_url}/_dash-update-component',
+                                    json=submit.body(values, {'date-picker.start_date'})).json()['response']
+            job = values['rates-job.data'] = response.get('rates-job', {}).get('data')
+            while job and not stop.is_set():
+                time.sleep(0.5)
+                values['rates-poll.n_intervals'] += 1
+                response = session.post(f'{base_url}/_dash-update-component',
+                                        json=poll.body(values, {'rates-poll.n_intervals'}))
+                if response.status_code == 200:
+                    # the chart, or an error message, comes with the job handle cleared
+                    job = response.json()['response'].get('rates-job', {}).get('data', job)
+            if not stop.is_set():
+                waits.append(time.perf_counter() - t)
+
+
+def fast_client(base_url, scenario, stop, recorder):
+    with requests.Session() as session:
+        while not stop.is_set():
+            replay(session, recorder, base_url, scenario, think=0)
+
+
+def measure(n_slow, n_fast, duration, workers, threads, delay, scenario):
+    env = {'DASH_RATES_FIXTURES_DELAY': str(delay)}
+    process, base_url = start_server(_free_port(), workers=workers, threads=threads, env=env)
+    stop = threading.Event()
+    recorder = Recorder()
+    waits = []
+    # read once: concurrent first requests can race Dash's setup of the callback map
+    submit, poll = rate_callbacks(base_url)
+    clients = [threading.Thread(target=slow_client, args=(base_url, submit, poll, stop, waits, i))
+               for i in range(n_slow)]
+    clients += [threading.Thread(target=fast_client, args=(base_url, scenario, stop, recorder)) for _ in range(n_fast)]
+    try:
+        for client in clients:
+            client.start()
+        time.sleep(duration)
+        stop.set()
+        for client in clients:
+            client.join()
+    finally:
+        process.terminate()
+        process.wait()
+    samples = [sample for samples in recorder.samples.values() for sample in samples]
+    return {
+        'slow_clients': n_slow,
+        **latency_stats([seconds for seconds, _, _ in samples]),
+        'errors': sum(1 for _, ok, _ in samples if not ok),
+        'charts': len(waits),
+        'chart_wait_p50_s': round(sorted(waits)[len(waits) // 2], 2) if waits else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--slow-clients', type=int, nargs='+', default=[0, 4, 16])
+    parser.add_argument('--fast-clients', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--delay', type=float, default=2, help='seconds per simulated rate fetch')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='request threads per worker')
+    parser.add_argument('--output', help='results file (default benchmarks/results/jobs-<commit>.json)')
+    args = parser.parse_args()
+
+    with open(SCENARIOS_PATH) as file:
+        scenario = next(s for s in json.load(file) if s['path'] == '/customers')
+
+    results = []
+    print(f"{'slow clients':>12} {'fast p50 ms':>12} {'fast p99 ms':>12} {'errors':>7} {'charts':>7} {'chart wait s':>13}")
+    for n_slow in args.slow_clients:
+        row = measure(n_slow, args.fast_clients, args.duration, args.workers, args.threads, args.delay, scenario)
+        wait = '-' if row['chart_wait_p50_s'] is None else f"{row['chart_wait_p50_s']:.2f}"
+        print(f"{n_slow:>12} {row['p50_ms']:>12.1f} {row['p99_ms']:>12.1f} {row['errors']:>7} {row['charts']:>7} {wait:>13}")
+        results.append(row)
+
+    print('\nwrote', write_results('jobs', results, args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Bytes on the wire per page, with and without the response layer (transport.py).
+
+Every scenario in scenarios.json is replayed once by a single client against servers with
+the layer switched off, with typed arrays only, and with typed arrays plus gzip or brotli
+compression. The totals cover the layout, the page content and every callback response of
+the recorded interactions; the transfer time is estimated for a slow link. Before that, figure
+Patches are round-tripped through compact_output to check that only assigned arrays change.
+
+    python benchmarks/bench_transport.py
+    python benchmarks/bench_transport.py --mbit 2
+"""
+import argparse
+import base64
+
+import numpy as np
+import requests
+from dash import Patch
+
+import common  # noqa: F401  (puts dash/ on sys.path)
+from common import write_results
+from loadtest import Recorder, _free_port, json, replay, start_server, SCENARIOS_PATH
+from transport import _CODE_DTYPES, compact_output
+
+# name -> (server environment, Accept-Encoding)
+CONFIGS = {
+    'json': ({'DASH_TYPED_ARRAYS': '0', 'DASH_COMPRESS_RESPONSES': '0'}, 'identity'),
+    'typed arrays': ({'DASH_TYPED_ARRAYS': '1', 'DASH_COMPRESS_RESPONSES': '0'}, 'identity'),
+    'typed + gzip': ({'DASH_TYPED_ARRAYS': '1', 'DASH_COMPRESS_RESPONSES': '1'}, 'gzip'),
+    'typed + brotli': ({'DASH_TYPED_ARRAYS': '1', 'DASH_COMPRESS_RESPONSES': '1'}, 'br'),
+}
+
+
+def _decoded(value):
+    if isinstance(value, dict) and 'bdata' in value:
+        return np.frombuffer(base64.b64decode(value['bdata']), dtype=_CODE_DTYPES[value['dtype']]).tolist()
+    return value
+
+
+def check_patches():
+    """Round-trip figure Patches through compact_output: each case's operations must decode to
+    the values they were built with, and only Assign operations may become typed arrays."""
+    values = list(range(1000))
+    cases = {}
+    cases['extend'] = Patch()
+    cases['extend']['data'][0]['y'].extend(values)
+    cases['append'] = Patch()
+    cases['append']['data'][0]['y'].append(values)
+    cases['assign'] = Patch()
+    cases['assign']['data'][0]['y'] = values
+    cases['assign + extend'] = Patch()
+    cases['assign + extend']['data'][0]['x'] = values
+    cases['assign + extend']['data'][0]['y'].extend(values)
+
+    failures = []
+    for name, patch in cases.items():
+        sent = json.loads(json.dumps(patch.to_plotly_json()))
+        received = compact_output(json.loads(json.dumps(sent)))
+        for before, after in zip(sent['operations'], received['operations']):
+            value = after['params']['value']
+            typed = isinstance(value, dict) and 'bdata' in value
+            if _decoded(value) != before['params']['value'] or (typed and before['operation'] != 'Assign'):
+                failures.append(f"{name}: {before['operation']} at {before['location']}")
+        print(f"{'patch ' + name:<24} {len(json.dumps(sent)):>8,} -> {len(json.dumps(received)):>8,} bytes")
+    return failures
+
+
+def measure(base_url, scenario, accept_encoding):
+    recorder = Recorder()
+    with requests.Session() as session:
+        session.headers['Accept-Encoding'] = accept_encoding
+        replay(session, recorder, base_url, scenario, think=0)
+    samples = [sample for samples in recorder.samples.values() for sample in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, ok, _ in samples if not ok),
+        'bytes': sum(size for _, _, size in samples),
+        'server_ms': round(1e3 * sum(seconds for seconds, _, _ in samples), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=SCENARIOS_PATH)
+    parser.add_argument('--mbit', type=float, default=5, help='link speed for the transfer time estimate')
+    parser.add_argument('--output', help='results file (default benchmarks/results/transport-<commit>.json)')
+    args = parser.parse_args()
+
+    failures = check_patches()
+    if failures:
+        raise SystemExit('compact_output changed these Patch operations:\n' + '\n'.join(failures))
+
+    with open(args.scenarios) as file:
+        scenarios = json.load(file)
+
+    results = []
+    for config, (env, accept_encoding) in CONFIGS.items():
+        process, base_url = start_server(_free_port(), env=env)
+        try:
+            for scenario in scenarios:
+                # first pass warms the server caches, the second one is measured
+                measure(base_url, scenario, accept_encoding)
+                row = measure(base_url, scenario, accept_encoding)
+                row.update(config=config, scenario=scenario['name'], page=scenario['path'],
+                           transfer_ms=round(row['bytes'] * 8 / (args.mbit * 1e6) * 1e3, 1))
+                results.append(row)
+        finally:
+            process.terminate()
+            process.wait()
+
+    baseline = {row['scenario']: row['bytes'] for row in results if row['config'] == 'json'}
+    print(f"{'page':<16} {'config':<16} {'requests':>8} {'bytes':>10} {'vs json':>8} "
+          f"{f'@{args.mbit:g} Mbit/s':>14} {'errors':>7}")
+    for row in sorted(results, key=lambda row: row['scenario']):
+        share = row['bytes'] / baseline[row['scenario']]
+        print(f"{row['page']:<16} {row['config']:<16} {row['requests']:>8} {row['bytes']:>10,} {share:>8.0%} "
+              f"{row['transfer_ms']:>11.0f} ms {row['errors']:>7}")
+    print('\nwrote', write_results('transport', results, args.output))
+
+
+if __name__ == '__main__':
+    main()
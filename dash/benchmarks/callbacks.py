@@ -0,0 +1,187 @@
+"""Micro-benchmarks of the page callbacks, called directly without a browser.
+
+Every scale runs in its own process against synthetic datasets of that size (see
+synthetic.py), so module-level loading and caches start cold each time. Per callback and
+input case it reports p50/p99 latency, the tracemalloc peak of one call and the size of
+the serialized response.
+
+    python benchmarks/callbacks.py                      # 1x and 100x
+    python benchmarks/callbacks.py --scales 1 100 10000 --repeat 20
+    python benchmarks/callbacks.py --compare benchmarks/results/callbacks-<commit>.json
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import common  # noqa: F401  (puts dash/ on sys.path)
+from common import DASH_DIR, compare, latency_stats, write_results
+
+SEASONS = ['Spring', 'Summer', 'Fall', 'Winter']
+
+# (page module, callback, case name, arguments, id of the input that changed or None for
+# the initial call of a freshly loaded page)
+CASES = [
+    ('customers', 'update_graphs', 'initial', (SEASONS, 'Kentucky', 'Male', [18, 70]), None),
+    ('customers', 'update_graphs', 'season', (['Spring', 'Summer'], 'Kentucky', 'Male', [18, 70]), 'season_filter'),
+    ('customers', 'update_graphs', 'location', (SEASONS, 'Texas', 'Male', [18, 70]), 'location_dropdown'),
+    ('customers', 'update_graphs', 'gender', (SEASONS, 'Kentucky', 'Female', [18, 70]), 'gender_radio'),
+    ('customers', 'update_graphs', 'age_range', (SEASONS, 'Kentucky', 'Male', [25, 40]), 'age_range'),
+    ('purchases', 'update_graphs', 'initial', (SEASONS, 'Item', ['Male', 'Female'], [18, 70]), None),
+    ('purchases', 'update_graphs', 'group_by', (SEASONS, 'Category', ['Male', 'Female'], [18, 70]), 'group_by'),
+    ('purchases', 'update_graphs', 'gender', (SEASONS, 'Item', ['Female'], [18, 70]), 'gender_filter'),
+    ('purchases', 'update_graphs', 'age_range', (SEASONS, 'Item', ['Male', 'Female'], [30, 50]), 'age_range'),
+    ('meteorites', 'update_scatter_plot', 'initial', ([860, 2013],), None),
+    ('meteorites', 'update_scatter_plot', 'year_range', ([1900, 2000],), 'year-slider'),
+    ('meteorites', 'update_table', 'initial', (0, 10, [], ''), None),
+    ('meteorites', 'update_table', 'sorted', (50, 10, [{'column_id': 'mass (g)', 'direction': 'desc'}], ''),
+     'meteorite-table'),
+    ('meteorites', 'update_table', 'filtered', (2, 10, [{'column_id': 'year', 'direction': 'asc'}],
+                                                '{recclass} contains L6 && {year} >= 1950'), 'meteorite-table'),
+    ('iris', 'update_scatter_plot', 'initial', ([0, 2.5],), None),
+    ('iris', 'update_scatter_plot', 'petal_width', ([0.5, 1.5],), 'range-slider'),
+    ('iris', 'update_scatter_plot2', 'Agglomerative', ('Agglomerative',), 'cluster-alg-dropdown'),
+    ('iris', 'update_scatter_plot2', 'Kmeans', ('Kmeans',), 'cluster-alg-dropdown'),
+    ('iris', 'update_scatter_plot2', 'Kmedoids', ('Kmedoids',), 'cluster-alg-dropdown'),
+]
+
+
+@contextlib.contextmanager
+def triggered_by(component_id):
+    """Run a callback as if `component_id` had changed (no context: initial call)."""
+    if component_id is None:
+        yield
+        return
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+
+    token = context_value.set(AttributeDict(
+        triggered_inputs=[{'prop_id': f'{component_id}.value', 'value': None}]
+    ))
+    try:
+        yield
+    finally:
+        context_value.reset(token)
+
+
+def response_size(result):
+    """Bytes of the JSON Dash would send for the outputs that are not `no_update`."""
+    from dash import no_update
+    from plotly.io.json import to_json_plotly
+
+    outputs = result if isinstance(result, tuple) else (result,)
+    return len(to_json_plotly([o for o in outputs if o is not no_update]).encode())
+
+
+def fit_iris_labels():
+    """Fit every Iris clustering up front: in the app an uncached fit runs as a background
+    job, here the iris cases time drawing the cached labels."""
+    from sklearn.base import clone
+    from clustering import fit_labels
+
+    cluster_cache = importlib.import_module('pages.iris').models().cluster_cache
+    cluster_cache.prewarm()
+    cluster_cache.wait()
+    for name, estimator in cluster_cache.algorithms.items():
+        if cluster_cache.cached(name) is None:
+            # no process pool here (see ClusterCache.prewarm): fit in this process
+            cluster_cache.put(name, fit_labels(clone(estimator), cluster_cache.X))
+
+
+def run_cases(repeat, warmup):
+    started = time.perf_counter()
+    import app  # noqa: F401  (registers every page)
+    import lazy
+
+    # pages load their data on first use; include it in the startup time
+    lazy.load_all()
+    startup = time.perf_counter() - started
+    fit_iris_labels()
+
+    results = []
+    for page, name, case, args, trigger in CASES:
+        callback = getattr(importlib.import_module(f'pages.{page}'), name)
+        with triggered_by(trigger):
+            for _ in range(warmup):
+                result = callback(*args)
+            durations = []
+            for _ in range(repeat):
+                t = time.perf_counter()
+                result = callback(*args)
+                durations.append(time.perf_counter() - t)
+            tracemalloc.start()
+            callback(*args)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        results.append({
+            'callback': f'{page}.{name}',
+            'case': case,
+            **latency_stats(durations),
+            'peak_kib': round(peak / 1024, 1),
+            'response_bytes': response_size(result),
+        })
+    return startup, results
+
+
+def run_scale(scale, data_dir, repeat, warmup):
+    """Benchmark one scale in a fresh interpreter and return its result rows."""
+    env = dict(os.environ, DASH_DATASETS_DIR=data_dir, DASH_CLUSTER_PREWARM='0')
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', '--repeat', str(repeat), '--warmup', str(warmup)],
+        cwd=DASH_DIR, env=env, capture_output=True, text=True
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f'benchmark at {scale}x failed:\n{out.stderr}')
+    startup, rows = json.loads(out.stdout.splitlines()[-1])
+    for row in rows:
+        row['scale'] = scale
+        row['startup_s'] = round(startup, 3)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 100])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'dash-benchmark-data'),
+                        help='where synthetic datasets are generated (reused between runs)')
+    parser.add_argument('--output', help='results file (default benchmarks/results/callbacks-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare p50 latencies with')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_cases(args.repeat, args.warmup)))
+        return
+
+    from synthetic import generate
+
+    results = []
+    for scale in args.scales:
+        scale = int(scale) if scale == int(scale) else scale
+        data_dir = os.path.join(args.data_dir, f'{scale}x')
+        if not os.path.isdir(data_dir):
+            print(f'generating {scale}x datasets in {data_dir}', file=sys.stderr)
+            generate(scale, data_dir)
+        rows = run_scale(scale, data_dir, args.repeat, args.warmup)
+        print(f'\n{scale}x (startup {rows[0]["startup_s"]} s)')
+        print(f"  {'callback':<34} {'case':<14} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>10} {'bytes':>10}")
+        for row in rows:
+            print(f"  {row['callback']:<34} {row['case']:<14} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+                  f"{row['peak_kib']:>10.1f} {row['response_bytes']:>10,}")
+        results += rows
+
+    print('\nwrote', write_results('callbacks', results, args.output))
+    if args.compare:
+        compare(results, args.compare, ['scale', 'callback', 'case'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# ---- Shared benchmark helpers ----
+# Benchmarks run from the dash/ directory. Results are written as JSON files named after
+# the current commit, so runs of two commits can be compared with --compare.
+
+DASH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(DASH_DIR, 'benchmarks', 'results')
+
+if DASH_DIR not in sys.path:
+    sys.path.insert(0, DASH_DIR)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=DASH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def latency_stats(seconds):
+    """p50/p99/mean of a list of durations, in milliseconds."""
+    ms = np.asarray(seconds) * 1e3
+    return {
+        'calls': len(ms),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+    }
+
+
+def write_results(name, results, output=None):
+    """Write results with run metadata; returns the file path."""
+    commit = git_commit()
+    path = output or os.path.join(RESULTS_DIR, f'{name}-{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump({
+            'benchmark': name,
+            'commit': commit,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }, file, indent=2)
+    return path
+
+
+def compare(current, baseline_path, key_fields, metric='p50_ms'):
+    """Print the ratio of `metric` between the current results and a baseline file."""
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    before = {tuple(r[k] for k in key_fields): r for r in baseline['results']}
+    print(f"\n{metric} vs {baseline['commit']}:")
+    for result in current:
+        key = tuple(result[k] for k in key_fields)
+        old = before.get(key)
+        if old is None or not old.get(metric):
+            continue
+        ratio = result[metric] / old[metric]
+        flag = '  <-- slower' if ratio > 1.2 else ''
+        print(f"  {' / '.join(map(str, key)):<55} {old[metric]:>10.3f} -> {result[metric]:>10.3f}  x{ratio:.2f}{flag}")
@@ -0,0 +1,258 @@
+"""HTTP load test replaying recorded interactions against the real Dash endpoints.
+
+N simulated clients each loop over the sequences in scenarios.json: load the app shell
+(`_dash-layout`, `_dash-dependencies`), navigate to the page, fire its initial callbacks and
+then replay the recorded input changes through `_dash-update-component`, the way the
+browser does. Throughput, latency percentiles and error rates are reported per callback
+for every client count, so the count at which latency climbs while throughput flattens
+shows what one container can take.
+
+Without --url a server is started locally (app.py's, or gunicorn with --workers), with
+exchange rates read from the offline fixtures instead of Yahoo Finance.
+
+    python benchmarks/loadtest.py --clients 1 4 16 --duration 20
+    python benchmarks/loadtest.py --workers 4 --threads 4 --clients 4 16 64
+    python benchmarks/loadtest.py --url http://localhost:8050 --clients 32
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+import common  # noqa: F401  (puts dash/ on sys.path)
+from common import DASH_DIR, compare, latency_stats, write_results
+
+SCENARIOS_PATH = os.path.join(DASH_DIR, 'benchmarks', 'scenarios.json')
+PAGES_CALLBACK_INPUT = '_pages_location.pathname'
+
+
+# ---- Callback graph ----
+
+def _prop(text):
+    component_id, prop = text.split('.', 1)
+    return {'id': component_id, 'property': prop}
+
+
+class Callback:
+    def __init__(self, spec):
+        self.output = spec['output']
+        if self.output.startswith('..'):
+            self.outputs = [_prop(part) for part in self.output[2:-2].split('...')]
+        else:
+            self.outputs = _prop(self.output)
+        self.inputs = [f"{i['id']}.{i['property']}" for i in spec['inputs']]
+        self.state = [f"{s['id']}.{s['property']}" for s in spec['state']]
+        self.prevent_initial_call = spec.get('prevent_initial_call', False)
+        self.clientside = spec.get('clientside_function') is not None
+        outputs = self.outputs if isinstance(self.outputs, list) else [self.outputs]
+        self.label = ','.join(dict.fromkeys(o['id'] for o in outputs))
+
+    def body(self, values, changed):
+        def props(names):
+            return [{**_prop(name), 'value': values.get(name)} for name in names]
+        return {
+            'output': self.output,
+            'outputs': self.outputs,
+            'inputs': props(self.inputs),
+            'state': props(self.state),
+            'changedPropIds': [name for name in self.inputs if name in changed],
+        }
+
+
+def server_callbacks(dependencies):
+    return [cb for cb in map(Callback, dependencies) if not cb.clientside]
+
+
+# ---- Simulated client ----
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)  # label -> [(seconds, ok, bytes)]
+
+    def add(self, label, seconds, ok, size):
+        self.samples[label].append((seconds, ok, size))
+
+
+def _request(session, recorder, label, method, url, **kwargs):
+    t = time.perf_counter()
+    try:
+        response = session.request(method, url, timeout=60, **kwargs)
+        # 204 is PreventUpdate, not an error
+        ok = response.status_code in (200, 204)
+        # bytes on the wire, before requests decompresses the body
+        size = int(response.headers.get('Content-Length', len(response.content)))
+    except requests.RequestException:
+        ok, size = False, 0
+    recorder.add(label, time.perf_counter() - t, ok, size)
+
+
+def replay(session, recorder, base_url, scenario, think):
+    _request(session, recorder, '_dash-layout', 'GET', f'{base_url}/_dash-layout')
+    dependencies = session.get(f'{base_url}/_dash-dependencies', timeout=60).json()
+    callbacks = server_callbacks(dependencies)
+    update_url = f'{base_url}/_dash-update-component'
+
+    def fire(values, changed, initial=False):
+        for cb in callbacks:
+            if not all(name in values for name in cb.inputs + cb.state):
+                continue
+            if initial and cb.prevent_initial_call:
+                continue
+            if not initial and changed.isdisjoint(cb.inputs):
+                continue
+            _request(session, recorder, cb.label, 'POST', update_url, json=cb.body(values, changed))
+
+    # navigation renders the page, then its callbacks run once with nothing triggered
+    navigation = {PAGES_CALLBACK_INPUT: scenario['path'], '_pages_location.search': ''}
+    fire(navigation, {PAGES_CALLBACK_INPUT})
+    values = dict(scenario['state'])
+    fire(values, set(), initial=True)
+    for step in scenario['steps']:
+        if think:
+            time.sleep(think)
+        values.update(step)
+        fire(values, set(step))
+
+
+def run_clients(base_url, scenarios, n_clients, duration, think, seed):
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        rng = random.Random(seed + index)
+        with requests.Session() as session:
+            while time.monotonic() < deadline:
+                replay(session, recorder, base_url, rng.choice(scenarios), think)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(n_clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - started
+
+
+def summarize(recorder, elapsed, n_clients):
+    rows = []
+    for label, samples in sorted(recorder.samples.items()):
+        errors = sum(1 for _, ok, _ in samples if not ok)
+        rows.append({
+            'clients': n_clients,
+            'callback': label,
+            **latency_stats([seconds for seconds, _, _ in samples]),
+            'rps': round(len(samples) / elapsed, 2),
+            'error_rate': round(errors / len(samples), 4),
+            'mean_bytes': round(sum(size for _, _, size in samples) / len(samples)),
+        })
+    total = sum(row['calls'] for row in rows)
+    errors = sum(row['calls'] * row['error_rate'] for row in rows)
+    all_latencies = [seconds for samples in recorder.samples.values() for seconds, _, _ in samples]
+    rows.append({
+        'clients': n_clients,
+        'callback': 'TOTAL',
+        **latency_stats(all_latencies),
+        'rps': round(total / elapsed, 2),
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'mean_bytes': None,
+    })
+    return rows
+
+
+# ---- Local server ----
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, workers=None, threads=None, env=None):
+    """Run the app with offline exchange rates; returns the process and its URL.
+
+    With `workers` it is served by gunicorn (see wsgi.py), otherwise by app.py's server.
+    """
+    env = dict(
+        os.environ,
+        DASH_RATES_PROVIDER='file',
+        DASH_RATES_DB=os.path.join(tempfile.mkdtemp(prefix='dash-loadtest-'), 'rates.sqlite'),
+        **(env or {}),
+    )
+    if workers:
+        env.update(DASH_HOST='127.0.0.1', DASH_PORT=str(port), DASH_WORKERS=str(workers))
+        if threads:
+            env['DASH_THREADS'] = str(threads)
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', os.devnull, 'wsgi:server']
+    else:
+        code = (
+            "import ingest, lazy, settings; from app import app; lazy.start(settings.PAGE_WARMUP); ingest.start(); "
+            f"app.run(host='127.0.0.1', port={port}, debug=False, threaded=True)"
+        )
+        command = [sys.executable, '-c', code]
+    process = subprocess.Popen(command, cwd=DASH_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(600):
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited:\n{process.stderr.read().decode()}')
+        try:
+            requests.get(f'{base_url}/_dash-layout', timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('server did not start within 60 s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='running server to test (default: start the app locally)')
+    parser.add_argument('--workers', type=int, help='serve the local app with this many gunicorn workers')
+    parser.add_argument('--threads', type=int, help='threads per gunicorn worker (default DASH_THREADS)')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=20, help='seconds per client count')
+    parser.add_argument('--think', type=float, default=0, help='pause between interactions, in seconds')
+    parser.add_argument('--scenarios', default=SCENARIOS_PATH)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='results file (default benchmarks/results/loadtest-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare p99 latencies with')
+    args = parser.parse_args()
+
+    with open(args.scenarios) as file:
+        scenarios = json.load(file)
+
+    process = None
+    base_url = args.url
+    if base_url is None:
+        process, base_url = start_server(_free_port(), args.workers, args.threads)
+    try:
+        results = []
+        for n_clients in args.clients:
+            recorder, elapsed = run_clients(base_url, scenarios, n_clients, args.duration, args.think, args.seed)
+            rows = summarize(recorder, elapsed, n_clients)
+            print(f'\n{n_clients} clients, {elapsed:.1f} s')
+            print(f"  {'callback':<58} {'calls':>7} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+            for row in rows:
+                print(f"  {row['callback']:<58} {row['calls']:>7} {row['rps']:>8.1f} "
+                      f"{row['p50_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['error_rate']:>7.1%}")
+            results += rows
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print('\nwrote', write_results('loadtest', results, args.output))
+    if args.compare:
+        compare(results, args.compare, ['clients', 'callback'], metric='p99_ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Cold-start time of the Dash app for each page warmup mode (DASH_PAGE_WARMUP).
+
+For every mode and page a fresh server is started and timed until it answers
+`_dash-layout` (ready), then the page's scenario from scenarios.json is replayed once by a
+single client (first visit: navigation, initial callbacks and the recorded interactions).
+`preload` is the old eager behaviour, every page is loaded before serving; with `background`
+and `none` a first visit may wait for (or run) the page's loader.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --workers 4 --repeat 3
+    python benchmarks/startup.py --compare benchmarks/results/startup-<commit>.json
+"""
+import argparse
+import time
+
+import requests
+
+import common  # noqa: F401  (puts dash/ on sys.path)
+from common import compare, write_results
+from loadtest import Recorder, _free_port, json, replay, start_server, SCENARIOS_PATH
+
+MODES = ['preload', 'background', 'none']
+
+
+def measure(mode, scenario, workers, data_dir):
+    env = {'DASH_PAGE_WARMUP': mode}
+    if data_dir:
+        env['DASH_DATASETS_DIR'] = data_dir
+    started = time.perf_counter()
+    process, base_url = start_server(_free_port(), workers=workers, env=env)
+    ready = time.perf_counter() - started
+    try:
+        recorder = Recorder()
+        with requests.Session() as session:
+            t = time.perf_counter()
+            replay(session, recorder, base_url, scenario, think=0)
+            first_visit = time.perf_counter() - t
+    finally:
+        process.terminate()
+        process.wait()
+    samples = [sample for samples in recorder.samples.values() for sample in samples]
+    return {
+        'ready_s': round(ready, 3),
+        'first_visit_s': round(first_visit, 3),
+        'total_s': round(ready + first_visit, 3),
+        'errors': sum(1 for _, ok, _ in samples if not ok),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--workers', type=int, help='serve with this many gunicorn workers (default: app.py)')
+    parser.add_argument('--repeat', type=int, default=1, help='server starts per mode and page (best is kept)')
+    parser.add_argument('--data-dir', help='datasets to serve, e.g. from synthetic.py (default: datasets/)')
+    parser.add_argument('--scenarios', default=SCENARIOS_PATH)
+    parser.add_argument('--output', help='results file (default benchmarks/results/startup-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare ready + first visit times with')
+    args = parser.parse_args()
+
+    with open(args.scenarios) as file:
+        scenarios = json.load(file)
+
+    results = []
+    print(f"{'mode':<12} {'page':<16} {'ready s':>9} {'first visit s':>14} {'total s':>9}")
+    for mode in args.modes:
+        for scenario in scenarios:
+            runs = [measure(mode, scenario, args.workers, args.data_dir) for _ in range(args.repeat)]
+            row = {'mode': mode, 'page': scenario['path'], **min(runs, key=lambda run: run['total_s'])}
+            print(f"{mode:<12} {row['page']:<16} {row['ready_s']:>9.2f} {row['first_visit_s']:>14.2f} "
+                  f"{row['total_s']:>9.2f}{'  (errors)' if row['errors'] else ''}")
+            results.append(row)
+
+    print('\nwrote', write_results('startup', results, args.output))
+    if args.compare:
+        compare(results, args.compare, ['mode', 'page'], metric='total_s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Generate schema-faithful synthetic copies of the datasets at a multiple of their size.
+
+Rows are resampled from the real files, so column types, category frequencies and the
+correlations between columns are kept. Ids and names are made unique and meteorite
+coordinates get a little jitter. Files are written in chunks, so memory stays bounded.
+
+    python benchmarks/synthetic.py --scale 100 --out /tmp/datasets-100x
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import common  # noqa: F401  (puts dash/ on sys.path)
+from datastore import DATASETS, dataset_path
+
+CHUNK_ROWS = 500_000
+
+
+def _write_chunks(source, n_rows, path, make_chunk, seed):
+    rng = np.random.default_rng(seed)
+    for i, start in enumerate(range(0, n_rows, CHUNK_ROWS)):
+        size = min(CHUNK_ROWS, n_rows - start)
+        rows = source.iloc[rng.integers(0, len(source), size)].reset_index(drop=True)
+        chunk = make_chunk(rows, start, rng)
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+
+def _customers_chunk(rows, start, rng):
+    rows['ID'] = np.arange(start + 1, start + len(rows) + 1)
+    return rows
+
+
+def _meteorites_chunk(rows, start, rng):
+    ids = np.arange(start + 1, start + len(rows) + 1)
+    rows['id'] = ids
+    rows['name'] = rows['name'] + ' ' + pd.Series(ids).astype(str)
+    for col, limit in (('reclat', 90), ('reclong', 180)):
+        jitter = rng.normal(0, 0.05, len(rows))
+        rows[col] = (rows[col] + jitter).clip(-limit, limit).round(5)
+    rows['GeoLocation'] = '(' + rows['reclat'].astype(str) + ', ' + rows['reclong'].astype(str) + ')'
+    rows.loc[rows['reclat'].isna(), 'GeoLocation'] = np.nan
+    return rows
+
+
+GENERATORS = {
+    'customers': _customers_chunk,
+    'meteorites': _meteorites_chunk,
+}
+
+
+def generate(scale, out_dir, seed=0):
+    """Write every registered dataset at `scale` times its size into `out_dir`."""
+    os.makedirs(out_dir, exist_ok=True)
+    for name, make_chunk in GENERATORS.items():
+        source = pd.read_csv(dataset_path(name))
+        source = source.loc[:, ~source.columns.str.startswith('Unnamed:')]
+        path = os.path.join(out_dir, DATASETS[name]['file'])
+        _write_chunks(source, int(len(source) * scale), path, make_chunk, seed)
+    return out_dir
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=100)
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args()
+    print(generate(args.scale, args.out))
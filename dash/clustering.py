@@ -0,0 +1,222 @@
+import base64
+import io
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# ---- Clustering result cache ----
+# Labels are cached per (dataset, algorithm, parameters). The configured estimators are only
+# used as templates: every fit runs on a fresh clone, so concurrent requests never share
+# estimator state.
+
+
+def fit_labels(estimator, X, report=None):
+    """Fit an unfitted estimator and return its read-only cluster labels.
+
+    `report` is accepted so it can run as a background job (see jobs.py); fits give no progress.
+    """
+    labels = estimator.fit_predict(X)
+    labels.setflags(write=False)
+    return labels
+
+
+class ClusterCache:
+    def __init__(self, algorithms, X, data_key):
+        self.algorithms = algorithms
+        self.X = X
+        self.data_key = data_key
+        self._results = {}
+        self._pending = {}
+        # re-entrant: done callbacks of already finished futures run inside prewarm
+        self._lock = threading.RLock()
+
+    def key(self, name):
+        params = self.algorithms[name].get_params()
+        return (self.data_key, name, tuple(sorted((k, repr(v)) for k, v in params.items())))
+
+    def _store(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.exception() is None:
+                self._results[key] = future.result()
+
+    def cached(self, name):
+        """Cluster labels for `algorithms[name]` if already fitted, else None (never blocks)."""
+        key = self.key(name)
+        with self._lock:
+            labels = self._results.get(key)
+            pending = self._pending.get(key)
+        if labels is None and pending is not None and pending.done() and pending.exception() is None:
+            # fitted by the warmup, its done callback hasn't stored it yet
+            labels = pending.result()
+        metrics.cache_access('cluster_labels', labels is not None)
+        return labels
+
+    def pending(self, name):
+        """Whether the warmup is still fitting `algorithms[name]`."""
+        with self._lock:
+            pending = self._pending.get(self.key(name))
+        return pending is not None and not pending.done()
+
+    def put(self, name, labels):
+        """Store labels fitted elsewhere (e.g. by a background job); returns the stored ones."""
+        labels.setflags(write=False)
+        with self._lock:
+            return self._results.setdefault(self.key(name), labels)
+
+    def prewarm(self, max_workers=None):
+        """Fit every algorithm in a background process pool without blocking the caller."""
+        from sklearn.base import clone
+
+        try:
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+        except (OSError, NotImplementedError):
+            # no process support (e.g. restricted sandbox): fall back to fitting on first use
+            return
+        with self._lock:
+            for name, estimator in self.algorithms.items():
+                key = self.key(name)
+                if key in self._results or key in self._pending:
+                    continue
+                future = executor.submit(fit_labels, clone(estimator), self.X)
+                self._pending[key] = future
+                future.add_done_callback(lambda f, key=key: self._store(key, f))
+        executor.shutdown(wait=False)
+
+    def wait(self):
+        """Block until the warmup fits are stored (e.g. before forking server workers)."""
+        with self._lock:
+            pending = list(self._pending.values())
+        for future in pending:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+
+# ---- Large-table clustering ----
+# Exact ward and k-medoids need O(n^2) memory, so above a per-algorithm row limit the same
+# algorithm names map to scalable counterparts: mini-batch k-means, medoids fitted on a
+# sample, and ward on a k-means coreset. Uploaded tables are parsed and fitted in a
+# background job (see jobs.py) that reports its progress.
+
+EXACT_ROW_LIMITS = {
+    'Agglomerative': 5_000,
+    'Kmeans': 100_000,
+    'Kmedoids': 5_000,
+}
+SAMPLE_SIZE = 5_000
+CORESET_SIZE = 500
+CORESET_SAMPLE_SIZE = 100_000
+BATCH_SIZE = 4_096
+ASSIGN_CHUNK = 65_536
+
+
+def _nearest(X, centers, report, start, end):
+    """Index of the nearest center for every row, computed in chunks."""
+    from sklearn.metrics import pairwise_distances_argmin
+
+    labels = np.empty(len(X), dtype=np.int32)
+    for offset in range(0, len(X), ASSIGN_CHUNK):
+        chunk = slice(offset, offset + ASSIGN_CHUNK)
+        labels[chunk] = pairwise_distances_argmin(X[chunk], centers)
+        report(start + (end - start) * min(offset + ASSIGN_CHUNK, len(X)) / len(X))
+    return labels
+
+
+def _minibatch_kmeans(X, n_clusters, report, start, end, epochs=3, random_state=42):
+    from sklearn.cluster import MiniBatchKMeans
+
+    model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=BATCH_SIZE, random_state=random_state)
+    rng = np.random.default_rng(random_state)
+    n_batches = max(1, int(np.ceil(len(X) / BATCH_SIZE)))
+    for epoch in range(epochs):
+        for i, batch in enumerate(np.array_split(rng.permutation(len(X)), n_batches)):
+            model.partial_fit(X[np.sort(batch)])
+            done = (epoch * n_batches + i + 1) / (epochs * n_batches)
+            report(start + (end - start) * done)
+    return model.cluster_centers_
+
+
+def fit_scalable(name, X, n_clusters, algorithms, report=lambda fraction: None):
+    """Cluster labels for `X`, picking a backend by row count.
+
+    Small tables use a clone of the template in `algorithms`; larger ones use the scalable
+    counterpart of the same algorithm. `report` is called with the completed fraction.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    if len(X) <= EXACT_ROW_LIMITS[name]:
+        from sklearn.base import clone
+
+        labels = clone(algorithms[name]).set_params(n_clusters=n_clusters).fit_predict(X)
+        report(1.0)
+        return labels.astype(np.int32)
+
+    if name == 'Kmeans':
+        centers = _minibatch_kmeans(X, n_clusters, report, 0.0, 0.8)
+        return _nearest(X, centers, report, 0.8, 1.0)
+
+    if name == 'Kmedoids':
+        from sklearn_extra.cluster import KMedoids
+
+        rng = np.random.default_rng(42)
+        sample = X[np.sort(rng.choice(len(X), SAMPLE_SIZE, replace=False))]
+        medoids = KMedoids(n_clusters=n_clusters, random_state=42).fit(sample).cluster_centers_
+        report(0.5)
+        return _nearest(X, medoids, report, 0.5, 1.0)
+
+    if name == 'Agglomerative':
+        from sklearn.cluster import AgglomerativeClustering, MiniBatchKMeans
+
+        # ward on a k-means coreset of a sample, every row inherits the cluster of its center
+        sample = X[sample_rows(len(X), CORESET_SAMPLE_SIZE)]
+        centers = MiniBatchKMeans(
+            n_clusters=CORESET_SIZE, batch_size=BATCH_SIZE, n_init=1, random_state=42
+        ).fit(sample).cluster_centers_
+        report(0.4)
+        center_labels = AgglomerativeClustering(n_clusters=n_clusters, linkage='ward').fit_predict(centers)
+        report(0.5)
+        return center_labels[_nearest(X, centers, report, 0.5, 1.0)].astype(np.int32)
+
+    raise ValueError(f'Unknown clustering algorithm: {name}')
+
+
+def sample_rows(n_rows, size=SAMPLE_SIZE, random_state=42):
+    """Sorted row indices of a uniform random sample of `size` rows (all rows if fewer)."""
+    if n_rows <= size:
+        return np.arange(n_rows)
+    rng = np.random.default_rng(random_state)
+    return np.sort(rng.choice(n_rows, size, replace=False))
+
+
+def save_upload(contents, path):
+    """Write a dcc.Upload data URL as it was received; it is decoded by `cluster_upload`."""
+    with open(path, 'w') as file:
+        file.write(contents)
+
+
+def cluster_upload(path, name, n_clusters, algorithms, report=lambda fraction: None):
+    """Cluster the numeric columns of a CSV saved by `save_upload`, as a background job.
+
+    Returns the cluster sizes and a sample of the points (first two columns) with labels.
+    """
+    with open(path) as file:
+        _, encoded = file.read().split(',', 1)
+    table = pd.read_csv(io.BytesIO(base64.b64decode(encoded)))
+    table = table.select_dtypes('number').dropna()
+    if table.shape[1] < 2 or table.empty:
+        raise ValueError('The table needs at least two numeric columns.')
+    X = table.to_numpy(dtype=np.float32)
+    labels = fit_scalable(name, X, n_clusters, algorithms, report)
+    sample = sample_rows(len(X))
+    return {
+        'columns': list(table.columns[:2]),
+        'points': X[sample, :2],
+        'labels': labels[sample],
+        'cluster_sizes': np.bincount(labels, minlength=n_clusters),
+        'n_rows': len(X),
+    }
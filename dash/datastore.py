@@ -0,0 +1,114 @@
+import os
+import threading
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # the Parquet cache is optional, plain CSV parsing still works
+    pa = None
+    pq = None
+
+# ---- Dataset registry ----
+# Every page reads its data through `get_dataset` so each worker process parses a file once
+# and keeps a single copy in memory. Low-cardinality text columns are stored as categoricals.
+DATASETS_DIR = os.environ.get(
+    'DASH_DATASETS_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'datasets')
+)
+
+DATASETS = {
+    'customers': {
+        'file': 'customers.csv',
+        'categorical': ['Season', 'Gender', 'State_abbr', 'Item', 'Category', 'Payment', 'Frequency'],
+    },
+    'meteorites': {
+        'file': 'Meteorite_Landings.csv',
+        'categorical': ['recclass'],
+    },
+}
+
+_MTIME_KEY = b'source_mtime_ns'
+
+_frames = {}
+_lock = threading.Lock()
+
+
+def dataset_path(name):
+    """Absolute path of the CSV backing a registered dataset."""
+    return os.path.join(DATASETS_DIR, DATASETS[name]['file'])
+
+
+def _cache_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def _read_csv(csv_path, spec):
+    df = pd.read_csv(csv_path)
+    df = df.loc[:, ~df.columns.str.startswith('Unnamed:')]
+    for col in spec['categorical']:
+        df[col] = df[col].astype('category')
+    return df
+
+
+def _read_cache(cache_path, mtime_ns):
+    """Return the cached frame if it was built from the CSV with the given mtime."""
+    if pq is None or not os.path.exists(cache_path):
+        return None
+    try:
+        metadata = pq.read_schema(cache_path).metadata or {}
+        if metadata.get(_MTIME_KEY) != str(mtime_ns).encode():
+            return None
+        return pq.read_table(cache_path).to_pandas()
+    except (OSError, pa.ArrowException):
+        return None
+
+
+def _write_cache(df, cache_path, mtime_ns):
+    if pq is None:
+        return
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_MTIME_KEY] = str(mtime_ns).encode()
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        pq.write_table(table.replace_schema_metadata(metadata), tmp_path)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # read-only dataset directory: keep serving from the CSV
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _load(name):
+    spec = DATASETS[name]
+    csv_path = dataset_path(name)
+    cache_path = _cache_path(csv_path)
+    mtime_ns = os.stat(csv_path).st_mtime_ns
+
+    df = _read_cache(cache_path, mtime_ns)
+    if df is None:
+        df = _read_csv(csv_path, spec)
+        _write_cache(df, cache_path, mtime_ns)
+    return df
+
+
+def get_dataset(name):
+    """Return the shared, read-only frame for a registered dataset.
+
+    The frame is loaded once per process. Callers must not modify it in place.
+    """
+    df = _frames.get(name)
+    if df is None:
+        with _lock:
+            df = _frames.get(name)
+            if df is None:
+                df = _frames[name] = _load(name)
+    return df
+
+
+def preload(*names):
+    """Load the given datasets (all registered ones by default)."""
+    for name in names or DATASETS:
+        get_dataset(name)
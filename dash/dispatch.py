@@ -0,0 +1,35 @@
+from dash import ctx, no_update
+from dash.exceptions import MissingCallbackContextException
+
+# ---- Dependency-aware figure updates ----
+# Multi-output callbacks declare which inputs each output depends on. Only outputs whose
+# inputs changed are rebuilt; the others are answered with `no_update`, so they are neither
+# recomputed nor re-serialized.
+
+
+def changed_inputs():
+    """Ids of the components that triggered the running callback.
+
+    Returns None on the initial call (or when called outside of a Dash request, e.g. from
+    a benchmark), meaning every output has to be computed.
+    """
+    try:
+        triggered = ctx.triggered_prop_ids
+    except MissingCallbackContextException:
+        return None
+    if not triggered:
+        return None
+    return set(triggered.values())
+
+
+def dispatch(dependencies, builders):
+    """Build the outputs whose dependencies changed.
+
+    `dependencies` maps each output name to the input ids it reads, `builders` maps the same
+    names to zero-argument functions. Results are returned in the order of `builders`.
+    """
+    changed = changed_inputs()
+    return tuple(
+        build() if changed is None or not changed.isdisjoint(dependencies[name]) else no_update
+        for name, build in builders.items()
+    )
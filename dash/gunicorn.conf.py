@@ -0,0 +1,26 @@
+import settings
+
+# ---- gunicorn settings ----
+# Workers are forked after wsgi.py has imported the app (preload_app), and each serves
+# requests from a small thread pool. Sized through DASH_WORKERS / DASH_THREADS.
+
+bind = f'{settings.HOST}:{settings.PORT}'
+workers = settings.WORKERS
+threads = settings.THREADS
+worker_class = 'gthread'
+preload_app = True
+# slow clustering and exchange-rate fetches shouldn't get a worker killed
+timeout = 120
+graceful_timeout = 30
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    # warmup and ingestion threads started in the master would not survive the fork
+    import ingest
+    import lazy
+
+    if settings.PAGE_WARMUP != 'preload':
+        lazy.start(settings.PAGE_WARMUP)
+    # every worker reads the streamed rows into its own aggregates
+    ingest.start()
@@ -0,0 +1,214 @@
+import glob
+import io
+import itertools
+import logging
+import os
+import threading
+import time
+
+import dash
+from dash import dcc, Input, Output, State
+from dash.exceptions import PreventUpdate
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (about twice as fast at parsing the chunks)
+    _ENGINE = 'pyarrow'
+except ImportError:
+    _ENGINE = 'c'
+
+import aggregates
+from datastore import DATASETS, get_dataset
+import metrics
+import settings
+
+# ---- Streaming ingestion ----
+# New customers rows are read while the app runs and counted into the aggregate cubes the
+# /customers and /purchases charts are drawn from (`aggregates.append`), without rereading
+# customers.csv or rescanning earlier rows. Two sources, either or both:
+#
+#   DASH_INGEST_CSV   a CSV file being appended to (header line first); each read picks up
+#                     the complete lines written since the last one
+#   DASH_INGEST_DIR   a drop directory; every new *.csv file in it is read once, in name
+#                     order (write a file under another name, then rename it into place)
+#
+# Both hold rows that are not in customers.csv. Every server process reads them from the
+# start, so each gunicorn worker keeps complete aggregates of its own. The aggregates'
+# version is the number of bytes read from the sources, the same in every worker that read
+# as far. Open pages poll it with a dcc.Interval and redraw their charts when it grew.
+
+DATASET = 'customers'
+# categorical columns are parsed as when the dataset is loaded (and are cheaper to count)
+DTYPE = {col: 'category' for col in DATASETS[DATASET]['categorical']}
+ENABLED = bool(settings.INGEST_CSV or settings.INGEST_DIR)
+
+log = logging.getLogger(__name__)
+
+_thread = None
+_lock = threading.Lock()
+
+
+class CsvTail:
+    """Complete lines appended to a CSV file since the last read, in frames of `chunk_rows`."""
+
+    def __init__(self, path, chunk_rows, dtype=None):
+        self.path = path
+        self.name = 'csv'
+        self.chunk_rows = chunk_rows
+        self.dtype = dtype
+        # bytes read so far, across replaced and truncated files
+        self.consumed = 0
+        self._inode = None
+        self._offset = 0
+        self._header = None
+
+    def read(self, complete=False):
+        """Frames of the new lines; with `complete` a last line without a newline is included."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # new, replaced or truncated file: read it from the start
+            self._inode, self._offset, self._header = stat.st_ino, 0, None
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, 'rb') as file:
+            file.seek(self._offset)
+            if self._header is None:
+                header = file.readline()
+                if not header.endswith(b'\n'):
+                    return
+                self._header = header
+                self._offset += len(header)
+                self.consumed += len(header)
+            while True:
+                lines = list(itertools.islice(file, self.chunk_rows))
+                if lines and not lines[-1].endswith(b'\n') and not complete:
+                    # still being written, picked up by the next read
+                    lines.pop()
+                if not lines:
+                    return
+                size = sum(map(len, lines))
+                self._offset += size
+                self.consumed += size
+                data = io.BytesIO(b''.join([self._header, *lines]))
+                yield pd.read_csv(data, dtype=self.dtype, engine=_ENGINE)
+                if len(lines) < self.chunk_rows:
+                    return
+
+
+class DropDirectory:
+    """Every *.csv file new in a directory since the last read, in frames of `chunk_rows`."""
+
+    def __init__(self, path, chunk_rows, dtype=None):
+        self.path = path
+        self.name = 'directory'
+        self.chunk_rows = chunk_rows
+        self.dtype = dtype
+        # bytes of the files read so far
+        self.consumed = 0
+        self._seen = set()
+
+    def read(self):
+        for path in sorted(glob.glob(os.path.join(self.path, '*.csv'))):
+            if path in self._seen:
+                continue
+            self._seen.add(path)
+            tail = CsvTail(path, self.chunk_rows, self.dtype)
+            done = self.consumed
+            try:
+                # a file renamed into place is complete, read it like a tail from the start
+                for frame in tail.read(complete=True):
+                    self.consumed = done + tail.consumed
+                    yield frame
+            except (OSError, ValueError):
+                log.exception('could not read %s', path)
+            self.consumed = done + tail.consumed
+
+
+class Ingester:
+    def __init__(self, sources, interval):
+        self.sources = sources
+        self.interval = interval
+        self.rows = 0
+
+    def poll(self):
+        """Read every source once and add the new rows; returns how many were added."""
+        added = 0
+        columns = get_dataset(DATASET).columns
+        for source in self.sources:
+            for chunk in source.read():
+                started = time.perf_counter()
+                missing = columns.difference(chunk.columns)
+                if len(missing):
+                    log.warning('skipped %d %s rows without columns %s', len(chunk), source.name, list(missing))
+                    metrics.ingested(source.name, len(chunk), None)
+                    continue
+                aggregates.append(DATASET, chunk[columns], self.position())
+                metrics.ingested(source.name, len(chunk), time.perf_counter() - started)
+                added += len(chunk)
+        self.rows += added
+        return added
+
+    def position(self):
+        """Bytes read from all sources, the version of the rows added so far."""
+        return sum(source.consumed for source in self.sources)
+
+    def run(self):
+        while True:
+            try:
+                if self.poll():
+                    log.info('%d rows ingested, version %d', self.rows, aggregates.version(DATASET))
+            except Exception:
+                log.exception('ingestion failed')
+            time.sleep(self.interval)
+
+
+def sources():
+    """The sources configured in settings."""
+    found = []
+    if settings.INGEST_CSV:
+        found.append(CsvTail(settings.INGEST_CSV, settings.INGEST_CHUNK_ROWS, DTYPE))
+    if settings.INGEST_DIR:
+        found.append(DropDirectory(settings.INGEST_DIR, settings.INGEST_CHUNK_ROWS, DTYPE))
+    return found
+
+
+def start():
+    """Ingest from the configured sources in a daemon thread, once per process."""
+    global _thread
+    with _lock:
+        if not ENABLED or _thread is not None:
+            return
+        ingester = Ingester(sources(), settings.INGEST_INTERVAL)
+        _thread = threading.Thread(target=ingester.run, name='ingest', daemon=True)
+    _thread.start()
+
+
+# ---- Page refresh ----
+# A page adds `refresh_components(page)` to its layout, registers `register_refresh(page)`
+# and takes `<page>_version` as an input of its chart callbacks. The interval callback only
+# writes the store (and so redraws the charts) when the version grew; otherwise, also when
+# a worker that has not read as far answers, it sends an empty 204 response.
+
+def refresh_components(page):
+    return [
+        dcc.Interval(id=f'{page}_refresh', interval=settings.INGEST_REFRESH_MS, disabled=not ENABLED),
+        dcc.Store(id=f'{page}_version', data=aggregates.version(DATASET)),
+    ]
+
+
+def register_refresh(page):
+    @dash.callback(
+        Output(f'{page}_version', 'data'),
+        Input(f'{page}_refresh', 'n_intervals'),
+        State(f'{page}_version', 'data'),
+        prevent_initial_call=True,
+    )
+    def refresh(_, shown):
+        current = aggregates.version(DATASET)
+        if current <= (shown or 0):
+            raise PreventUpdate
+        return current
+    return refresh
@@ -0,0 +1,319 @@
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import shutil
+import signal
+import threading
+import time
+import uuid
+
+import settings
+
+# ---- Background jobs ----
+# Callbacks that may take seconds (network fetches, model fits) submit a job instead of
+# computing in the request thread, and a dcc.Interval polls its status until the result is
+# ready. Every job runs in a process of its own; at most `max_running` per server process,
+# the others wait in a queue. Job state lives in files under `directory`, so any server
+# worker can report on or cancel a job another one started:
+#
+#   <id>.input      input file of the job, if it has one (see `input_path`)
+#   <id>.claim      the job is wanted (written by the server process that queued it)
+#   <id>.pid        process running the job
+#   <id>.progress   completed fraction, when the job reports one
+#   <id>.result     pickled return value
+#   <id>.error      error message
+#   <id>.owners/    one file per client waiting for the job
+#
+# The job id is a hash of the job's name and arguments: identical jobs submitted while one
+# is queued, running or recently done share it and run once. A client cancels its interest
+# when its inputs change; the job is stopped once no client waits for it anymore.
+#
+# Job processes are started by a fork server (spawned where there is none), never forked
+# from the threaded server process itself: a fork copies locks other threads hold at that
+# moment (logging, sqlite, the allocator) and the child can hang on them forever. A job is
+# killed after `timeout` seconds, and when the server process that started it exits.
+
+log = logging.getLogger(__name__)
+
+
+def job_id(name, *args):
+    """Id of the job `name` with `args` (which must have a stable repr)."""
+    return hashlib.sha1(repr((name, args)).encode()).hexdigest()[:20]
+
+
+def write_atomic(path, write):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as file:
+        write(file)
+    os.replace(tmp, path)
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # a finished child of this process stays a zombie until it is joined
+    multiprocessing.active_children()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def _read(path, convert):
+    try:
+        with open(path) as file:
+            return convert(file.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _watch(parent):
+    # the job's parent is the fork server, so watch the server process that started it
+    while alive(parent):
+        time.sleep(1)
+    os._exit(1)
+
+
+def _run(func, args, files, parent):
+    threading.Thread(target=_watch, args=(parent,), daemon=True).start()
+    last = [0.0]
+
+    def report(fraction):
+        # a few hundred small writes per job at most
+        if fraction - last[0] >= 0.005 or fraction >= 1.0:
+            last[0] = fraction
+            write_atomic(files['progress'], lambda file: file.write(f'{fraction:.4f}'.encode()))
+
+    try:
+        result = func(*args, report=report)
+        write_atomic(files['result'], lambda file: pickle.dump(result, file))
+    except Exception as e:
+        write_atomic(files['error'], lambda file: file.write(f'{type(e).__name__}: {e}'.encode()))
+
+
+class JobQueue:
+    def __init__(self, directory, max_running=2, ttl=3600, timeout=600, preload=()):
+        self.directory = directory
+        self.max_running = max_running
+        # seconds a finished job's result is kept for identical submissions
+        self.ttl = ttl
+        # seconds a job may run before it is killed
+        self.timeout = timeout
+        # modules the fork server imports once, so jobs don't import them each time
+        self.preload = list(preload)
+        self._pid = None
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def _files(self, job):
+        base = os.path.join(self.directory, job)
+        files = {kind: f'{base}.{kind}' for kind in ('input', 'claim', 'pid', 'progress', 'result', 'error')}
+        files['owners'] = f'{base}.owners'
+        return files
+
+    def input_path(self, job):
+        """Path for a file the job reads (e.g. an upload), removed along with the job."""
+        os.makedirs(self.directory, exist_ok=True)
+        return self._files(job)['input']
+
+    def _ensure_started(self):
+        # per process: a queue created before gunicorn forks gets new threads in each worker
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            self._slots = threading.Semaphore(self.max_running)
+            self._running = set()
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                self._context = multiprocessing.get_context('forkserver')
+                # '__main__' too, or every job would import the main script again
+                self._context.set_forkserver_preload(['__main__', *self.preload])
+            else:
+                self._context = multiprocessing.get_context('spawn')
+            atexit.register(self._stop_all)
+            threading.Thread(target=self._dispatch, name='jobs', daemon=True).start()
+
+    def submit(self, job, func, *args):
+        """Queue `func(*args, report=...)` as `job` unless it is pending or done already.
+
+        Returns a handle for `status` and `cancel`, to keep in a dcc.Store.
+        """
+        self._ensure_started()
+        self._sweep()
+        files = self._files(job)
+        os.makedirs(files['owners'], exist_ok=True)
+        handle = {'id': job, 'owner': uuid.uuid4().hex}
+        open(os.path.join(files['owners'], handle['owner']), 'w').close()
+        if os.path.exists(files['result']):
+            return handle
+        if not self._claim(files):
+            if self.status(handle)['state'] in ('queued', 'running'):
+                # identical job already pending: wait for it
+                return handle
+            # failed, or its server process died: run it again (on the same input)
+            self._clear(files, keep=('owners', 'input'))
+            if not self._claim(files):
+                return handle
+        self._queue.put((job, func, args))
+        return handle
+
+    def _claim(self, files):
+        try:
+            fd = os.open(files['claim'], os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as file:
+            file.write(str(os.getpid()))
+        return True
+
+    def _wanted(self, files):
+        try:
+            return os.path.exists(files['claim']) and bool(os.listdir(files['owners']))
+        except FileNotFoundError:
+            return False
+
+    def _dispatch(self):
+        while True:
+            job, func, args = self._queue.get()
+            self._slots.acquire()
+            files = self._files(job)
+            if not self._wanted(files):
+                # cancelled while queued
+                self._slots.release()
+                continue
+            try:
+                process = self._context.Process(target=_run, args=(func, args, files, os.getpid()), daemon=True)
+                process.start()
+                write_atomic(files['pid'], lambda file: file.write(str(process.pid).encode()))
+            except Exception as e:
+                log.exception('could not start job %s', job)
+                self._slots.release()
+                write_atomic(files['error'], lambda file: file.write(f'{type(e).__name__}: {e}'.encode()))
+                continue
+            with self._lock:
+                self._running.add(process)
+            threading.Thread(target=self._reap, args=(job, process), daemon=True).start()
+
+    def _reap(self, job, process):
+        try:
+            process.join(self.timeout)
+            if process.is_alive():
+                log.warning('job %s killed after %s s', job, self.timeout)
+                self._stop(process)
+                files = self._files(job)
+                # unless it was cancelled (and maybe submitted again) meanwhile
+                if os.path.exists(files['claim']) and not os.path.exists(files['result']):
+                    message = f'The job took longer than {self.timeout} s.'
+                    write_atomic(files['error'], lambda file: file.write(message.encode()))
+        finally:
+            with self._lock:
+                self._running.discard(process)
+            self._slots.release()
+
+    @staticmethod
+    def _stop(process):
+        process.terminate()
+        process.join(5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def _stop_all(self):
+        # the server process is exiting: its jobs would run on unseen
+        with self._lock:
+            running = list(self._running)
+        for process in running:
+            if process.is_alive():
+                self._stop(process)
+
+    def status(self, handle):
+        """Dict with `state` (queued/running/done/error/unknown), `progress` (None if the job
+        does not report any) and `result` when done."""
+        files = self._files(handle['id'])
+        progress = _read(files['progress'], float)
+        if os.path.exists(files['result']):
+            try:
+                with open(files['result'], 'rb') as file:
+                    return {'state': 'done', 'progress': 1.0, 'result': pickle.load(file)}
+            except (OSError, EOFError, pickle.UnpicklingError):
+                # removed by a cancel or the sweep meanwhile
+                return {'state': 'unknown', 'progress': None}
+        error = _read(files['error'], str)
+        if error is not None:
+            return {'state': 'error', 'progress': progress, 'error': error}
+        pid = _read(files['pid'], int)
+        if pid is not None:
+            if alive(pid):
+                return {'state': 'running', 'progress': progress}
+            if os.path.exists(files['result']) or os.path.exists(files['error']):
+                # finished between the checks above and now
+                return self.status(handle)
+            return {'state': 'error', 'progress': progress, 'error': 'The job process died.'}
+        claimed_by = _read(files['claim'], int)
+        if claimed_by is not None and alive(claimed_by):
+            return {'state': 'queued', 'progress': None}
+        return {'state': 'unknown', 'progress': None}
+
+    def cancel(self, handle):
+        """Stop waiting for a job; it is stopped when no other client waits for it."""
+        files = self._files(handle['id'])
+        try:
+            os.remove(os.path.join(files['owners'], handle['owner']))
+            if os.listdir(files['owners']):
+                return
+        except FileNotFoundError:
+            pass
+        if os.path.exists(files['result']):
+            # kept for identical submissions until the sweep removes it
+            return
+        pid = _read(files['pid'], int)
+        if pid is not None and alive(pid):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        self._clear(files)
+
+    def _clear(self, files, keep=('owners',)):
+        for kind, path in files.items():
+            if kind in keep:
+                continue
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _sweep(self):
+        """Remove finished jobs older than `ttl` (at most once a minute)."""
+        now = time.time()
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if not name.endswith(('.result', '.error')):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) < self.ttl:
+                    continue
+            except FileNotFoundError:
+                continue
+            files = self._files(name.rsplit('.', 1)[0])
+            self._clear(files)
+            shutil.rmtree(files['owners'], ignore_errors=True)
+
+
+# shared by the pages; a JobQueue starts no threads before its first job
+background = JobQueue(
+    settings.JOBS_DIR, settings.JOBS_MAX_RUNNING, settings.JOBS_TTL, settings.JOBS_TIMEOUT,
+    preload=['rates', 'clustering'],
+)
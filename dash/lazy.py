@@ -0,0 +1,92 @@
+import logging
+import threading
+import time
+
+# ---- Lazy page state ----
+# Pages register their layout and callbacks at import time (Dash copies the callback map on
+# the first request, so callbacks can't be added later), but their datasets, heavy imports
+# (scikit-learn, ...) and models are built by a loader on first use:
+#
+#     @lazy.page_state('meteorites')
+#     def page_data():
+#         ...
+#
+# `page_data()` runs the loader once per process, concurrent callers wait for it. How the
+# loaders run at startup is chosen with `start`:
+#
+#   preload     load every page before serving (gunicorn: before forking the workers)
+#   background  serve immediately and load every page in a background thread
+#   none        each page loads on its first request
+
+WARMUP_MODES = ('preload', 'background', 'none')
+
+log = logging.getLogger(__name__)
+
+_states = {}
+
+
+class PageState:
+    def __init__(self, name, load):
+        self.name = name
+        self._load = load
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        # time the loader took, None until loaded
+        self.seconds = None
+
+    def __call__(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                started = time.perf_counter()
+                self._value = self._load()
+                self.seconds = time.perf_counter() - started
+                self._loaded = True
+                log.info('loaded %s in %.3f s', self.name, self.seconds)
+        return self._value
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+
+def page_state(name):
+    """Register the decorated loader as the state of `name`, built once on first call."""
+    def register(load):
+        state = _states[name] = PageState(name, load)
+        return state
+    return register
+
+
+def load_all():
+    """Build the state of every registered page (already loaded ones are skipped)."""
+    for state in list(_states.values()):
+        try:
+            state()
+        except Exception:
+            # retried by the page's first request, which then reports the error
+            log.exception('loading %s failed', state.name)
+
+
+def warmup():
+    """Load every page in a daemon thread and return the thread."""
+    thread = threading.Thread(target=load_all, name='page-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def start(mode):
+    """Run the page loaders as configured (one of WARMUP_MODES)."""
+    if mode not in WARMUP_MODES:
+        raise ValueError(f'Unknown page warmup mode: {mode!r} (expected one of {", ".join(WARMUP_MODES)})')
+    if mode == 'preload':
+        load_all()
+    elif mode == 'background':
+        warmup()
+
+
+def timings():
+    """Loader time in seconds of every registered page (None if not loaded yet)."""
+    return {name: state.seconds for name, state in _states.items()}
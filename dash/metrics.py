@@ -0,0 +1,312 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+import flask
+
+# ---- Callback metrics ----
+# When enabled (settings.METRICS), every server callback is timed and its payload sizes,
+# exceptions and the hit rates of the data caches are recorded in histograms and counters,
+# served in the Prometheus text format on /metrics. Callback time is split into:
+#
+#   compute        the callback body, without figure construction
+#   figure_build   time inside plotly express functions, go.Figure construction and figure
+#                  skeletons (figures.py)
+#   serialization  the rest of the request: Dash validating and encoding the response
+#
+# With several server processes each one dumps its metrics to METRICS_DIR (at most once a
+# second) and /metrics merges the dumps of the processes still running.
+#
+# When disabled nothing is wrapped and `cache_access` returns after one global lookup.
+
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_HELP = {
+    'dash_callback_seconds': ('histogram', 'Callback wall time by phase.'),
+    'dash_callback_request_bytes': ('histogram', 'Size of the callback request body.'),
+    'dash_callback_response_bytes': ('histogram', 'Size of the callback response body.'),
+    'dash_callback_exceptions_total': ('counter', 'Callbacks that raised an exception.'),
+    'dash_cache_requests_total': ('counter', 'Cache lookups by cache and result (hit or miss).'),
+    'dash_ingest_rows_total': ('counter', 'Streamed rows by source and result (added or rejected).'),
+    'dash_ingest_chunk_seconds': ('histogram', 'Time to add one chunk of streamed rows to the aggregates.'),
+}
+
+log = logging.getLogger('dash.metrics')
+
+_registry = None
+_local = threading.local()
+
+
+class Registry:
+    """Histograms and counters keyed by metric name and a sorted tuple of labels."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'buckets': list(buckets), 'counts': [0] * (len(buckets) + 1), 'sum': 0.0,
+                }
+            histogram['counts'][bisect.bisect_left(histogram['buckets'], value)] += 1
+            histogram['sum'] += value
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'histograms': [[name, labels, dict(h, counts=list(h['counts']))]
+                               for (name, labels), h in self._histograms.items()],
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+            }
+
+
+def _merge(snapshots):
+    histograms, counters = {}, {}
+    for snapshot in snapshots:
+        for name, labels, h in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, {'buckets': h['buckets'], 'counts': [0] * len(h['counts']), 'sum': 0.0})
+            merged['counts'] = [a + b for a, b in zip(merged['counts'], h['counts'])]
+            merged['sum'] += h['sum']
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def _labels_text(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+def render(snapshots):
+    """Prometheus text exposition of merged registry snapshots."""
+    histograms, counters = _merge(snapshots)
+    lines = []
+    for metric, (kind, text) in _HELP.items():
+        lines += [f'# HELP {metric} {text}', f'# TYPE {metric} {kind}']
+        for (name, labels), h in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, count in zip([*h['buckets'], '+Inf'], h['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels_text(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels_text(labels)} {h["sum"]}')
+            lines.append(f'{name}_count{_labels_text(labels)} {cumulative}')
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f'{name}{_labels_text(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+# ---- Cache accounting ----
+
+def cache_access(cache, hit):
+    """Count a lookup in one of the app's caches (a no-op unless metrics are enabled)."""
+    if _registry is not None:
+        _registry.inc('dash_cache_requests_total', {'cache': cache, 'result': 'hit' if hit else 'miss'})
+
+
+def ingested(source, rows, seconds):
+    """Count a chunk of streamed rows; `seconds` is None when the chunk was rejected."""
+    if _registry is not None:
+        result = 'rejected' if seconds is None else 'added'
+        _registry.inc('dash_ingest_rows_total', {'source': source, 'result': result}, rows)
+        if seconds is not None:
+            _registry.observe('dash_ingest_chunk_seconds', {'source': source}, seconds, TIME_BUCKETS)
+
+
+# ---- Instrumentation ----
+
+def _timed_build(func):
+    """Wrap a figure factory so its time is attributed to figure building."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        depth = getattr(_local, 'build_depth', 0)
+        if depth or not hasattr(_local, 'build_seconds'):
+            # nested in another factory, or not inside a callback
+            _local.build_depth = depth + 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _local.build_depth = depth
+        _local.build_depth = 1
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.build_seconds += time.perf_counter() - started
+            _local.build_depth = 0
+
+    return wrapper
+
+
+def _instrument_figures():
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    import figures
+
+    skip = {'set_mapbox_access_token', 'get_trendline_results'}
+    for name in px.__all__:
+        func = getattr(px, name, None)
+        if callable(func) and not isinstance(func, type) and name not in skip:
+            setattr(px, name, _timed_build(func))
+    go.Figure.__init__ = _timed_build(go.Figure.__init__)
+    figures.FigureSkeleton.__call__ = _timed_build(figures.FigureSkeleton.__call__)
+
+
+def _instrument_callback(func):
+    from dash.exceptions import PreventUpdate
+
+    name = f'{func.__module__.rsplit(".", 1)[-1]}.{func.__name__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _local.build_seconds = 0.0
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except PreventUpdate:
+            raise
+        except Exception as e:
+            _registry.inc('dash_callback_exceptions_total', {'callback': name, 'exception': type(e).__name__})
+            raise
+        finally:
+            body = time.perf_counter() - started
+            build = _local.build_seconds
+            del _local.build_seconds
+            if flask.has_request_context():
+                flask.g.metrics_callback = (name, body, build)
+
+    return wrapper
+
+
+def instrument():
+    """Wrap `dash.callback` and the plotly figure factories.
+
+    Must run before the pages are imported, i.e. before `Dash(..., use_pages=True)`.
+    """
+    global _registry
+    import dash
+
+    _registry = Registry()
+    callback = dash.callback
+
+    @functools.wraps(callback)
+    def instrumented_callback(*args, **kwargs):
+        register = callback(*args, **kwargs)
+        return lambda func: register(_instrument_callback(func))
+
+    dash.callback = instrumented_callback
+    _instrument_figures()
+
+
+def install(server, log_json=False, directory=None):
+    """Record the measured callbacks of every request and serve them on /metrics."""
+    if log_json and not log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+        log.propagate = False
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    last_dump = [0.0]
+
+    @server.before_request
+    def start_timer():
+        flask.g.metrics_started = time.perf_counter()
+
+    @server.after_request
+    def record(response):
+        measured = flask.g.pop('metrics_callback', None)
+        if measured is None:
+            return response
+        name, body, build = measured
+        now = time.perf_counter()
+        serialization = max(now - flask.g.metrics_started - body, 0.0)
+        labels = {'callback': name}
+        for phase, seconds in (('compute', body - build), ('figure_build', build), ('serialization', serialization)):
+            _registry.observe('dash_callback_seconds', {**labels, 'phase': phase}, seconds, TIME_BUCKETS)
+        request_bytes = flask.request.content_length or 0
+        response_bytes = response.calculate_content_length() or 0
+        _registry.observe('dash_callback_request_bytes', labels, request_bytes, SIZE_BUCKETS)
+        _registry.observe('dash_callback_response_bytes', labels, response_bytes, SIZE_BUCKETS)
+        if log_json:
+            log.info(json.dumps({
+                'callback': name, 'status': response.status_code,
+                'compute_ms': round(1e3 * (body - build), 3), 'figure_build_ms': round(1e3 * build, 3),
+                'serialization_ms': round(1e3 * serialization, 3),
+                'request_bytes': request_bytes, 'response_bytes': response_bytes,
+            }))
+        if directory and now - last_dump[0] >= 1.0:
+            last_dump[0] = now
+            _dump(directory)
+        return response
+
+    @server.route('/metrics')
+    def metrics():
+        snapshots = [_registry.snapshot()]
+        if directory:
+            _dump(directory)
+            snapshots = _load_dumps(directory)
+        return flask.Response(render(snapshots), mimetype='text/plain; version=0.0.4')
+
+
+# ---- Sharing between server processes ----
+
+def _dump(directory):
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as file:
+        json.dump(_registry.snapshot(), file)
+    os.replace(tmp, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _load_dumps(directory):
+    """Snapshots of the running processes; dumps of exited ones are removed."""
+    snapshots = []
+    for filename in os.listdir(directory):
+        pid, ext = os.path.splitext(filename)
+        if ext != '.json' or not pid.isdigit():
+            continue
+        path = os.path.join(directory, filename)
+        if not _alive(int(pid)):
+            os.remove(path)
+            continue
+        try:
+            with open(path) as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            pass
+    return snapshots
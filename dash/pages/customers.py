@@ -1,12 +1,31 @@
+from types import SimpleNamespace
+
 import dash
-from dash import dcc, html, Input, Output
-import pandas as pd
+from dash import dcc, html, Input, Output, ClientsideFunction
 import plotly.express as px
 import dash_bootstrap_components as dbc
 
+import aggregates
+from aggregates import get_customer_cube
+from datastore import get_dataset
+from dispatch import dispatch
+from figures import skeleton
+import ingest
+import lazy
+import settings
+
 dash.register_page(__name__, path='/customers', name='Customers Overview')
 
-df = pd.read_csv('../datasets/customers.csv')
+
+@lazy.page_state('customers')
+def page_data():
+    df = get_dataset('customers')
+    return SimpleNamespace(
+        df=df,
+        cube=get_customer_cube(),
+        state_abbr=dict(df[['State_name', 'State_abbr']].drop_duplicates().itertuples(index=False)),
+    )
+
 
 # ---- Content Cards ----
 season_filter = html.Div([
@@ -23,36 +42,41 @@ season_filter = html.Div([
     ), 
 ], className='select_row')
 
-gender_card = dbc.Card([
-    dbc.CardBody([
-        html.H3('Gender'),
-        dcc.Dropdown(
-            id='location_dropdown',
-            options=[{'label': loc, 'value': loc} for loc in sorted(df['State_name'].unique())],
-            value=df['State_name'].unique()[0],
-            className='dropdown'
-        ),
-        dcc.Graph(id='gender_pie')
-    ])
-], className='h-100')
 
-location_card = dbc.Card([
-    dbc.CardBody([
-        html.H3('Location'),
-        html.Label('Select age range:'),
-        dcc.RangeSlider(
-            id='age_range',
-            min=int(df['Age'].min()),
-            max=int(df['Age'].max()),
-            step=1,
-            value=[int(df['Age'].min()), int(df['Age'].max())],
-            marks={i: str(i) for i in range(int(df['Age'].min()), int(df['Age'].max()) + 1, 5)},
-            tooltip={'placement': 'bottom', 'always_visible': True},
-            className='slider'
-        ),
-        dcc.Graph(id='location_choropleth')
+def gender_card(df):
+    return dbc.Card([
+        dbc.CardBody([
+            html.H3('Gender'),
+            dcc.Dropdown(
+                id='location_dropdown',
+                options=[{'label': loc, 'value': loc} for loc in sorted(df['State_name'].unique())],
+                value=df['State_name'].unique()[0],
+                className='dropdown'
+            ),
+            dcc.Graph(id='gender_pie')
+        ])
+    ], className='h-100')
+
+
+def location_card(df):
+    return dbc.Card([
+        dbc.CardBody([
+            html.H3('Location'),
+            html.Label('Select age range:'),
+            dcc.RangeSlider(
+                id='age_range',
+                min=int(df['Age'].min()),
+                max=int(df['Age'].max()),
+                step=1,
+                value=[int(df['Age'].min()), int(df['Age'].max())],
+                marks={i: str(i) for i in range(int(df['Age'].min()), int(df['Age'].max()) + 1, 5)},
+                tooltip={'placement': 'bottom', 'always_visible': True},
+                className='slider'
+            ),
+            dcc.Graph(id='location_choropleth')
+        ])
     ])
-])
+
 
 review_card = dbc.Card(
     dbc.CardBody([
@@ -61,62 +85,61 @@ review_card = dbc.Card(
     ])
 )
 
-age_card = dbc.Card(
-    dbc.CardBody([
-        html.H3('Age'),
-        html.Div([
-            html.Label('Select gender:'),
-            dbc.RadioItems(
-                id='gender_radio',
-                options=[{'label': g, 'value': g} for g in df['Gender'].unique()],
-                value=df['Gender'].unique()[0],
-                inline=True,
-                className='radio'
-            ), 
-        ], className='select-row'),
-        dcc.Graph(id='age_hist')
-    ]), className='h-100')
+
+def age_card(df):
+    return dbc.Card(
+        dbc.CardBody([
+            html.H3('Age'),
+            html.Div([
+                html.Label('Select gender:'),
+                dbc.RadioItems(
+                    id='gender_radio',
+                    options=[{'label': g, 'value': g} for g in df['Gender'].unique()],
+                    value=df['Gender'].unique()[0],
+                    inline=True,
+                    className='radio'
+                ), 
+            ], className='select-row'),
+            dcc.Graph(id='age_hist')
+        ]), className='h-100')
+
 
 # ---- Content Layout ----
-layout = dbc.Container([
+def layout(**_):
+    # built per visit, so the data is only loaded once the page is opened
+    df = page_data().df
+    children = [
         html.H2('Customers Overview'),
         dbc.Card(dbc.CardBody(season_filter)),
         html.Br(),
         dbc.Row([
-            dbc.Col(gender_card, width=5, className='card_chart'),
-            dbc.Col(location_card, width=7, className='card_chart')
+            dbc.Col(gender_card(df), width=5, className='card_chart'),
+            dbc.Col(location_card(df), width=7, className='card_chart')
         ]),
         html.Br(),
         dbc.Row([
             dbc.Col(review_card, width=7, className='card_chart'),
-            dbc.Col(age_card, width=5, className='card_chart')
-        ])
-], fluid=True)
-
-# ---- Callback ----
-@dash.callback(
-    Output('gender_pie', 'figure'),
-    Output('location_choropleth', 'figure'),
-    Output('review_line', 'figure'),
-    Output('age_hist', 'figure'),
-    Input('season_filter', 'value'),
-    Input('location_dropdown', 'value'),
-    Input('gender_radio', 'value'),
-    Input('age_range', 'value')
-)
-def update_graphs(seasons, selected_location, selected_gender, selected_age_range):
-    dff = df[df['Season'].isin(seasons)]
+            dbc.Col(age_card(df), width=5, className='card_chart')
+        ]),
+        *ingest.refresh_components('customers'),
+    ]
+    if settings.CLIENTSIDE_FILTERING:
+        # shipped once with the layout, every later update runs in the browser
+        children.append(dcc.Store(id='customers_payload', data=clientside_payload()))
+    return dbc.Container(children, fluid=True)
 
-    # Gender Pie
-    pie_df = dff[dff['State_name'] == selected_location]
-    fig_pie = px.pie(pie_df, names='Gender')
+# ---- Figures ----
+# Each chart's px figure is built once and then only gets new data (see figures.py)
+@skeleton({'labels': 'Gender', 'values': 'Count'})
+def gender_pie_figure(pie_df):
+    fig_pie = px.pie(pie_df, names='Gender', values='Count')
     fig_pie.update_layout(height=400)
+    return fig_pie
 
-    # Choropleth map (grouped and counted by state)
+
+@skeleton({'locations': 'State_abbr', 'z': 'Count'})
+def location_choropleth_figure(age_df):
     pastel_colorscale = [[0.0, '#A8DADC'], [1.0, '#C5a3D9']] 
-    min_age, max_age = selected_age_range
-    age_df = dff[(dff['Age'] >= min_age) & (dff['Age'] <= max_age)]
-    age_df = age_df.groupby('State_abbr').size().reset_index(name='Count')
     fig_map = px.choropleth(
         age_df,
         locations='State_abbr',
@@ -125,16 +148,124 @@ def update_graphs(seasons, selected_location, selected_gender, selected_age_rang
         color='Count',
         color_continuous_scale=pastel_colorscale)
     fig_map.update_layout(height=450)
+    return fig_map
 
-    # Average Review Rating Line Chart
-    agg_df = dff.groupby('Amount')['Review_Rating'].mean().reset_index()
+
+@skeleton({'x': 'Amount', 'y': 'Review_Rating'})
+def review_line_figure(agg_df):
     fig_line = px.line(agg_df, x='Amount', y='Review_Rating', markers=True)
     fig_line.update_layout(xaxis_title='Amount (USD)', yaxis_title='Average Review Rating', height=450)
+    return fig_line
+
 
-    # Age Histogram
-    gender_df = dff[dff['Gender'] == selected_gender]
-    fig_hist = px.histogram(gender_df, x='Age', nbins=20)
-    fig_hist.update_layout(height=400)
+@skeleton({'x': 'Age', 'y': 'Count'})
+def age_hist_figure(gender_df):
+    fig_hist = px.histogram(gender_df, x='Age', y='Count', histfunc='sum', nbins=20)
+    fig_hist.update_layout(height=400, yaxis_title='count')
     fig_hist.update_traces(marker_color='#C5a3D9', marker_line_width=1, marker_line_color='white')
+    return fig_hist
+
+
+def gender_pie(seasons, selected_location):
+    data = page_data()
+    pie_df = data.cube.aggregate('Gender', Season=seasons, State_abbr=data.state_abbr.get(selected_location))
+    return gender_pie_figure(pie_df.rename_axis('Gender').reset_index())
+
+
+def location_choropleth(seasons, selected_age_range):
+    # grouped and counted by state
+    min_age, max_age = selected_age_range
+    age_df = page_data().cube.aggregate('State_abbr', Season=seasons, Age=slice(min_age, max_age))
+    return location_choropleth_figure(age_df.rename_axis('State_abbr').reset_index())
+
+
+def review_line(seasons):
+    # average review rating per amount
+    cube = page_data().cube
+    rating_sum = cube.aggregate('Amount', 'Review_Rating', Season=seasons)
+    rating_count = cube.aggregate('Amount', Season=seasons)
+    agg_df = (rating_sum / rating_count).rename('Review_Rating').rename_axis('Amount').reset_index()
+    return review_line_figure(agg_df)
+
+
+def age_hist(seasons, selected_gender):
+    # pre-counted ages, binned by plotly
+    gender_df = page_data().cube.aggregate('Age', Season=seasons, Gender=selected_gender)
+    return age_hist_figure(gender_df.rename_axis('Age').reset_index())
+
+
+# Inputs each figure depends on; the others are left untouched when an input changes.
+# New rows (customers_version) change every figure.
+FIGURE_INPUTS = {
+    'gender_pie': {'season_filter', 'location_dropdown', 'customers_version'},
+    'location_choropleth': {'season_filter', 'age_range', 'customers_version'},
+    'review_line': {'season_filter', 'customers_version'},
+    'age_hist': {'season_filter', 'gender_radio', 'customers_version'},
+}
+
+# Inputs of update_graphs, in argument order
+CALLBACK_INPUTS = ['season_filter', 'location_dropdown', 'gender_radio', 'age_range']
+
+# ---- Callback ----
+def update_graphs(seasons, selected_location, selected_gender, selected_age_range, _version=None):
+    # All four charts are answered from the precomputed cube instead of scanning rows
+    return dispatch(FIGURE_INPUTS, {
+        'gender_pie': lambda: gender_pie(seasons, selected_location),
+        'location_choropleth': lambda: location_choropleth(seasons, selected_age_range),
+        'review_line': lambda: review_line(seasons),
+        'age_hist': lambda: age_hist(seasons, selected_gender),
+    })
+
+
+# ---- Clientside mode ----
+def clientside_payload():
+    """Cube marginals and figure skeletons the browser needs to draw every chart."""
+    data = page_data()
+    cube, state_abbr = data.cube, data.state_abbr
+    seasons = cube.labels['Season'].tolist()
+    return {
+        'state_abbr': state_abbr,
+        'marginals': {
+            'gender_pie': cube.export(['Season', 'Gender', 'State_abbr']),
+            'location_choropleth': cube.export(['Season', 'State_abbr', 'Age']),
+            'review_count': cube.export(['Season', 'Amount']),
+            'review_sum': cube.export(['Season', 'Amount'], 'Review_Rating'),
+            'age_hist': cube.export(['Season', 'Gender', 'Age']),
+        },
+        'skeletons': {
+            'gender_pie': gender_pie(seasons, next(iter(state_abbr))),
+            'location_choropleth': location_choropleth(seasons, [cube.labels['Age'].min(), cube.labels['Age'].max()]),
+            'review_line': review_line(seasons),
+            'age_hist': age_hist(seasons, cube.labels['Gender'][0]),
+        },
+    }
+
+
+ingest.register_refresh('customers')
+
+if settings.CLIENTSIDE_FILTERING:
+    # built once per version of the data, the first time by the warmup
+    clientside_payload = aggregates.versioned('customers')(clientside_payload)
+    lazy.page_state('customers.payload')(clientside_payload)
+
+    @dash.callback(Output('customers_payload', 'data'), Input('customers_version', 'data'), prevent_initial_call=True)
+    def refresh_payload(_):
+        return clientside_payload()
 
-    return fig_pie, fig_map, fig_line, fig_hist
\ No newline at end of file
+    for figure_id, inputs in FIGURE_INPUTS.items():
+        dash.clientside_callback(
+            ClientsideFunction(namespace='customers', function_name=figure_id),
+            Output(figure_id, 'figure'),
+            Input('customers_payload', 'data'),
+            # argument order matches the JS functions in assets/clientside.js
+            *[Input(input_id, 'value') for input_id in CALLBACK_INPUTS if input_id in inputs]
+        )
+else:
+    dash.callback(
+        Output('gender_pie', 'figure'),
+        Output('location_choropleth', 'figure'),
+        Output('review_line', 'figure'),
+        Output('age_hist', 'figure'),
+        *[Input(input_id, 'value') for input_id in CALLBACK_INPUTS],
+        Input('customers_version', 'data'),
+    )(update_graphs)
\ No newline at end of file
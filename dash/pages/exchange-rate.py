@@ -1,13 +1,27 @@
-import yfinance as yf
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash import dcc, html, no_update
+from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 import pandas as pd
 
+from jobs import background, job_id
+from rates import RateStore, fetch_histories, make_provider
+import lazy
+import settings
+
 dash.register_page(__name__, path='/exchange-rate')
 
+SYMBOLS = ["CZKUSD=X", "PLNUSD=X"]
+
+
+@lazy.page_state('exchange-rate')
+def rate_store():
+    # Rates are served from the local store, only missing date ranges are fetched
+    provider = make_provider(settings.RATES_PROVIDER, settings.RATES_FIXTURES_DIR, settings.RATES_FIXTURES_DELAY)
+    return RateStore(provider, settings.RATES_DB)
+
+
 czk_to_pln_card = dbc.Card([
     dbc.CardBody([
         dcc.DatePickerRange(
@@ -17,39 +31,106 @@ czk_to_pln_card = dbc.Card([
             start_date=pd.to_datetime("2024-01-01").date(),
             end_date=pd.to_datetime("today").date(),
         ),
+        dbc.Progress(id='rates-progress', value=0, striped=True, animated=True, className='my-2'),
+        html.Div(id='rates-status'),
         dcc.Graph(
-            id='exchange-rate-chart', 
-            config={'displayModeBar': True}, 
-        )
+            id='exchange-rate-chart',
+            config={'displayModeBar': True},
+        ),
+        # missing rates are fetched by a background job (see jobs.py), polled until done
+        dcc.Store(id='rates-job'),
+        dcc.Interval(id='rates-poll', interval=500, disabled=True),
     ])
-]) 
+])
 
 layout = html.Div([
     html.H2("CZK to PLN Exchange Rate"),
     czk_to_pln_card,
 ])
 
-# Callback to update graph
-@dash.callback(
-    Output('exchange-rate-chart', 'figure'),
-    Input('date-picker', 'start_date'),
-    Input('date-picker', 'end_date')
-)
-def update_chart(start_date, end_date):
-    # Ensure date format is YYYY-MM-DD
-    start_date = pd.to_datetime(start_date).strftime('%Y-%m-%d')
-    end_date = pd.to_datetime(end_date).strftime('%Y-%m-%d')
-    
-    # Get exchange rates
-    czk_usd = yf.Ticker("CZKUSD=X").history(start=start_date, end=end_date)["Close"]
-    pln_usd = yf.Ticker("PLNUSD=X").history(start=start_date, end=end_date)["Close"]
-    
+
+def rate_figure(start_date, end_date):
+    # Get exchange rates (both legs are in the store)
+    czk_usd, pln_usd = rate_store().histories(SYMBOLS, start_date, end_date)
+
     # Compute CZK to PLN rate
     czk_pln = czk_usd / pln_usd
-    
+
     # Create figure
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=czk_pln.index, y=czk_pln, mode='lines', name='CZK to PLN'))
     fig.update_layout(title='CZK to PLN Exchange Rate Over Time', xaxis_title='Date', yaxis_title='Exchange Rate')
-    
     return fig
+
+
+def _dates(start_date, end_date):
+    # Ensure date format is YYYY-MM-DD
+    return pd.to_datetime(start_date).strftime('%Y-%m-%d'), pd.to_datetime(end_date).strftime('%Y-%m-%d')
+
+
+def _fetch_job(start_date, end_date):
+    return job_id('rates', settings.RATES_PROVIDER, settings.RATES_DB, SYMBOLS, start_date, end_date)
+
+
+def _progress(status):
+    # (bar value, bar label); a queued job shows an empty bar
+    if status['progress'] is None:
+        return 0, ''
+    percent = round(100 * status['progress'])
+    return percent, f'{percent} %'
+
+
+# Outputs: chart, job handle, poll disabled, status text, progress value and label
+# Stored ranges are drawn right away; otherwise a fetch job is started and polled.
+@dash.callback(
+    Output('exchange-rate-chart', 'figure'),
+    Output('rates-job', 'data'),
+    Output('rates-poll', 'disabled'),
+    Output('rates-status', 'children'),
+    Output('rates-progress', 'value'),
+    Output('rates-progress', 'label'),
+    Input('date-picker', 'start_date'),
+    Input('date-picker', 'end_date'),
+    State('rates-job', 'data'),
+)
+def update_chart(start_date, end_date, previous_job):
+    start_date, end_date = _dates(start_date, end_date)
+    job = _fetch_job(start_date, end_date)
+    if previous_job and previous_job['id'] != job:
+        # the dates changed while fetching: the old range is not needed anymore
+        background.cancel(previous_job)
+    elif previous_job:
+        return no_update, no_update, False, no_update, no_update, no_update
+    if rate_store().stored(SYMBOLS, start_date, end_date):
+        return rate_figure(start_date, end_date), None, True, '', 0, ''
+    handle = background.submit(
+        job, fetch_histories, settings.RATES_PROVIDER, settings.RATES_FIXTURES_DIR, settings.RATES_DB,
+        SYMBOLS, start_date, end_date, settings.RATES_FIXTURES_DELAY,
+    )
+    return no_update, handle, False, 'Fetching exchange rates...', 0, ''
+
+
+@dash.callback(
+    Output('exchange-rate-chart', 'figure', allow_duplicate=True),
+    Output('rates-job', 'data', allow_duplicate=True),
+    Output('rates-poll', 'disabled', allow_duplicate=True),
+    Output('rates-status', 'children', allow_duplicate=True),
+    Output('rates-progress', 'value', allow_duplicate=True),
+    Output('rates-progress', 'label', allow_duplicate=True),
+    Input('rates-poll', 'n_intervals'),
+    State('rates-job', 'data'),
+    State('date-picker', 'start_date'),
+    State('date-picker', 'end_date'),
+    prevent_initial_call=True,
+)
+def poll_chart(_, job, start_date, end_date):
+    if not job:
+        return no_update, no_update, True, no_update, no_update, no_update
+    status = background.status(job)
+    if status['state'] in ('queued', 'running'):
+        return (no_update, no_update, False, 'Fetching exchange rates...', *_progress(status))
+    if status['state'] == 'done':
+        start_date, end_date = _dates(start_date, end_date)
+        return rate_figure(start_date, end_date), None, True, '', 0, ''
+    message = status.get('error', 'The fetch was interrupted, please pick the dates again.')
+    return no_update, None, True, f'Could not fetch the exchange rates: {message}', 0, ''
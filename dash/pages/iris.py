@@ -1,20 +1,49 @@
+import uuid
+from types import SimpleNamespace
+
 import dash
-from dash import Input, Output, dcc, html
+from dash import Input, Output, State, dcc, html, no_update
 import dash_bootstrap_components as dbc
-import pandas as pd
 import numpy as np
 import plotly.express as px
-from sklearn.cluster import AgglomerativeClustering
-from sklearn.cluster import KMeans
-from sklearn_extra.cluster import KMedoids
+
+from clustering import ClusterCache, cluster_upload, fit_labels, save_upload
+from figures import skeleton
+from jobs import background, job_id
+import lazy
+import settings
 
 dash.register_page(__name__, path='/iris')
 
-algorithms = {
-    'Agglomerative': AgglomerativeClustering(n_clusters=3, linkage='ward'),
-    'Kmeans': KMeans(n_clusters=3, random_state=42),
-    'Kmedoids': KMedoids(n_clusters=3, random_state=42)
-}
+ALGORITHMS = ['Agglomerative', 'Kmeans', 'Kmedoids']
+
+
+@lazy.page_state('iris')
+def models():
+    # scikit-learn takes about a second to import, so only once the page is used
+    from sklearn.cluster import AgglomerativeClustering
+    from sklearn.cluster import KMeans
+    from sklearn_extra.cluster import KMedoids
+
+    # Estimator templates, never fitted directly (see clustering.ClusterCache)
+    algorithms = {
+        'Agglomerative': AgglomerativeClustering(n_clusters=3, linkage='ward'),
+        'Kmeans': KMeans(n_clusters=3, random_state=42),
+        'Kmedoids': KMedoids(n_clusters=3, random_state=42)
+    }
+
+    df = px.data.iris()
+    X = df.drop(columns=['species', 'species_id'])
+
+    cluster_cache = ClusterCache(algorithms, X, data_key='iris')
+    if settings.CLUSTER_PREWARM:
+        cluster_cache.prewarm()
+
+    return SimpleNamespace(
+        df=df,
+        cluster_cache=cluster_cache,
+    )
+
 
 interactive_plot_card = dbc.Card([
     dbc.CardBody([
@@ -40,11 +69,47 @@ clustering_plot_card = dbc.Card([
         ),
         html.P("Choose clustering algorithm:"),
         dcc.Dropdown(
-            list(algorithms.keys()), 
-            list(algorithms.keys())[0], 
+            ALGORITHMS, 
+            ALGORITHMS[0], 
             id='cluster-alg-dropdown',
             clearable=False 
         ),
+        dbc.Progress(id='cluster-fit-progress', value=0, striped=True, animated=True, className='my-2'),
+        html.Div(id='cluster-fit-status'),
+        # fits that are not cached yet run as a background job (see jobs.py), polled until done
+        dcc.Store(id='cluster-fit-job'),
+        dcc.Interval(id='cluster-fit-poll', interval=500, disabled=True),
+    ])
+])
+
+upload_card = dbc.Card([
+    dbc.CardBody([
+        html.H5('Cluster your own numeric table'),
+        dcc.Upload(
+            id='cluster-upload',
+            children=html.Div(['Drag and drop or ', html.A('select a CSV file')]),
+            className='upload'
+        ),
+        dbc.Row([
+            dbc.Col([
+                html.P("Choose clustering algorithm:"),
+                dcc.Dropdown(
+                    ALGORITHMS,
+                    'Kmeans',
+                    id='upload-alg-dropdown',
+                    clearable=False
+                ),
+            ], width=8),
+            dbc.Col([
+                html.P("Number of clusters:"),
+                dbc.Input(id='upload-n-clusters', type='number', min=2, max=20, step=1, value=3),
+            ], width=4),
+        ], className='my-2'),
+        dbc.Progress(id='cluster-progress', value=0, className='my-2'),
+        html.Div(id='cluster-status'),
+        dcc.Graph(id='upload-scatter'),
+        dcc.Store(id='cluster-job'),
+        dcc.Interval(id='cluster-poll', interval=500, disabled=True),
     ])
 ])
 
@@ -82,35 +147,170 @@ layout = html.Div([
     dbc.Row([
         dbc.Col(interactive_plot_card, width=6),
         dbc.Col(clustering_plot_card, width=6)
-    ])
+    ]),
+    html.Br(),
+    dbc.Row(dbc.Col(upload_card)),
 ])
 
 
+# ---- Figures ----
+# Built once by plotly express, later calls only swap the data arrays (see figures.py)
+POINT_ARRAYS = {
+    'x': 'sepal_width',
+    'y': 'sepal_length',
+    'customdata': ['petal_width'],
+    'marker.size': 'petal_length',
+    # px scales marker areas to the largest petal length of the plotted rows
+    'marker.sizeref': lambda frame: frame['petal_length'].max() / 20 ** 2,
+}
+
+
+@skeleton(POINT_ARRAYS, split='species')
+def species_scatter(frame):
+    return px.scatter(
+        frame, x="sepal_width", y="sepal_length",
+        color="species", size='petal_length',
+        hover_data=['petal_width']
+    )
+
+
+@skeleton({**POINT_ARRAYS, 'marker.color': 'color'})
+def cluster_scatter(frame):
+    return px.scatter(
+        frame, x="sepal_width", y="sepal_length",
+        color="color", size='petal_length',
+        hover_data=['petal_width']
+    )
+
+
 @dash.callback(
     Output("scatter-plot", "figure"),
     Input("range-slider", "value"))
 def update_scatter_plot(slider_range):
-    df = px.data.iris()
     low, high = slider_range
+    df = models().df
     mask = (df['petal_width'] > low) & (df['petal_width'] < high)
-    fig = px.scatter(
-        df[mask], x="sepal_width", y="sepal_length",
-        color="species", size='petal_length',
-        hover_data=['petal_width']
-    )
-    return fig
+    return species_scatter(df[mask])
+
+def _start_fit(alg_name):
+    """Job data for a fit of `alg_name`: the warmup's fit while it runs, else a background job."""
+    cluster_cache = models().cluster_cache
+    if cluster_cache.pending(alg_name):
+        return {'algorithm': alg_name}
+    job = job_id('cluster', *cluster_cache.key(alg_name))
+    handle = background.submit(job, fit_labels, cluster_cache.algorithms[alg_name], cluster_cache.X)
+    return dict(handle, algorithm=alg_name)
 
+
+# Outputs: chart, job data, poll disabled, status text, progress value
+# Cached labels are drawn right away; otherwise the fit is polled until done.
 @dash.callback(
     Output("scatter-plot2", "figure"),
-    Input("cluster-alg-dropdown", "value"))
-def update_scatter_plot2(alg_name):
-    df = px.data.iris()
-    X = df.drop(columns=['species', 'species_id'])
-    model = algorithms[alg_name]
-    y_pred = model.fit_predict(X)
+    Output("cluster-fit-job", "data"),
+    Output("cluster-fit-poll", "disabled"),
+    Output("cluster-fit-status", "children"),
+    Output("cluster-fit-progress", "value"),
+    Input("cluster-alg-dropdown", "value"),
+    State("cluster-fit-job", "data"))
+def update_scatter_plot2(alg_name, previous_job=None):
+    iris = models()
+    if previous_job and previous_job['algorithm'] != alg_name:
+        # another algorithm was picked while fitting (a warmup fit has no job to cancel)
+        if 'id' in previous_job:
+            background.cancel(previous_job)
+    elif previous_job:
+        return no_update, no_update, False, no_update, no_update
+    y_pred = iris.cluster_cache.cached(alg_name)
+    if y_pred is not None:
+        return cluster_scatter(iris.df.assign(color=y_pred)), None, True, '', 0
+    # a fit reports no progress, the full striped bar moves while it runs
+    return no_update, _start_fit(alg_name), False, f'Fitting {alg_name}...', 100
+
+@dash.callback(
+    Output("scatter-plot2", "figure", allow_duplicate=True),
+    Output("cluster-fit-job", "data", allow_duplicate=True),
+    Output("cluster-fit-poll", "disabled", allow_duplicate=True),
+    Output("cluster-fit-status", "children", allow_duplicate=True),
+    Output("cluster-fit-progress", "value", allow_duplicate=True),
+    Input("cluster-fit-poll", "n_intervals"),
+    State("cluster-fit-job", "data"),
+    prevent_initial_call=True)
+def poll_scatter_plot2(_, job):
+    if not job:
+        return no_update, no_update, True, no_update, no_update
+    iris = models()
+    alg_name = job['algorithm']
+    y_pred = iris.cluster_cache.cached(alg_name)
+    if y_pred is None and 'id' not in job:
+        if iris.cluster_cache.pending(alg_name):
+            return no_update, no_update, False, f'Fitting {alg_name}...', 100
+        # the warmup fit failed: fit it as a job
+        return no_update, _start_fit(alg_name), False, f'Fitting {alg_name}...', 100
+    if y_pred is None:
+        status = background.status(job)
+        if status['state'] in ('queued', 'running'):
+            return no_update, no_update, False, f'Fitting {alg_name}...', 100
+        if status['state'] != 'done':
+            message = status.get('error', 'The fit was interrupted, please pick the algorithm again.')
+            return no_update, None, True, f'Could not fit {alg_name}: {message}', 0
+        y_pred = iris.cluster_cache.put(alg_name, status['result'])
+    elif 'id' in job:
+        # the warmup finished the same fit first
+        background.cancel(job)
+    return cluster_scatter(iris.df.assign(color=y_pred)), None, True, '', 0
+
+@dash.callback(
+    Output("cluster-job", "data"),
+    Output("cluster-poll", "disabled"),
+    Output("cluster-status", "children"),
+    Input("cluster-upload", "contents"),
+    Input("upload-alg-dropdown", "value"),
+    Input("upload-n-clusters", "value"),
+    State("cluster-job", "data"),
+    prevent_initial_call=True)
+def start_clustering(contents, alg_name, n_clusters, previous_job):
+    if contents is None or not n_clusters:
+        return no_update, no_update, no_update
+    if previous_job:
+        background.cancel(previous_job)
+    # decoding and parsing a large table takes seconds: both happen in the job
+    job = job_id('upload', uuid.uuid4().hex)
+    path = background.input_path(job)
+    save_upload(contents, path)
+    handle = background.submit(
+        job, cluster_upload, path, alg_name, int(n_clusters), models().cluster_cache.algorithms,
+    )
+    return dict(handle, algorithm=alg_name), False, 'Clustering...'
+
+@dash.callback(
+    Output("cluster-progress", "value"),
+    Output("cluster-progress", "label"),
+    Output("upload-scatter", "figure"),
+    Output("cluster-poll", "disabled", allow_duplicate=True),
+    Output("cluster-status", "children", allow_duplicate=True),
+    Input("cluster-poll", "n_intervals"),
+    State("cluster-job", "data"),
+    prevent_initial_call=True)
+def poll_clustering(_, job):
+    if not job:
+        return 0, '', no_update, True, no_update
+    status = background.status(job)
+    percent = round(100 * (status['progress'] or 0))
+    if status['state'] in ('queued', 'running'):
+        return percent, f'{percent} %', no_update, False, 'Clustering...'
+    if status['state'] != 'done':
+        message = status.get('error', 'The clustering job was lost, please upload again.')
+        return percent, '', no_update, True, f'Could not cluster the table: {message}'
+
+    result = status['result']
+    x, y = result['columns']
+    points = result['points']
     fig = px.scatter(
-        df, x="sepal_width", y="sepal_length",
-        color=y_pred, size='petal_length',
-        hover_data=['petal_width']
+        x=points[:, 0], y=points[:, 1],
+        color=result['labels'].astype(str),
+        labels={'x': x, 'y': y, 'color': 'cluster'}
     )
-    return fig
\ No newline at end of file
+    message = (f"{job['algorithm']} on {result['n_rows']:,} rows, "
+               f"showing a sample of {len(points):,} points. "
+               f"Cluster sizes: {', '.join(f'{n:,}' for n in result['cluster_sizes'])}")
+    return 100, '100 %', fig, True, message
\ No newline at end of file
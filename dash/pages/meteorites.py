@@ -1,66 +1,61 @@
+from types import SimpleNamespace
+
 import dash
-from dash import Input, Output, dcc, html
+from dash import Input, Output, Patch, dcc, html
 import dash_bootstrap_components as dbc
-import pandas as pd
+import numpy as np
 import plotly.express as px
 
+from datastore import get_dataset
+from dispatch import changed_inputs
+from figures import skeleton
+import lazy
+from tables import TableEngine
+
 dash.register_page(__name__, path='/meteorites')
 
-path = '../datasets/Meteorite_Landings.csv'
-df = pd.read_csv(path)
-df = df.dropna(subset=["mass (g)"])
-df = df.sort_values("mass (g)", ascending=False).head(1000)
+TABLE_PAGE_SIZE = 10
 
-# print(df)
 
-map_card = dbc.Card([
-    dbc.CardBody([
-        dcc.Graph(
-            figure = px.scatter_geo(df, lat="reclat", lon="reclong", size="mass (g)", hover_name="name"),
-            id="meteorite-map",
-        ),
-        html.H4("Filter by Year"),
-        dcc.RangeSlider(
-            id='year-slider',
-            min=int(df['year'].min()),
-            max=int(df['year'].max()),
-            step=1,
-            value=[int(df['year'].min()), int(df['year'].max())],
-            marks={int(year): str(int(year)) for year in df['year'].dropna().unique()[::10]},
-            tooltip={"placement": "bottom", "always_visible": True},
-        ),
-    ])
-]) 
-
-layout = html.Div([
-    # html.H1('Table of meteorite data'),
-    # dash.dash_table.DataTable(
-    #     id='meteorite-table',
-    #     columns=[{"name": i, "id": i} for i in df.columns],
-    #     data=df.to_dict('records'),
-    #     page_size=10,
-    #     style_table={'overflowX': 'auto'},
-    #     style_cell={
-    #         'textAlign': 'left',
-    #         'padding': '5px',
-    #         'border': '1px solid black',
-    #         "background-color": "#212529",
-    #         "color": "white",
-    #     },
-    # ),
-    html.H2('Map of meteorite landings'),
-    map_card,
-])
+@lazy.page_state('meteorites')
+def page_data():
+    df = get_dataset('meteorites')
+    # the table pages, sorts and filters every row on the server (see tables.py)
+    table = TableEngine(df)
+    df = df.dropna(subset=["mass (g)"])
+    df = df.sort_values("mass (g)", ascending=False).head(1000)
+
+    # ---- Year index ----
+    # Rows sorted by year, so a year range is a contiguous slice found by binary search
+    by_year = df.sort_values("year", kind="stable").reset_index(drop=True)
+    return SimpleNamespace(
+        df=df,
+        table=table,
+        by_year=by_year,
+        years=by_year["year"].to_numpy(),
+        lats=by_year["reclat"].to_numpy(),
+        lons=by_year["reclong"].to_numpy(),
+        names=by_year["name"].to_numpy(),
+        masses=by_year["mass (g)"].to_numpy(),
+        # marker scale of the full dataset (plotly express default size_max=20), kept for every filter
+        sizeref=2.0 * by_year["mass (g)"].max() / 20 ** 2,
+    )
 
-@dash.callback(
-    Output("meteorite-map", "figure"),
-    Input("year-slider", "value"))
-def update_scatter_plot(year_range):
-    low, high = year_range
-    filtered_df = df[(df["year"] >= low) & (df["year"] <= high)]
 
+def year_slice(years, low, high):
+    return slice(np.searchsorted(years, low, side="left"), np.searchsorted(years, high, side="right"))
+
+
+@skeleton({
+    'lat': 'reclat',
+    'lon': 'reclong',
+    'hovertext': 'name',
+    'marker.size': 'mass (g)',
+    'marker.color': 'year',
+})
+def map_figure(rows):
     fig = px.scatter_geo(
-        filtered_df,
+        rows,
         lat="reclat",
         lon="reclong",
         size="mass (g)",
@@ -68,5 +63,90 @@ def update_scatter_plot(year_range):
         color="year",
         projection="natural earth"
     )
+    fig.update_traces(marker_sizeref=page_data().sizeref)
+    return fig
+
+
+def map_card(df):
+    return dbc.Card([
+        dbc.CardBody([
+            dcc.Graph(
+                id="meteorite-map",
+            ),
+            html.H4("Filter by Year"),
+            dcc.RangeSlider(
+                id='year-slider',
+                min=int(df['year'].min()),
+                max=int(df['year'].max()),
+                step=1,
+                value=[int(df['year'].min()), int(df['year'].max())],
+                marks={int(year): str(int(year)) for year in df['year'].dropna().unique()[::10]},
+                tooltip={"placement": "bottom", "always_visible": True},
+            ),
+        ])
+    ]) 
 
-    return fig
\ No newline at end of file
+
+def layout(**_):
+    # built per visit, so the data is only loaded once the page is opened
+    data = page_data()
+    return html.Div([
+        html.H2('Table of meteorite data'),
+        dash.dash_table.DataTable(
+            id='meteorite-table',
+            columns=data.table.columns(),
+            page_current=0,
+            page_size=TABLE_PAGE_SIZE,
+            page_action='custom',
+            sort_action='custom',
+            sort_mode='multi',
+            sort_by=[],
+            filter_action='custom',
+            filter_query='',
+            style_table={'overflowX': 'auto'},
+            style_cell={
+                'textAlign': 'left',
+                'padding': '5px',
+                'border': '1px solid black',
+                "background-color": "#212529",
+                "color": "white",
+            },
+        ),
+        html.H2('Map of meteorite landings'),
+        map_card(data.df),
+    ])
+
+
+@dash.callback(
+    Output("meteorite-map", "figure"),
+    Input("year-slider", "value"))
+def update_scatter_plot(year_range):
+    low, high = year_range
+    data = page_data()
+    rows = year_slice(data.years, low, high)
+
+    if changed_inputs() is not None:
+        # the map is already on the page: only replace the trace arrays
+        patch = Patch()
+        trace = patch["data"][0]
+        trace["lat"] = data.lats[rows]
+        trace["lon"] = data.lons[rows]
+        trace["hovertext"] = data.names[rows]
+        trace["marker"]["size"] = data.masses[rows]
+        trace["marker"]["color"] = data.years[rows]
+        return patch
+
+    return map_figure(data.by_year.iloc[rows])
+
+
+# Only the visible page is sent; the table asks for another one when it is paged, sorted
+# or filtered.
+@dash.callback(
+    Output('meteorite-table', 'data'),
+    Output('meteorite-table', 'page_count'),
+    Input('meteorite-table', 'page_current'),
+    Input('meteorite-table', 'page_size'),
+    Input('meteorite-table', 'sort_by'),
+    Input('meteorite-table', 'filter_query'))
+def update_table(page_current, page_size, sort_by, filter_query):
+    return page_data().table.page(page_current, page_size, sort_by, filter_query)
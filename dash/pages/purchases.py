@@ -1,12 +1,38 @@
+from types import SimpleNamespace
+
 import dash
-from dash import dcc, html, Input, Output
-import pandas as pd
+from dash import dcc, html, Input, Output, ClientsideFunction
 import plotly.express as px
 import dash_bootstrap_components as dbc
 
+import aggregates
+from aggregates import declare, get_cube
+from dispatch import dispatch
+from figures import skeleton
+import ingest
+import lazy
+import settings
+
 dash.register_page(__name__, path='/purchases', name='Purchases Overview')
 
-df = pd.read_csv('../datasets/customers.csv')
+
+GROUP_OPTIONS = ['Item', 'Category']
+ORDER_DIMS = {group: ['Season', 'Gender', group] for group in GROUP_OPTIONS}
+FREQUENCY_DIMS = ['Gender', 'Frequency', 'Discount']
+PAYMENT_DIMS = ['Age', 'Payment']
+for dims in [*ORDER_DIMS.values(), FREQUENCY_DIMS, PAYMENT_DIMS]:
+    declare('customers', dims)
+
+
+@lazy.page_state('purchases')
+def cubes():
+    # count cubes over the customers rows, kept up to date by the ingestion (ingest.py)
+    return SimpleNamespace(
+        orders={group: get_cube('customers', dims) for group, dims in ORDER_DIMS.items()},
+        frequency=get_cube('customers', FREQUENCY_DIMS),
+        payment=get_cube('customers', PAYMENT_DIMS),
+    )
+
 
 # ---- Content Cards ----
 season_filter = html.Div([
@@ -42,99 +68,193 @@ item_category_card = dbc.Card([
     ])
 ])
 
-freq_card = dbc.Card([
-    dbc.CardBody([
-        html.H3('Purchase Frequency by Discount Usage'),
-        html.Div([
-            html.Label('Select Gender(s):'),
-            dbc.Checklist(
-                id='gender_filter',
-                options=[{'label': g, 'value': g} for g in sorted(df['Gender'].unique())],
-                value=df['Gender'].unique().tolist(),
-                inline=True,
-                input_checked_style={
-                    'backgroundColor': '#C5a3D9',
-                    'borderColor': '#C5a3D9'},
-                className='checklist'
+
+def freq_card(genders):
+    return dbc.Card([
+        dbc.CardBody([
+            html.H3('Purchase Frequency by Discount Usage'),
+            html.Div([
+                html.Label('Select Gender(s):'),
+                dbc.Checklist(
+                    id='gender_filter',
+                    options=[{'label': g, 'value': g} for g in sorted(genders)],
+                    value=list(genders),
+                    inline=True,
+                    input_checked_style={
+                        'backgroundColor': '#C5a3D9',
+                        'borderColor': '#C5a3D9'},
+                    className='checklist'
+                ),
+            ], className='select-row'),
+            html.Br(),
+            dcc.Graph(id='discount_freq_bar')
+        ])
+    ], className='h-100')
+
+
+def payment_card(ages):
+    return dbc.Card([
+        dbc.CardBody([
+            html.H3('Payment Methods by Age'),
+            html.Label('Select Age Range:'),
+            dcc.RangeSlider(
+                id='age_range',
+                min=int(ages.min()),
+                max=int(ages.max()),
+                step=1,
+                value=[int(ages.min()), int(ages.max())],
+                marks={i: str(i) for i in range(int(ages.min()), int(ages.max()) + 1, 5)},
+                tooltip={'placement': 'bottom', 'always_visible': True},
+                className='slider'
             ),
-        ], className='select-row'),
-        html.Br(),
-        dcc.Graph(id='discount_freq_bar')
-    ])
-], className='h-100')
+            html.Br(),
+            dcc.Graph(id='payment_donut')
+        ])
+    ], className='h-100')
 
-payment_card = dbc.Card([
-    dbc.CardBody([
-        html.H3('Payment Methods by Age'),
-        html.Label('Select Age Range:'),
-        dcc.RangeSlider(
-            id='age_range',
-            min=int(df['Age'].min()),
-            max=int(df['Age'].max()),
-            step=1,
-            value=[int(df['Age'].min()), int(df['Age'].max())],
-            marks={i: str(i) for i in range(int(df['Age'].min()), int(df['Age'].max()) + 1, 5)},
-            tooltip={'placement': 'bottom', 'always_visible': True},
-            className='slider'
-        ),
-        html.Br(),
-        dcc.Graph(id='payment_donut')
-    ])
-], className='h-100')
 
 # ---- Content Layout ----
-layout = dbc.Container([
+def layout(**_):
+    # built per visit, so the data is only loaded once the page is opened
+    data = cubes()
+    children = [
         html.H2('Purchases Overview'),
         dbc.Card(dbc.CardBody(season_filter)),
         html.Br(),
         dbc.Row(dbc.Col(item_category_card, className='card_chart')),
         html.Br(),
         dbc.Row([
-            dbc.Col(payment_card, width=6, className='card_chart'),
-            dbc.Col(freq_card, width=6, className='card_chart')
+            dbc.Col(payment_card(data.payment.labels['Age']), width=6, className='card_chart'),
+            dbc.Col(freq_card(data.frequency.labels['Gender'].tolist()), width=6, className='card_chart')
         ]),
-],fluid=True)
-
-# ---- Callback ----
-@dash.callback(
-    Output('orders_bar', 'figure'),
-    Output('discount_freq_bar', 'figure'),
-    Output('payment_donut', 'figure'),
-    Input('season_filter', 'value'),
-    Input('group_by', 'value'),
-    Input('gender_filter', 'value'),
-    Input('age_range', 'value')
-)
-
-def update_graphs(selected_seasons, group_by, selected_genders, selected_age_range):
-    dff = df[df['Season'].isin(selected_seasons)]
-
-    # Items-Category Barplot
-    grouped = dff.groupby([group_by, 'Gender']).size().reset_index(name='OrderCount')
+        *ingest.refresh_components('purchases'),
+    ]
+    if settings.CLIENTSIDE_FILTERING:
+        # shipped once with the layout, every later update runs in the browser
+        children.append(dcc.Store(id='purchases_payload', data=clientside_payload()))
+    return dbc.Container(children, fluid=True)
 
+# ---- Figures ----
+# Each chart's px figure is built once and then only gets new data (see figures.py)
+@skeleton({'x': 'Group', 'y': 'OrderCount'}, split='Gender')
+def orders_bar_figure(grouped, group_by):
     fig_bar_item_cat = px.bar(grouped, x=group_by, y='OrderCount', color='Gender', barmode='group')
     fig_bar_item_cat.update_layout(xaxis_title=group_by, yaxis_title="Number of Orders", legend_title='Gender')
+    return fig_bar_item_cat
 
-    # Frequency-Discount Barplot
-    dff = df[df['Gender'].isin(selected_genders)]
-    freq_counts = dff.groupby(['Frequency', 'Discount']).size().reset_index(name='Count')
 
+@skeleton({'x': 'Frequency', 'y': 'Count'}, split='Discount')
+def discount_freq_bar_figure(freq_counts):
     fig_bar_freq = px.bar(freq_counts,
                  x='Frequency', y='Count', color='Discount',
                  barmode='stack',
                  labels={'Frequency': 'Purchase Frequency', 'Count': 'Number of Customers'})
     fig_bar_freq.update_xaxes(categoryorder='array', categoryarray=['Weekly','Bi-Weekly', 'Fortnightly', 'Monthly', 'Every 3 Months', 'Quarterly', 'Annually'])
+    return fig_bar_freq
 
-    # Payment Donut
-    min_age, max_age = selected_age_range
-    dff = df[(df['Age'] >= min_age) & (df['Age'] <= max_age)]
-
-    payment_counts = dff['Payment'].value_counts().reset_index()
-    payment_counts.columns = ['Payment Method', 'Count']
 
+@skeleton({'labels': 'Payment Method', 'values': 'Count'})
+def payment_donut_figure(payment_counts):
     fig_donut = px.pie(payment_counts,
                  names='Payment Method',
                  values='Count',
                  hole=0.4) #color_discrete_sequence=px.colors.qualitative.Pastel
+    return fig_donut
+
+
+def orders_bar(selected_seasons, group_by):
+    # items-category barplot
+    cube = cubes().orders[group_by]
+    grouped = cube.aggregate([group_by, 'Gender'], Season=selected_seasons).reset_index(name='OrderCount')
+    # the x column under a fixed name, whichever column it is grouped by
+    grouped['Group'] = grouped[group_by]
+    return orders_bar_figure(grouped, group_by)
+
+
+def discount_freq_bar(selected_genders):
+    # frequency-discount barplot
+    cube = cubes().frequency
+    freq_counts = cube.aggregate(['Frequency', 'Discount'], Gender=selected_genders).reset_index(name='Count')
+    return discount_freq_bar_figure(freq_counts)
+
+
+def payment_donut(selected_age_range):
+    min_age, max_age = selected_age_range
+    payment_counts = cubes().payment.aggregate('Payment', Age=slice(min_age, max_age))
+    # most used first, like value_counts
+    payment_counts = payment_counts.sort_values(ascending=False, kind='stable').reset_index()
+    payment_counts.columns = ['Payment Method', 'Count']
+    return payment_donut_figure(payment_counts)
+
+
+# Inputs each figure depends on; the others are left untouched when an input changes.
+# New rows (purchases_version) change every figure.
+FIGURE_INPUTS = {
+    'orders_bar': {'season_filter', 'group_by', 'purchases_version'},
+    'discount_freq_bar': {'gender_filter', 'purchases_version'},
+    'payment_donut': {'age_range', 'purchases_version'},
+}
+
+# Inputs of update_graphs, in argument order
+CALLBACK_INPUTS = ['season_filter', 'group_by', 'gender_filter', 'age_range']
+
+# ---- Callback ----
+def update_graphs(selected_seasons, group_by, selected_genders, selected_age_range, _version=None):
+    return dispatch(FIGURE_INPUTS, {
+        'orders_bar': lambda: orders_bar(selected_seasons, group_by),
+        'discount_freq_bar': lambda: discount_freq_bar(selected_genders),
+        'payment_donut': lambda: payment_donut(selected_age_range),
+    })
+
+
+# ---- Clientside mode ----
+def clientside_payload():
+    """Per-chart count marginals and figure skeletons the browser needs to draw every chart."""
+    data = cubes()
+    seasons = data.orders['Item'].labels['Season'].tolist()
+    genders = data.frequency.labels['Gender'].tolist()
+    ages = data.payment.labels['Age']
+    age_range = [int(ages.min()), int(ages.max())]
+    return {
+        'marginals': {
+            'orders_bar': {
+                group: data.orders[group].export(['Season', 'Gender', group]) for group in GROUP_OPTIONS
+            },
+            'discount_freq_bar': data.frequency.export(['Gender', 'Frequency', 'Discount']),
+            'payment_donut': data.payment.export(['Age', 'Payment']),
+        },
+        'skeletons': {
+            'orders_bar': {group: orders_bar(seasons, group) for group in GROUP_OPTIONS},
+            'discount_freq_bar': discount_freq_bar(genders),
+            'payment_donut': payment_donut(age_range),
+        },
+    }
+
+
+ingest.register_refresh('purchases')
+
+if settings.CLIENTSIDE_FILTERING:
+    # built once per version of the data, the first time by the warmup
+    clientside_payload = aggregates.versioned('customers')(clientside_payload)
+    lazy.page_state('purchases.payload')(clientside_payload)
+
+    @dash.callback(Output('purchases_payload', 'data'), Input('purchases_version', 'data'), prevent_initial_call=True)
+    def refresh_payload(_):
+        return clientside_payload()
 
-    return fig_bar_item_cat, fig_bar_freq, fig_donut
\ No newline at end of file
+    for figure_id, inputs in FIGURE_INPUTS.items():
+        dash.clientside_callback(
+            ClientsideFunction(namespace='purchases', function_name=figure_id),
+            Output(figure_id, 'figure'),
+            Input('purchases_payload', 'data'),
+            # argument order matches the JS functions in assets/clientside.js
+            *[Input(input_id, 'value') for input_id in CALLBACK_INPUTS if input_id in inputs]
+        )
+else:
+    dash.callback(
+        Output('orders_bar', 'figure'),
+        Output('discount_freq_bar', 'figure'),
+        Output('payment_donut', 'figure'),
+        *[Input(input_id, 'value') for input_id in CALLBACK_INPUTS],
+        Input('purchases_version', 'data'),
+    )(update_graphs)
\ No newline at end of file
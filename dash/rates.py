@@ -0,0 +1,262 @@
+import datetime as dt
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from jobs import alive
+import metrics
+
+# ---- Rate providers ----
+# A provider returns daily closing prices for a symbol as a Series indexed by date, for the
+# half-open date range [start, end).
+
+
+class RateProvider:
+    def fetch(self, symbol, start, end):
+        raise NotImplementedError
+
+
+class YahooProvider(RateProvider):
+    def fetch(self, symbol, start, end):
+        import yfinance as yf
+
+        history = yf.Ticker(symbol).history(start=start.isoformat(), end=end.isoformat())
+        if history.empty or 'Close' not in history:
+            return pd.Series(dtype='float64')
+        close = history['Close']
+        index = close.index.tz_localize(None) if close.index.tz is not None else close.index
+        close.index = index.normalize().date
+        return close
+
+
+class FileProvider(RateProvider):
+    """Offline stand-in reading `<directory>/<symbol>.csv` files with Date and Close columns.
+
+    `delay` seconds are slept per fetch, to simulate a slow network. A file is parsed once per
+    process and again only when its mtime changes.
+    """
+
+    _closes = {}  # path -> (mtime_ns, closes)
+    _lock = threading.Lock()
+
+    def __init__(self, directory, delay=0):
+        self.directory = directory
+        self.delay = delay
+
+    def _read(self, path):
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = self._closes.get(path)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        with self._lock:
+            cached = self._closes.get(path)
+            if cached is None or cached[0] != mtime_ns:
+                df = pd.read_csv(path, parse_dates=['Date'])
+                close = pd.Series(df['Close'].to_numpy(), index=df['Date'].dt.date)
+                cached = self._closes[path] = (mtime_ns, close)
+        return cached[1]
+
+    def fetch(self, symbol, start, end):
+        if self.delay:
+            time.sleep(self.delay)
+        path = os.path.join(self.directory, f'{symbol}.csv')
+        if not os.path.exists(path):
+            return pd.Series(dtype='float64')
+        close = self._read(path)
+        return close[(close.index >= start) & (close.index < end)]
+
+
+def make_provider(name, fixtures_dir=None, delay=0):
+    if name == 'yahoo':
+        return YahooProvider()
+    if name == 'file':
+        return FileProvider(fixtures_dir, delay)
+    raise ValueError(f'Unknown rate provider: {name}')
+
+
+# ---- Local rate store ----
+# Fetched closes are kept in SQLite together with the date ranges that were already asked
+# for, so only the missing ranges go to the provider. A range being fetched is claimed in the
+# `fetching` table, which the threads and processes (background jobs) sharing the store all
+# see: a request only fetches what is neither stored nor claimed, and waits for the claims
+# of others that overlap its range. Claims of processes that died are dropped.
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS rates (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    close REAL NOT NULL,
+    PRIMARY KEY (symbol, date)
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    symbol TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fetching (
+    symbol TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    pid INTEGER NOT NULL
+);
+'''
+
+# seconds between checks of the claims a request waits for
+_CLAIM_POLL = 0.2
+
+
+def _as_date(value):
+    return pd.to_datetime(value).date()
+
+
+def missing_ranges(covered, start, end):
+    """Parts of [start, end) not inside any of the `covered` half-open ranges."""
+    gaps = []
+    cursor = start
+    for lo, hi in sorted(covered):
+        if hi <= cursor:
+            continue
+        if lo >= end:
+            break
+        if lo > cursor:
+            gaps.append((cursor, lo))
+        cursor = max(cursor, hi)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def _merge(ranges):
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+class RateStore:
+    def __init__(self, provider, path, max_workers=4):
+        self.provider = provider
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='rates')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _covered(self, conn, symbol):
+        rows = conn.execute('SELECT start, end FROM coverage WHERE symbol = ?', (symbol,))
+        return [(_as_date(lo), _as_date(hi)) for lo, hi in rows]
+
+    def _fetch_and_store(self, symbol, start, end):
+        close = self.provider.fetch(symbol, start, end)
+        # today's close is still moving, so it is never marked as fetched
+        covered_end = min(end, dt.date.today())
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO rates (symbol, date, close) VALUES (?, ?, ?)',
+                [(symbol, date.isoformat(), float(value)) for date, value in close.items()]
+            )
+            if start < covered_end:
+                ranges = _merge(self._covered(conn, symbol) + [(start, covered_end)])
+                conn.execute('DELETE FROM coverage WHERE symbol = ?', (symbol,))
+                conn.executemany(
+                    'INSERT INTO coverage (symbol, start, end) VALUES (?, ?, ?)',
+                    [(symbol, lo.isoformat(), hi.isoformat()) for lo, hi in ranges]
+                )
+
+    def _gaps(self, symbol, start, end):
+        with self._connect() as conn:
+            return missing_ranges(self._covered(conn, symbol), start, end)
+
+    def _claim(self, symbol, start, end):
+        """Claim the missing parts of [start, end) nobody is fetching yet.
+
+        Returns the claims ([(rowid, start, end)]) and whether other claims overlap the range.
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute('SELECT rowid, start, end, pid FROM fetching WHERE symbol = ?', (symbol,)).fetchall()
+            dead = [rowid for rowid, _, _, pid in rows if not alive(pid)]
+            conn.executemany('DELETE FROM fetching WHERE rowid = ?', [(rowid,) for rowid in dead])
+            others = [(_as_date(lo), _as_date(hi)) for rowid, lo, hi, _ in rows if rowid not in dead]
+            claims = []
+            waiting = False
+            for gap in missing_ranges(self._covered(conn, symbol), start, end):
+                parts = missing_ranges(others, *gap)
+                waiting = waiting or parts != [gap]
+                for lo, hi in parts:
+                    cursor = conn.execute(
+                        'INSERT INTO fetching (symbol, start, end, pid) VALUES (?, ?, ?, ?)',
+                        (symbol, lo.isoformat(), hi.isoformat(), os.getpid())
+                    )
+                    claims.append((cursor.lastrowid, lo, hi))
+            conn.commit()
+        finally:
+            conn.close()
+        return claims, waiting
+
+    def _fetch(self, symbol, start, end):
+        """Fetch the missing ranges of [start, end), waiting for the parts fetched elsewhere."""
+        while True:
+            claims, waiting = self._claim(symbol, start, end)
+            try:
+                for _, lo, hi in claims:
+                    self._fetch_and_store(symbol, lo, hi)
+            finally:
+                with self._connect() as conn:
+                    conn.executemany('DELETE FROM fetching WHERE rowid = ?', [(rowid,) for rowid, _, _ in claims])
+            if not waiting:
+                return
+            # a part another request failed to fetch is claimed by this one on the next pass
+            time.sleep(_CLAIM_POLL)
+
+    def stored(self, symbols, start, end):
+        """Whether [start, end) of every symbol is in the store already (nothing to fetch)."""
+        start, end = _as_date(start), _as_date(end)
+        with self._connect() as conn:
+            return not any(missing_ranges(self._covered(conn, symbol), start, end) for symbol in symbols)
+
+    def history(self, symbol, start, end):
+        """Daily closes of `symbol` in [start, end), fetching only what is not stored yet."""
+        start, end = _as_date(start), _as_date(end)
+        gaps = self._gaps(symbol, start, end)
+        metrics.cache_access('rates', not gaps)
+        if gaps:
+            self._fetch(symbol, start, end)
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT date, close FROM rates WHERE symbol = ? AND date >= ? AND date < ? ORDER BY date',
+                (symbol, start.isoformat(), end.isoformat())
+            ).fetchall()
+        return pd.Series(
+            [close for _, close in rows],
+            index=pd.DatetimeIndex([date for date, _ in rows], name='Date'),
+            name=symbol, dtype='float64'
+        )
+
+    def histories(self, symbols, start, end, report=lambda fraction: None):
+        """`history` for several symbols, fetched concurrently; `report` gets the fraction done."""
+        futures = [self._executor.submit(self.history, symbol, start, end) for symbol in symbols]
+        for i, future in enumerate(as_completed(futures)):
+            future.result()
+            report((i + 1) / len(futures))
+        return [future.result() for future in futures]
+
+
+def fetch_histories(provider, fixtures_dir, path, symbols, start, end, delay=0, report=lambda fraction: None):
+    """Fetch what the store at `path` is missing of `symbols` in [start, end).
+
+    Run as a background job (see jobs.py), so it opens a store of its own.
+    """
+    RateStore(make_provider(provider, fixtures_dir, delay), path).histories(symbols, start, end, report)
@@ -0,0 +1,85 @@
+import os
+import tempfile
+
+# ---- Runtime settings ----
+# Read from environment variables so the same image can run in different modes.
+
+
+def _flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Ship pre-aggregated data to the browser and filter the /customers and /purchases charts
+# in clientside callbacks instead of calling the server on every input change.
+CLIENTSIDE_FILTERING = _flag('DASH_CLIENTSIDE_FILTERING')
+
+# Fit every clustering algorithm on the Iris page in a background process pool at startup.
+CLUSTER_PREWARM = _flag('DASH_CLUSTER_PREWARM', default=True)
+
+# Exchange-rate source: 'yahoo' (yfinance) or 'file', which replays the CSVs in
+# RATES_FIXTURES_DIR (synthetic series for offline development and tests).
+RATES_PROVIDER = os.environ.get('DASH_RATES_PROVIDER', 'yahoo')
+RATES_FIXTURES_DIR = os.environ.get(
+    'DASH_RATES_FIXTURES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'rates')
+)
+# SQLite file holding every exchange rate fetched so far
+RATES_DB = os.environ.get('DASH_RATES_DB', os.path.join(tempfile.gettempdir(), 'dash-rates.sqlite'))
+# Seconds the 'file' provider waits per fetch, to stand in for network latency in load tests
+RATES_FIXTURES_DELAY = float(os.environ.get('DASH_RATES_FIXTURES_DELAY', '0'))
+
+# ---- Background jobs ----
+# Exchange-rate fetches and clustering fits that are not cached run as background jobs
+# (see jobs.py) instead of in the request thread. Job state is kept in JOBS_DIR, at most
+# JOBS_MAX_RUNNING jobs run at a time per server process, a job is killed after JOBS_TIMEOUT
+# seconds, and finished results are reused for JOBS_TTL seconds.
+JOBS_DIR = os.environ.get('DASH_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'dash-jobs'))
+JOBS_MAX_RUNNING = int(os.environ.get('DASH_JOBS_MAX_RUNNING', '2'))
+JOBS_TTL = int(os.environ.get('DASH_JOBS_TTL', '3600'))
+JOBS_TIMEOUT = int(os.environ.get('DASH_JOBS_TIMEOUT', '600'))
+
+# ---- Streaming ingestion ----
+# New customers rows counted into the /customers and /purchases charts while the app runs
+# (see ingest.py): a CSV file being appended to and/or a directory CSV files are dropped
+# into. Off when neither is set.
+INGEST_CSV = os.environ.get('DASH_INGEST_CSV')
+INGEST_DIR = os.environ.get('DASH_INGEST_DIR')
+# Seconds between reads of the sources, and rows added to the aggregates at a time
+INGEST_INTERVAL = float(os.environ.get('DASH_INGEST_INTERVAL', '1'))
+INGEST_CHUNK_ROWS = int(os.environ.get('DASH_INGEST_CHUNK_ROWS', '50000'))
+# How often open pages check for new rows (milliseconds)
+INGEST_REFRESH_MS = int(os.environ.get('DASH_INGEST_REFRESH_MS', '5000'))
+
+# ---- Serving ----
+# `python app.py` runs Flask's development server; production uses gunicorn with wsgi.py
+# (see gunicorn.conf.py).
+DEBUG = _flag('DASH_DEBUG')
+HOST = os.environ.get('DASH_HOST', '0.0.0.0')
+PORT = int(os.environ.get('DASH_PORT', '8050'))
+# Preforked worker processes and request threads per worker
+WORKERS = int(os.environ.get('DASH_WORKERS', os.cpu_count() or 1))
+THREADS = int(os.environ.get('DASH_THREADS', '4'))
+# When the pages load their datasets and models (see lazy.py): 'preload' before serving
+# (under gunicorn before forking, so the workers share one copy), 'background' in a thread
+# once the server is up (faster cold starts, one copy per worker), or 'none' (first request).
+PAGE_WARMUP = os.environ.get('DASH_PAGE_WARMUP', 'background')
+
+# ---- Response encoding ----
+# Send figure data arrays as compact base64 typed arrays and compress JSON responses larger
+# than COMPRESS_MIN_BYTES (brotli if installed and accepted, else gzip). See transport.py.
+TYPED_ARRAYS = _flag('DASH_TYPED_ARRAYS', default=True)
+COMPRESS_RESPONSES = _flag('DASH_COMPRESS_RESPONSES', default=True)
+COMPRESS_MIN_BYTES = int(os.environ.get('DASH_COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_LEVEL = int(os.environ.get('DASH_COMPRESS_LEVEL', '5'))
+
+# ---- Metrics ----
+# Time every callback (compute / figure build / serialization), count payload sizes,
+# exceptions and cache hits, and serve them on /metrics in the Prometheus format. Off by
+# default; see metrics.py.
+METRICS = _flag('DASH_METRICS')
+# Also log one JSON line per callback
+METRICS_LOG = _flag('DASH_METRICS_LOG')
+# Where each server process leaves its metrics for /metrics to merge
+METRICS_DIR = os.environ.get('DASH_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'dash-metrics'))
@@ -0,0 +1,166 @@
+import collections
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# ---- Server-side tables ----
+# A DataTable with page_action, sort_action and filter_action set to 'custom' only holds the
+# visible page; its callback asks a TableEngine for that page of the whole frame. Everything
+# that depends on the full frame is computed once, when the engine is built:
+#
+#   codes     every column factorized with sort=True, so a code is the rank of its value
+#   keys      sort keys per column and direction (blank cells last in both directions)
+#   perms     the rows in the order of each key (one column sorts are a lookup)
+#
+# A filter is evaluated on a column's distinct values and mapped to rows through the codes.
+# Filter masks and the resulting row orders are kept in small LRU caches, so paging through
+# a sorted, filtered table only slices a cached order: a page costs O(page_size) rows and at
+# most MAX_PAGE_SIZE records are sent, whatever the size of the frame.
+
+MAX_PAGE_SIZE = 100
+
+# filter_query operators (DataTable syntax) and the names they are evaluated as
+_OPERATORS = {
+    '=': 'eq', 'eq': 'eq', 'seq': 'eq', 'ieq': 'ieq',
+    '!=': 'ne', 'ne': 'ne', 'sne': 'ne', 'ine': 'ine',
+    '<': 'lt', 'lt': 'lt', '<=': 'le', 'le': 'le',
+    '>': 'gt', 'gt': 'gt', '>=': 'ge', 'ge': 'ge',
+    'contains': 'contains', 'scontains': 'contains', 'icontains': 'icontains',
+    'datestartswith': 'datestartswith',
+}
+_PART = re.compile(r'^\{(?P<column>[^}]+)\}\s*(?P<operator>[<>!=]=?|[a-z]+)\s+(?P<value>.*)$', re.S)
+
+
+def parse_filter(query):
+    """(column, operator, value) parts of a filter_query; parts that don't parse are ignored."""
+    parts = []
+    for part in (query or '').split(' && '):
+        match = _PART.match(part.strip())
+        if match is None or match['operator'] not in _OPERATORS:
+            continue
+        value = match['value'].strip()
+        if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'`':
+            value = value[1:-1]
+        parts.append((match['column'], _OPERATORS[match['operator']], value))
+    return tuple(parts)
+
+
+class _Column:
+    def __init__(self, series):
+        self.numeric = pd.api.types.is_numeric_dtype(series.dtype)
+        codes, uniques = pd.factorize(series, sort=True)
+        self.codes = codes.astype(np.int32)
+        self.values = series.to_numpy(dtype=float) if self.numeric else None
+        self.text = pd.Series(np.asarray(uniques), dtype=object).astype(str)
+        n = len(uniques)
+        blank = self.codes < 0
+        self.keys = {
+            'asc': np.where(blank, n, self.codes).astype(np.int32),
+            'desc': np.where(blank, n, n - 1 - self.codes).astype(np.int32),
+        }
+        self.perms = {direction: np.argsort(key, kind='stable').astype(np.int32)
+                      for direction, key in self.keys.items()}
+
+    def matches(self, operator, value):
+        """Boolean mask of the rows matching `operator value`."""
+        if self.numeric and operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            try:
+                number = float(value)
+            except ValueError:
+                return np.full(len(self.codes), operator == 'ne')
+            compare = {'eq': np.equal, 'ne': np.not_equal, 'lt': np.less,
+                       'le': np.less_equal, 'gt': np.greater, 'ge': np.greater_equal}[operator]
+            return compare(self.values, number)
+        text = self.text
+        if operator in ('ieq', 'ine', 'icontains'):
+            text, value = text.str.lower(), value.lower()
+        if operator in ('contains', 'icontains'):
+            hit = text.str.contains(value, regex=False)
+        elif operator == 'datestartswith':
+            hit = text.str.startswith(value)
+        elif operator in ('eq', 'ieq'):
+            hit = text == value
+        elif operator in ('ne', 'ine'):
+            hit = text != value
+        else:
+            hit = getattr(text, operator)(value)
+        # code -1 (blank) picks the appended False, except for ne: blank is not the value
+        hit = np.append(hit.to_numpy(dtype=bool), operator in ('ne', 'ine'))
+        return hit[self.codes]
+
+
+class _LruCache:
+    def __init__(self, size):
+        self.size = size
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute, name):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+        metrics.cache_access(name, value is not None)
+        if value is None:
+            value = compute()
+            with self._lock:
+                self._items[key] = value
+                if len(self._items) > self.size:
+                    self._items.popitem(last=False)
+        return value
+
+
+class TableEngine:
+    def __init__(self, df, cache_size=64):
+        self.df = df.reset_index(drop=True)
+        self._columns = {col: _Column(self.df[col]) for col in self.df.columns}
+        self._masks = _LruCache(cache_size)
+        self._orders = _LruCache(cache_size)
+
+    def columns(self):
+        """DataTable `columns`, numeric columns typed so their filters compare numbers."""
+        return [{'name': col, 'id': col, **({'type': 'numeric'} if column.numeric else {})}
+                for col, column in self._columns.items()]
+
+    def _mask(self, part):
+        column, operator, value = part
+        return self._masks.get(part, lambda: self._columns[column].matches(operator, value), 'table_filter')
+
+    def _order(self, sort, filters):
+        """Row positions in display order, None for all rows unsorted."""
+        def compute():
+            mask = None
+            for part in filters:
+                mask = self._mask(part) if mask is None else mask & self._mask(part)
+            if not sort:
+                return None if mask is None else np.flatnonzero(mask).astype(np.int32)
+            if len(sort) == 1:
+                column, direction = sort[0]
+                order = self._columns[column].perms[direction]
+            else:
+                # np.lexsort sorts by its last key first
+                order = np.lexsort([self._columns[column].keys[direction] for column, direction in reversed(sort)])
+            return order if mask is None else order[mask[order]]
+        if not sort and not filters:
+            return None
+        return self._orders.get((sort, filters), compute, 'table_order')
+
+    def page(self, page_current, page_size, sort_by=None, filter_query=''):
+        """(records of the page, page count) of the frame sorted by `sort_by` and filtered by
+        `filter_query`, as a DataTable with custom paging, sorting and filtering sends them."""
+        page_size = min(max(int(page_size or 1), 1), MAX_PAGE_SIZE)
+        sort = tuple((s['column_id'], 'desc' if s.get('direction') == 'desc' else 'asc')
+                     for s in sort_by or () if s.get('column_id') in self._columns)
+        filters = tuple(part for part in parse_filter(filter_query) if part[0] in self._columns)
+        order = self._order(sort, filters)
+        total = len(self.df) if order is None else len(order)
+        start = max(int(page_current or 0), 0) * page_size
+        if order is None:
+            rows = self.df.iloc[start:start + page_size]
+        else:
+            rows = self.df.iloc[order[start:start + page_size]]
+        return rows.to_dict('records'), max(-(-total // page_size), 1)
@@ -0,0 +1,165 @@
+import base64
+import gzip
+import json
+
+import numpy as np
+from flask import request
+
+try:
+    import orjson
+except ImportError:  # plotly and the response layer fall back to the json module
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# ---- Typed arrays ----
+# plotly.js decodes `{"dtype": ..., "bdata": <base64>}` wherever a trace expects a data
+# array. Arrays are narrowed losslessly: integral values go in the smallest integer type that
+# holds them and floats exactly representable in float32 as float32. Numeric JSON lists are
+# only replaced when the typed array is shorter than their text.
+
+# shorter numeric lists are left as JSON
+MIN_TYPED_LENGTH = 16
+
+_INT_TYPES = [np.int8, np.uint8, np.int16, np.uint16, np.int32, np.uint32]
+_DTYPE_CODES = {
+    np.dtype(np.int8): 'i1', np.dtype(np.uint8): 'u1',
+    np.dtype(np.int16): 'i2', np.dtype(np.uint16): 'u2',
+    np.dtype(np.int32): 'i4', np.dtype(np.uint32): 'u4',
+    np.dtype(np.float32): 'f4', np.dtype(np.float64): 'f8',
+}
+_CODE_DTYPES = {code: dtype for dtype, code in _DTYPE_CODES.items()}
+
+
+def _smallest_dtype(values):
+    """Smallest dtype that represents `values` exactly (float64 for non-integral data)."""
+    if values.dtype.kind == 'f':
+        if not np.isfinite(values).all() or not (values == np.round(values)).all():
+            narrow = values.astype(np.float32)
+            exact = np.array_equal(narrow, values, equal_nan=True)
+            return np.dtype(np.float32) if exact else values.dtype
+    elif values.dtype.kind not in 'iu':
+        return None
+    if values.size == 0:
+        return np.dtype(np.uint8)
+    low, high = values.min(), values.max()
+    for dtype in _INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.float64)
+
+
+def typed_array(values):
+    """Typed-array spec of a numeric array (or list), losslessly narrowed; None if not numeric."""
+    values = np.asarray(values)
+    if values.ndim != 1 or values.dtype.kind not in 'iuf':
+        return None
+    dtype = _smallest_dtype(values)
+    return {
+        'dtype': _DTYPE_CODES[dtype],
+        'bdata': base64.b64encode(values.astype(dtype).tobytes()).decode('ascii'),
+    }
+
+
+def _is_numeric_list(value):
+    # null is a missing value, sent as NaN in a float array
+    return (
+        len(value) >= MIN_TYPED_LENGTH
+        and all(type(item) in (int, float) or item is None for item in value)
+        and any(item is not None for item in value)
+    )
+
+
+def _compact(value):
+    """`value` with its data arrays replaced by compact typed arrays."""
+    if isinstance(value, list):
+        # nested lists (e.g. 2D z or customdata) are left alone
+        if not _is_numeric_list(value):
+            return value
+        spec = typed_array(np.array(value, dtype=float if None in value else None))
+        # short decimals can be shorter as text than as float64 bytes
+        return spec if spec is not None and len(spec['bdata']) < len(_dumps(value)) else value
+    if isinstance(value, dict):
+        if 'bdata' in value and value.get('dtype') in _CODE_DTYPES and 'shape' not in value:
+            values = np.frombuffer(base64.b64decode(value['bdata']), dtype=_CODE_DTYPES[value['dtype']])
+            return typed_array(values) or value
+        return {key: _compact(item) for key, item in value.items()}
+    return value
+
+
+def compact_output(value):
+    """Compact the trace arrays of a figure or figure Patch returned by a callback."""
+    if not isinstance(value, dict):
+        return value
+    if value.get('__dash_patch_update'):
+        for operation in value.get('operations', []):
+            location = operation.get('location') or []
+            # only an assigned value replaces an array; Extend, Append, Insert and the other
+            # operations need their values as lists
+            if (operation.get('operation') == 'Assign' and location[:1] == ['data']
+                    and 'value' in operation.get('params', {})):
+                operation['params']['value'] = _compact(operation['params']['value'])
+        return value
+    if isinstance(value.get('data'), list) and 'layout' in value:
+        value['data'] = [_compact(trace) for trace in value['data']]
+    return value
+
+
+def _dumps(value):
+    return orjson.dumps(value) if orjson else json.dumps(value, separators=(',', ':')).encode()
+
+
+def compact_response(body):
+    """Re-encode a `_dash-update-component` JSON body with compact figure arrays."""
+    payload = orjson.loads(body) if orjson else json.loads(body)
+    for outputs in payload.get('response', {}).values():
+        for prop, value in outputs.items():
+            outputs[prop] = compact_output(value)
+    return _dumps(payload)
+
+
+# ---- Response compression ----
+# JSON responses above a size threshold are compressed with brotli when the browser accepts
+# it (and the module is installed), otherwise with gzip.
+
+_COMPRESSED_PATHS = ('_dash-update-component', '_dash-layout', '_dash-dependencies')
+
+
+def _accepted_encoding():
+    accepted = request.headers.get('Accept-Encoding', '')
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level)
+
+
+def install(server, typed_arrays=True, min_bytes=1024, level=5):
+    """Register the response layer on the app's Flask server (`min_bytes=None`: no compression)."""
+
+    @server.after_request
+    def encode_response(response):
+        if response.direct_passthrough or response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        if not request.path.endswith(_COMPRESSED_PATHS) or response.mimetype != 'application/json':
+            return response
+        data = response.get_data()
+        if typed_arrays and request.path.endswith('_dash-update-component'):
+            data = compact_response(data)
+        encoding = _accepted_encoding() if min_bytes is not None and len(data) >= min_bytes else None
+        if encoding is not None:
+            data = compress(data, encoding, level)
+            response.headers['Content-Encoding'] = encoding
+        response.headers.add('Vary', 'Accept-Encoding')
+        response.set_data(data)
+        return response
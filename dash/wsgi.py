@@ -0,0 +1,31 @@
+import gc
+import sys
+
+from app import app
+import lazy
+import settings
+
+# ---- WSGI entry point ----
+# gunicorn imports this module once in the master process (preload_app) and then forks the
+# workers. With DASH_PAGE_WARMUP=preload the pages' datasets, aggregate cubes and fitted
+# clusterings are built here, once, and shared copy-on-write instead of once per worker;
+# otherwise each worker loads them itself (see post_fork in gunicorn.conf.py). Run with:
+#
+#     gunicorn -c gunicorn.conf.py wsgi:server
+
+server = app.server
+
+
+def preload():
+    """Finish everything the workers should inherit instead of computing themselves."""
+    lazy.load_all()
+    iris = sys.modules.get('pages.iris')
+    if iris is not None:
+        # a warmup still running in the master would never finish in a forked worker
+        iris.models().cluster_cache.wait()
+    # keep the garbage collector of every worker from touching (and copying) shared objects
+    gc.freeze()
+
+
+if settings.PAGE_WARMUP == 'preload':
+    preload()
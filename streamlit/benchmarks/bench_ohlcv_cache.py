@@ -0,0 +1,116 @@
+"""Concurrent misses on the shared OHLCV cache (ohlcv_cache.py).
+
+For each case, --processes processes ask a fresh cache for the same key at the same time,
+with a fetch that sleeps --delay seconds:
+
+    download      the fetch returns bars
+    empty         the fetch returns an empty frame (an unknown symbol)
+    stale         the entry is stale and the fetch returns the new bars
+    stale error   the entry is stale and the fetch raises
+
+and reports how many times the fetch was called and how long the slowest caller waited.
+Every case must call the fetch once; the script exits with an error otherwise.
+
+    python benchmarks/bench_ohlcv_cache.py
+    python benchmarks/bench_ohlcv_cache.py --processes 16 --delay 2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import ohlcv_cache  # noqa: E402
+from ohlcv_cache import OHLCVCache  # noqa: E402
+
+CASES = ['download', 'empty', 'stale', 'stale error']
+
+
+def _bars(start, n):
+    index = pd.date_range(start, periods=n, freq='D')
+    return pd.DataFrame({'Open': np.arange(n, dtype=float), 'Close': np.arange(n, dtype=float)}, index=index)
+
+
+def _fetch(case, calls, delay):
+    def fetch(symbol, period, interval, start=None):
+        with calls.get_lock():
+            calls.value += 1
+        time.sleep(delay)
+        if case == 'empty':
+            return pd.DataFrame()
+        if case == 'stale error':
+            raise RuntimeError('network down')
+        return _bars('2025-01-01', 300)
+    return fetch
+
+
+def _client(path, case, calls, delay, ready, waits):
+    cache = OHLCVCache(path)
+    ready.wait()
+    t = time.perf_counter()
+    cache.get('AAPL', '1y', '1d', _fetch(case, calls, delay))
+    waits.put(time.perf_counter() - t)
+
+
+def measure(case, processes, delay):
+    path = os.path.join(tempfile.mkdtemp(prefix='ohlcv-bench-'), 'cache.sqlite')
+    if case.startswith('stale'):
+        # an entry fetched long enough ago to be stale
+        cache = OHLCVCache(path)
+        cache.get('AAPL', '1y', '1d', lambda *args, **kwargs: _bars('2025-01-01', 250))
+        with cache._connect() as conn:
+            conn.execute('UPDATE entries SET fetched_at = fetched_at - ?', (ohlcv_cache.INTERVAL_TTL['1d'],))
+
+    calls = multiprocessing.Value('i', 0)
+    ready = multiprocessing.Event()
+    waits = multiprocessing.Queue()
+    clients = [multiprocessing.Process(target=_client, args=(path, case, calls, delay, ready, waits))
+               for _ in range(processes)]
+    for client in clients:
+        client.start()
+    ready.set()
+    for client in clients:
+        client.join()
+    seconds = [waits.get() for _ in range(waits.qsize())]
+    return {
+        'case': case,
+        'processes': processes,
+        'fetches': calls.value,
+        'errors': processes - len(seconds),
+        'slowest_s': round(max(seconds), 2) if seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--delay', type=float, default=1, help='seconds per simulated fetch')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'case':<12} {'processes':>9} {'fetches':>8} {'errors':>7} {'slowest s':>10}")
+    for case in CASES:
+        row = measure(case, args.processes, args.delay)
+        print(f"{case:<12} {row['processes']:>9} {row['fetches']:>8} {row['errors']:>7} {row['slowest_s']:>10}")
+        results.append(row)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    failed = [row['case'] for row in results if row['fetches'] != 1 or row['errors']]
+    if failed:
+        sys.exit(f"expected one fetch and no errors in: {', '.join(failed)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Cold-start cost of each page of the Streamlit app.
+
+Every page is rendered in a fresh interpreter with streamlit's AppTest, three times over:
+
+    no bytecode   no .pyc files to read (like the image before `warmup.py compile`)
+    compiled      .pyc files from `python warmup.py compile`
+    warmed        compiled, and `warmup.warm()` done before the first visit (what
+                  `python warmup.py run` does in the background at server start)
+
+and reports the time to import streamlit and the app, the first render of the page (what
+the first visitor of a new replica waits for, server side) and a second render.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --pages pages/meteorites.py --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = ['pages/home.py', 'pages/graph.py', 'pages/todolist.py', 'pages/meteorites.py']
+MODES = ['no bytecode', 'compiled', 'warmed']
+
+_WORKER = '''
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+import warmup
+imported = time.perf_counter() - started
+warm = None
+if sys.argv[2] == 'warmed':
+    t = time.perf_counter()
+    warmup.warm()
+    warm = time.perf_counter() - t
+at = AppTest.from_file('streamlit_app.py', default_timeout=120)
+at.switch_page(sys.argv[1])
+t = time.perf_counter()
+at.run()
+first = time.perf_counter() - t
+t = time.perf_counter()
+at.run()
+second = time.perf_counter() - t
+print(json.dumps({'import_s': imported, 'warm_s': warm, 'first_render_s': first, 'second_render_s': second,
+                  'errors': len(at.exception)}))
+'''
+
+
+def measure(page, mode):
+    env = dict(os.environ, STREAMLIT_WARMUP='0')
+    command = [sys.executable, '-c', _WORKER, page, mode]
+    if mode == 'no bytecode':
+        # an empty pycache prefix: every module is compiled from source, nothing is written
+        env['PYTHONPYCACHEPREFIX'] = tempfile.mkdtemp(prefix='streamlit-nopyc-')
+        env['PYTHONDONTWRITEBYTECODE'] = '1'
+    out = subprocess.run(command, cwd=APP_DIR, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f'{page} ({mode}) failed:\n{out.stderr}')
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', nargs='+', default=PAGES)
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--repeat', type=int, default=3, help='fresh processes per page and mode (median kept)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    if 'no bytecode' not in args.modes or len(args.modes) > 1:
+        subprocess.run([sys.executable, 'warmup.py', 'compile'], cwd=APP_DIR, check=True)
+
+    results = []
+    print(f"{'page':<22} {'mode':<12} {'import s':>9} {'first render s':>15} {'second render s':>16}")
+    for page in args.pages:
+        for mode in args.modes:
+            runs = sorted((measure(page, mode) for _ in range(args.repeat)), key=lambda run: run['first_render_s'])
+            row = {'page': page, 'mode': mode, **{
+                key: (round(value, 3) if isinstance(value, float) else value)
+                for key, value in runs[len(runs) // 2].items()
+            }}
+            print(f"{page:<22} {mode:<12} {row['import_s']:>9.2f} {row['first_render_s']:>15.3f} "
+                  f"{row['second_render_s']:>16.3f}{'  (errors)' if row['errors'] else ''}")
+            results.append(row)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import profiling
+
+# ---- Meteorite data pipeline ----
+# Cleaning runs once per dataset version (see PIPELINE_VERSION) and returns a compact frame
+# sorted by year, so the page can filter a year range by slicing instead of scanning rows.
+# The returned frame is shared between sessions and must not be modified in place.
+
+# Bump when the cleaning steps change, so cached results from older code are not reused
+PIPELINE_VERSION = 1
+
+COLUMNS = ['name', 'mass (g)', 'year', 'lat', 'lon', 'normalized_mass']
+
+
+def clean_meteorites(raw):
+    """Compact, year-sorted copy of the raw meteorite landings table."""
+    df = raw.rename(columns={'reclat': 'lat', 'reclong': 'lon'})
+    df = df[(df['lat'] != 0) & (df['lon'] != 0)].dropna(subset=['lat', 'lon', 'year'])
+    mass = pd.to_numeric(df['mass (g)'], errors='coerce').fillna(0)
+    df = pd.DataFrame({
+        'name': df['name'],
+        'mass (g)': mass.astype('float32'),
+        'year': df['year'].astype('int16'),
+        'lat': df['lat'].astype('float32'),
+        'lon': df['lon'].astype('float32'),
+        # scatter radius, capped so the heaviest meteorites don't cover the map
+        'normalized_mass': (mass.clip(upper=100000) / 100).astype('float32'),
+    })
+    return df.sort_values('year', kind='stable').reset_index(drop=True)
+
+
+def year_slice(df, start_year, end_year):
+    """Rows of a year-sorted frame with start_year <= year <= end_year (a view, not a copy)."""
+    years = df['year'].to_numpy()
+    lo = np.searchsorted(years, start_year, side='left')
+    hi = np.searchsorted(years, end_year, side='right')
+    return df.iloc[lo:hi]
+
+
+# ---- Level-of-detail pyramid ----
+# For every detail level the landings are binned into a lat/lon grid and counted per
+# (year, cell). A year range then only sums the bins of a contiguous year slice, and the
+# map receives at most one row per grid cell, however many meteorites there are.
+
+# Grid cell size in degrees per detail level, coarsest first
+GRID_LEVELS = {
+    'Continents': 8.0,
+    'Countries': 2.0,
+    'Regions': 0.5,
+}
+# Individual points are only sent when the year range holds at most this many landings
+RAW_POINT_LIMIT = 10_000
+
+_METERS_PER_DEGREE = 111_320
+# height of the busiest cell's column
+_MAX_ELEVATION = 500_000
+
+
+def build_pyramid(df):
+    """Per-level frames of (year, lat, lon, count, mass (g)) bins sorted by year."""
+    pyramid = {}
+    for level, size in GRID_LEVELS.items():
+        bins = pd.DataFrame({
+            'year': df['year'],
+            # cell centers
+            'lat': ((np.floor(df['lat'] / size) + 0.5) * size).astype('float32'),
+            'lon': ((np.floor(df['lon'] / size) + 0.5) * size).astype('float32'),
+            'mass (g)': df['mass (g)'].astype('float64'),
+        })
+        bins = bins.groupby(['year', 'lat', 'lon'], sort=True).agg(
+            count=('mass (g)', 'size'), mass=('mass (g)', 'sum')
+        ).reset_index().rename(columns={'mass': 'mass (g)'})
+        pyramid[level] = bins
+    return pyramid
+
+
+def pyramid_cells(pyramid, level, start_year, end_year):
+    """Grid cells of a detail level with counts and mass sums for a year range.
+
+    Adds `radius` and `elevation` columns in meters for scatter and column layers.
+    """
+    cells = year_slice(pyramid[level], start_year, end_year)
+    cells = cells.groupby(['lat', 'lon'], sort=False)[['count', 'mass (g)']].sum().reset_index()
+    if cells.empty:
+        return cells
+    cell_meters = GRID_LEVELS[level] * _METERS_PER_DEGREE
+    share = cells['count'] / cells['count'].max()
+    cells['radius'] = (0.5 * cell_meters * np.sqrt(share)).astype('float32')
+    cells['elevation'] = (_MAX_ELEVATION * share).astype('float32')
+    cells['mass (g)'] = cells['mass (g)'].round()
+    return cells
+
+
+# ---- Shared loaders ----
+# Cached per process and shared by all sessions. They live here rather than in the page
+# script so warmup.py can fill the caches before the page is first opened.
+
+DATA_FILE = os.path.join('datasets', 'Meteorite_Landings.csv')
+
+
+@profiling.cached(st.cache_resource(show_spinner=False))
+def load_meteorites(filename, mtime, version):
+    """Read and clean the dataset once per file and pipeline version, shared by all sessions."""
+    try:
+        return clean_meteorites(pd.read_csv(filename))
+    except Exception as e:
+        st.error(f"Failed to load CSV: {e}")
+        return pd.DataFrame()
+
+
+@profiling.cached(st.cache_resource(show_spinner=False))
+def load_pyramid(filename, mtime, version):
+    """Binned level-of-detail pyramid of the cleaned dataset."""
+    return build_pyramid(load_meteorites(filename, mtime, version))
@@ -0,0 +1,227 @@
+import bisect
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# ---- Note storage ----
+# Notes live in SQLite (WAL mode), so adding or removing one is a single-row write and
+# concurrent sessions and processes don't overwrite each other. Sessions query the notes
+# they display instead of keeping their own copy of the list.
+#
+# Every write is recorded in a change log that the search indexes catch up from. Only the
+# last MAX_CHANGES entries are kept; an index that is further behind is rebuilt from the
+# notes themselves.
+
+MAX_CHANGES = 10000
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created REAL NOT NULL
+);
+-- change log that search indexes in every process catch up from (the last MAX_CHANGES)
+CREATE TABLE IF NOT EXISTS note_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    note_id INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS note_added AFTER INSERT ON notes BEGIN
+    INSERT INTO note_changes (op, note_id) VALUES ('add', NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS note_removed AFTER DELETE ON notes BEGIN
+    INSERT INTO note_changes (op, note_id) VALUES ('remove', OLD.id);
+END;
+'''
+
+
+class NoteStore:
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            # notes stored before the change log existed
+            conn.execute(
+                "INSERT INTO note_changes (op, note_id) SELECT 'add', id FROM notes "
+                "WHERE NOT EXISTS (SELECT 1 FROM note_changes)"
+            )
+        if legacy_json and os.path.exists(legacy_json):
+            self._import_json(legacy_json)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _trim_log(self, conn):
+        conn.execute(
+            'DELETE FROM note_changes WHERE seq <= (SELECT MAX(seq) FROM note_changes) - ?', (MAX_CHANGES,)
+        )
+
+    def _import_json(self, path):
+        """One-time migration of the old notes.json file (kept as notes.json.imported)."""
+        with open(path, 'r') as file:
+            notes = json.load(file)
+        with self._connect() as conn:
+            if conn.execute('SELECT COUNT(*) FROM notes').fetchone()[0] == 0:
+                now = time.time()
+                conn.executemany(
+                    'INSERT INTO notes (title, content, created) VALUES (?, ?, ?)',
+                    [(note['title'], note['content'], now) for note in notes]
+                )
+                self._trim_log(conn)
+        os.replace(path, path + '.imported')
+
+    def add(self, title, content):
+        """Store a note and return its id."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO notes (title, content, created) VALUES (?, ?, ?)',
+                (title, content, time.time())
+            )
+            self._trim_log(conn)
+            return cursor.lastrowid
+
+    def remove(self, note_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM notes WHERE id = ?', (note_id,))
+            self._trim_log(conn)
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM notes').fetchone()[0]
+
+    def page(self, offset, limit, newest_first=False):
+        """One page of notes as dicts with id, title and content, ordered by creation."""
+        order = 'DESC' if newest_first else 'ASC'
+        with self._connect() as conn:
+            rows = conn.execute(
+                f'SELECT id, title, content FROM notes ORDER BY id {order} LIMIT ? OFFSET ?',
+                (limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_many(self, note_ids):
+        """Notes with the given ids, in the order of `note_ids` (missing ids are skipped)."""
+        if not note_ids:
+            return []
+        placeholders = ', '.join('?' * len(note_ids))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f'SELECT id, title, content FROM notes WHERE id IN ({placeholders})', list(note_ids)
+            ).fetchall()
+        by_id = {row['id']: dict(row) for row in rows}
+        return [by_id[note_id] for note_id in note_ids if note_id in by_id]
+
+    def changes(self, after_seq):
+        """Change-log entries after `after_seq`, with the note text for additions.
+
+        None if some of them were trimmed from the log already (see `snapshot`).
+        """
+        with self._connect() as conn:
+            # one read transaction, so the log isn't trimmed between the two queries
+            conn.execute('BEGIN')
+            last_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM note_changes').fetchone()[0]
+            if after_seq < last_seq - MAX_CHANGES:
+                return None
+            return conn.execute(
+                'SELECT c.seq, c.op, c.note_id, n.title, n.content FROM note_changes c '
+                'LEFT JOIN notes n ON n.id = c.note_id WHERE c.seq > ? ORDER BY c.seq',
+                (after_seq,)
+            ).fetchall()
+
+    def snapshot(self):
+        """(seq, notes): every note, and the last change-log entry they include."""
+        with self._connect() as conn:
+            conn.execute('BEGIN')
+            seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM note_changes').fetchone()[0]
+            rows = conn.execute('SELECT id, title, content FROM notes').fetchall()
+        return seq, [dict(row) for row in rows]
+
+
+# ---- Search index ----
+# An in-memory inverted index from words to note ids. It catches up from the change log on
+# every search, so its cost depends on the changes since the last search, not the number
+# of notes; only an index more than MAX_CHANGES behind is rebuilt from all the notes. The
+# last word of a query also matches as a prefix (search as you type).
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return set(_WORD.findall(text.lower()))
+
+
+class NoteIndex:
+    def __init__(self, store):
+        self.store = store
+        self._postings = {}
+        self._words = []
+        self._note_words = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _add(self, note_id, text):
+        words = tokenize(text)
+        self._note_words[note_id] = words
+        for word in words:
+            ids = self._postings.get(word)
+            if ids is None:
+                ids = self._postings[word] = set()
+                bisect.insort(self._words, word)
+            ids.add(note_id)
+
+    def _remove(self, note_id):
+        for word in self._note_words.pop(note_id, ()):
+            ids = self._postings[word]
+            ids.discard(note_id)
+            if not ids:
+                del self._postings[word]
+                del self._words[bisect.bisect_left(self._words, word)]
+
+    def _rebuild(self):
+        self._seq, notes = self.store.snapshot()
+        self._postings, self._words, self._note_words = {}, [], {}
+        for note in notes:
+            self._add(note['id'], f"{note['title']} {note['content']}")
+
+    def sync(self):
+        """Apply the changes made (by any process) since the last sync."""
+        with self._lock:
+            changes = self.store.changes(self._seq)
+            if changes is None:
+                self._rebuild()
+                changes = self.store.changes(self._seq) or []
+            for change in changes:
+                if change['op'] == 'add' and change['title'] is not None:
+                    self._add(change['note_id'], f"{change['title']} {change['content']}")
+                elif change['op'] == 'remove':
+                    self._remove(change['note_id'])
+                self._seq = change['seq']
+
+    def _prefix_matches(self, prefix):
+        ids = set()
+        i = bisect.bisect_left(self._words, prefix)
+        while i < len(self._words) and self._words[i].startswith(prefix):
+            ids |= self._postings[self._words[i]]
+            i += 1
+        return ids
+
+    def search(self, query, newest_first=False):
+        """Ids of the notes containing every word of `query`, ordered by creation."""
+        words = _WORD.findall(query.lower())
+        if not words:
+            return []
+        self.sync()
+        with self._lock:
+            result = self._prefix_matches(words[-1])
+            for word in words[:-1]:
+                result &= self._postings.get(word, set())
+                if not result:
+                    break
+        return sorted(result, reverse=newest_first)
@@ -0,0 +1,181 @@
+import io
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+# ---- Shared OHLCV cache ----
+# Price histories are kept in a SQLite file so every Streamlit process on the host (and the
+# next deploy) reuses them. Entries go stale after a TTL derived from the bar interval; a
+# stale entry is refreshed by fetching only the bars since its last one. The least recently
+# used entries are evicted once the cache grows beyond its size limit.
+#
+# A refresh is claimed by a row in `refreshing`, so concurrent misses on a key (from any
+# process) download it once: the others serve the stale entry meanwhile, or wait for the
+# download when there is none. If the refresh of a stale entry fails, the stale entry is
+# served and the next request tries again. An empty download (e.g. an unknown symbol) is
+# stored too, and kept for NEGATIVE_TTL seconds at most.
+
+DEFAULT_PATH = os.environ.get('OHLCV_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'ohlcv-cache.sqlite'))
+DEFAULT_MAX_BYTES = int(os.environ.get('OHLCV_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Seconds after which a refresh claim is taken to be abandoned (its process died or hung)
+CLAIM_TIMEOUT = 60
+# Seconds between checks while waiting for another process's download
+CLAIM_POLL = 0.2
+# Seconds before an empty download is tried again
+NEGATIVE_TTL = 60
+
+# Seconds before the newest bar of an entry may have changed
+INTERVAL_TTL = {
+    '1m': 60,
+    '5m': 5 * 60,
+    '15m': 15 * 60,
+    '30m': 30 * 60,
+    '1h': 60 * 60,
+    '4h': 60 * 60,
+    '1d': 60 * 60,
+    '1w': 6 * 60 * 60,
+    '1mo': 24 * 60 * 60,
+}
+
+PERIOD_LENGTH = {
+    '1d': pd.Timedelta(days=1),
+    '5d': pd.Timedelta(days=5),
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10),
+}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS refreshing (
+    key TEXT PRIMARY KEY,
+    started_at REAL NOT NULL
+);
+'''
+
+
+def _to_bytes(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer)
+    return buffer.getvalue()
+
+
+def _from_bytes(data):
+    return pd.read_parquet(io.BytesIO(data))
+
+
+class OHLCVCache:
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def key(symbol, period, interval):
+        return f'{symbol.upper()}|{period}|{interval}'
+
+    def _trim(self, df, period):
+        """Keep only the bars that fall inside `period` before the newest one."""
+        length = PERIOD_LENGTH.get(period)
+        if length is None or df.empty:
+            return df
+        return df[df.index >= df.index[-1] - length]
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute('SELECT key, size FROM entries ORDER BY last_access').fetchall():
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def _lookup(self, key, ttl):
+        """(fetched_at, data) row of `key` or None, and the time of this call's refresh claim.
+
+        The refresh is only claimed (otherwise the claim is None) when the entry is missing or
+        stale and nobody else holds a claim younger than CLAIM_TIMEOUT.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT fetched_at, data FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+            claim = None
+            if row is None or now - row[0] >= ttl:
+                conn.execute('DELETE FROM refreshing WHERE key = ? AND started_at < ?', (key, now - CLAIM_TIMEOUT))
+                inserted = conn.execute('INSERT OR IGNORE INTO refreshing (key, started_at) VALUES (?, ?)', (key, now))
+                claim = now if inserted.rowcount == 1 else None
+            conn.commit()
+        finally:
+            conn.close()
+        return row, claim
+
+    def get(self, symbol, period, interval, fetch):
+        """Price history for the key, using `fetch(symbol, period, interval, start)` on a miss.
+
+        `start` is None for a full download, or the timestamp of the newest cached bar when a
+        stale entry only needs the bars since then. `fetch` returns a DataFrame (possibly empty).
+        """
+        key = self.key(symbol, period, interval)
+        ttl = INTERVAL_TTL.get(interval, 60)
+        while True:
+            row, claim = self._lookup(key, ttl)
+            cached = _from_bytes(row[1]) if row is not None else None
+            if claim is not None:
+                break
+            if cached is not None:
+                # fresh, or stale while another process refreshes it
+                return cached
+            # another process is downloading the entry
+            time.sleep(CLAIM_POLL)
+
+        now = time.time()
+        try:
+            if cached is not None and not cached.empty:
+                try:
+                    # the newest cached bar may have been partial, so it is fetched again
+                    new_bars = fetch(symbol, period, interval, start=cached.index[-1])
+                except Exception:
+                    # serve the stale entry, the next request tries again
+                    return cached
+                df = pd.concat([cached[cached.index < cached.index[-1]], new_bars]) if not new_bars.empty else cached
+                df = self._trim(df[~df.index.duplicated(keep='last')].sort_index(), period)
+            else:
+                df = fetch(symbol, period, interval, start=None)
+
+            # the callers waiting on the claim read the empty frame instead of downloading again
+            fetched_at = now - max(ttl - NEGATIVE_TTL, 0) if df.empty else now
+            data = _to_bytes(df)
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO entries (key, fetched_at, last_access, size, data) VALUES (?, ?, ?, ?, ?)',
+                    (key, fetched_at, now, len(data), data)
+                )
+                self._evict(conn)
+            return df
+        finally:
+            with self._connect() as conn:
+                conn.execute('DELETE FROM refreshing WHERE key = ? AND started_at = ?', (key, claim))
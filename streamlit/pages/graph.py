@@ -1,13 +1,27 @@
 import streamlit as st
-import yfinance as yf
-import plotly.graph_objects as go
 
-@st.cache_data
+import profiling
+from ohlcv_cache import OHLCVCache
+
+@st.cache_resource
+def get_ohlcv_cache():
+    """Disk cache shared by every Streamlit process on the host."""
+    return OHLCVCache()
+
+def fetch_history(symbol, period, interval, start=None):
+    """Download a full period, or only the bars since `start`."""
+    # imported on the first cache miss, not on every cold start
+    import yfinance as yf
+
+    stock_data = yf.Ticker(symbol)
+    if start is None:
+        return stock_data.history(period = period, interval = interval)
+    return stock_data.history(start = start, interval = interval)
+
 def get_stock_data(symbol, period="1y", interval="1d"):
-    """Fetch stock data from Yahoo Finance."""
+    """Fetch stock data from Yahoo Finance through the shared OHLCV cache."""
     try:
-        stock_data = yf.Ticker(symbol)
-        stock_history = stock_data.history(period = period, interval = interval)
+        stock_history = get_ohlcv_cache().get(symbol, period, interval, fetch_history)
         if stock_history.empty:
             return None
 
@@ -32,25 +46,31 @@ time_period = st.selectbox("Select time period:", ["1d", "5d", "1mo", "3mo", "6m
 interval = st.selectbox("Select interval:", ["1m", "5m", "15m", "30m", "1h", "4h", "1d", "1w", "1mo"])
 
 if st.button("Search"):
-    stock_data = get_stock_data(stock_symbol, time_period, interval)
+    with profiling.section("fetch"):
+        stock_data = get_stock_data(stock_symbol, time_period, interval)
     if stock_data is not None:
         st.divider()
         st.write(f"### You selected: {stock_symbol}")
         st.write("## Historical Data")
-        st.dataframe(stock_data)
+        with profiling.section("table"):
+            st.dataframe(stock_data)
 
         try:
             st.divider()
             st.write("## Stock Price Candle Graph")
-            fig = go.Figure(data=[go.Candlestick(
-                x=stock_data.index,
-                open=stock_data['Open'],
-                high=stock_data['High'],
-                low=stock_data['Low'],
-                close=stock_data['Close']
-            )])
-            fig.update_layout(title=f"Candlestick Chart for {stock_symbol}", xaxis_title="Date", yaxis_title="Price")
-            st.plotly_chart(fig)
+            with profiling.section("plotly build"):
+                import plotly.graph_objects as go
+
+                fig = go.Figure(data=[go.Candlestick(
+                    x=stock_data.index,
+                    open=stock_data['Open'],
+                    high=stock_data['High'],
+                    low=stock_data['Low'],
+                    close=stock_data['Close']
+                )])
+                fig.update_layout(title=f"Candlestick Chart for {stock_symbol}", xaxis_title="Date", yaxis_title="Price")
+            with profiling.section("plotly render"):
+                st.plotly_chart(fig)
         except Exception as e:
             st.error(f"Error plotting data: {e}")
     else:
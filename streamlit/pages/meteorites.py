@@ -3,36 +3,31 @@ import pandas as pd
 import pydeck as pdk
 import os
 
-@st.cache_data(show_spinner=False)
-def from_data_file(filename):
-    try:
-        return pd.read_csv(filename)
-    except Exception as e:
-        st.error(f"Failed to load CSV: {e}")
-        return pd.DataFrame()
+import profiling
+from meteorite_data import (
+    DATA_FILE, GRID_LEVELS, PIPELINE_VERSION, RAW_POINT_LIMIT, load_meteorites, load_pyramid, pyramid_cells,
+    year_slice
+)
 
-data_file_path = os.path.join('datasets', 'Meteorite_Landings.csv')
+data_file_path = DATA_FILE
 
 if os.path.exists(data_file_path):
-    df = from_data_file(data_file_path)
-    df.rename(columns={'reclat': 'lat', 'reclong': 'lon'}, inplace=True)
-    df = df[(df['lat'] != 0) & (df['lon'] != 0)].dropna(subset=['lat', 'lon'])
-    df['mass (g)'] = pd.to_numeric(df['mass (g)'], errors='coerce').fillna(0)
+    df = load_meteorites(data_file_path, os.path.getmtime(data_file_path), PIPELINE_VERSION)
 else:
     st.error(f"Dataset not found at {data_file_path}. Please check the file path.")
     df = pd.DataFrame()
 
 if not df.empty:
     st.header("Meteorite Landings Data")
-    st.write("Moving the map may be a bit slow due to the large dataset.")
-    st.write("The tooltip shows the name, mass, and year of the meteorite.")
-
-    df['normalized_mass'] = df['mass (g)'].clip(upper=100000) / 100
+    st.write("Choose the map detail in the sidebar: coarse levels show meteorites binned into grid cells, "
+             "the finest level shows individual landings.")
+    st.write("The tooltip shows the name, mass, and year of the meteorite, or the count and total mass of a cell.")
 
     # Year filter: slider and manual input
     if 'year' in df.columns:
-        min_year = int(df['year'].min())
-        max_year = int(df['year'].max())
+        # the frame is sorted by year
+        min_year = int(df['year'].iloc[0])
+        max_year = int(df['year'].iloc[-1])
 
         st.sidebar.markdown("### Filter by Year Range")
         col1, col2 = st.sidebar.columns(2)
@@ -46,9 +41,21 @@ if not df.empty:
         end_year = max(year_range[1], manual_max)
         if start_year > end_year:
             st.sidebar.warning("Start year must be less than or equal to end year.")
-        df = df[(df['year'] >= start_year) & (df['year'] <= end_year)]
+    else:
+        start_year, end_year = -32768, 32767
+
+    # Level of detail: pre-binned cells, or raw points when the year range is small enough
+    st.sidebar.markdown("### Map Detail")
+    detail_levels = [*GRID_LEVELS, "Individual meteorites"]
+    detail = st.sidebar.select_slider("Detail", detail_levels, value="Countries", key="map_detail")
+    with profiling.section("filter"):
+        points = year_slice(df, start_year, end_year)
+    if detail not in GRID_LEVELS and len(points) > RAW_POINT_LIMIT:
+        st.sidebar.info(f"{len(points):,} landings in this range, showing the finest grid instead. "
+                        f"Narrow the year range to at most {RAW_POINT_LIMIT:,} landings to see individual meteorites.")
+        detail = list(GRID_LEVELS)[-1]
 
-    def get_layers(data):
+    def get_point_layers(data):
         return {
             "Meteorite Landings (Mass-Scaled Scatterplot)": pdk.Layer(
                 "ScatterplotLayer",
@@ -72,7 +79,43 @@ if not df.empty:
             ),
         }
 
-    ALL_LAYERS = get_layers(df)
+    def get_cell_layers(data):
+        return {
+            "Meteorite Landings (Mass-Scaled Scatterplot)": pdk.Layer(
+                "ScatterplotLayer",
+                data=data,
+                get_position=["lon", "lat"],
+                get_color=[200, 30, 0, 160],
+                get_radius="radius",
+                radius_min_pixels=2,
+                radius_max_pixels=50,
+                pickable=True
+            ),
+            "Meteorite Landings (Heatmap)": pdk.Layer(
+                "ColumnLayer",
+                data=data,
+                get_position=["lon", "lat"],
+                get_elevation="elevation",
+                radius=GRID_LEVELS[detail] * 111_320 * 0.4,
+                get_fill_color=[255, 140, 0, 180],
+                pickable=True,
+                extruded=True
+            ),
+        }
+
+    if detail in GRID_LEVELS:
+        pyramid = load_pyramid(data_file_path, os.path.getmtime(data_file_path), PIPELINE_VERSION)
+        with profiling.section("filter"):
+            data = pyramid_cells(pyramid, detail, start_year, end_year)
+        ALL_LAYERS = get_cell_layers(data)
+        tooltip_html = ("<b>Meteorites:</b> {count}<br/>"
+                        "<b>Total mass:</b> {mass (g)} g")
+    else:
+        data = points
+        ALL_LAYERS = get_point_layers(data)
+        tooltip_html = ("<b>Name:</b> {name}<br/>"
+                        "<b>Mass:</b> {mass (g)} g<br/>"
+                        "<b>Year:</b> {year}")
     st.sidebar.title("Map Layers")
     selected_layers = [
         layer
@@ -80,28 +123,29 @@ if not df.empty:
         if st.sidebar.checkbox(layer_name, True)
     ]
 
-    if selected_layers:
-        st.pydeck_chart(
-            pdk.Deck(
-                map_style="mapbox://styles/mapbox/light-v9",
-                initial_view_state={
-                    "latitude": df['lat'].mean(),
-                    "longitude": df['lon'].mean(),
-                    "zoom": 1,
-                    "pitch": 50,
-                },
-                layers=selected_layers,
-                tooltip={
-                    "html": "<b>Name:</b> {name}<br/>"
-                            "<b>Mass:</b> {mass (g)} g<br/>"
-                            "<b>Year:</b> {year}",
-                    "style": {
-                        "backgroundColor": "steelblue",
-                        "color": "white"
+    if data.empty:
+        st.warning("No meteorites in the selected year range.")
+    elif selected_layers:
+        with profiling.section("pydeck"):
+            st.pydeck_chart(
+                pdk.Deck(
+                    map_style="mapbox://styles/mapbox/light-v9",
+                    initial_view_state={
+                        "latitude": float(points['lat'].mean()),
+                        "longitude": float(points['lon'].mean()),
+                        "zoom": 1,
+                        "pitch": 50,
+                    },
+                    layers=selected_layers,
+                    tooltip={
+                        "html": tooltip_html,
+                        "style": {
+                            "backgroundColor": "steelblue",
+                            "color": "white"
+                        }
                     }
-                }
+                )
             )
-        )
     else:
         st.warning("Please select at least one layer above.")
 else:
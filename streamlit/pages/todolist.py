@@ -1,65 +1,81 @@
 import streamlit as st
-import json
-import os
 
-# File to store notes
+import profiling
+from note_store import NoteIndex, NoteStore
+
+# Database storing the notes, shared by all sessions (notes.json is imported on first start)
+NOTES_DB = "notes.sqlite"
 NOTES_FILE = "notes.json"
 
-# Function to load notes from file
-def load_notes():
-    if os.path.exists(NOTES_FILE):
-        with open(NOTES_FILE, "r") as file:
-            return json.load(file)
-    return []
+PAGE_SIZES = (10, 25, 50)
 
-# Function to save notes to file
-def save_notes(notes):
-    with open(NOTES_FILE, "w") as file:
-        json.dump(notes, file)
+@st.cache_resource
+def get_note_store():
+    return NoteStore(NOTES_DB, legacy_json=NOTES_FILE)
 
-def remove_note(index):
-    """Remove a note by index."""
-    if 0 <= index < len(st.session_state["notes"]):
-        st.session_state["notes"].pop(index)
-        save_notes(st.session_state["notes"])
+@st.cache_resource
+def get_note_index():
+    """Search index shared by all sessions of this process."""
+    return NoteIndex(get_note_store())
 
-# Initialize session state for notes
-if "notes" not in st.session_state:
-    st.session_state["notes"] = load_notes()
+store = get_note_store()
 
 st.title("To-Do List")
 
-# Input for new note
-new_title = st.text_input("Note Title:")
-new_note = st.text_area("Note Content:")
+# Input for new note (in a form, so typing doesn't rerun the page)
+with st.form("add_note", clear_on_submit=True):
+    new_title = st.text_input("Note Title:")
+    new_note = st.text_area("Note Content:")
+    submitted = st.form_submit_button("Add Note")
 
 # Button to add the note
-if st.button("Add Note"):
+if submitted:
     if new_title.strip() and new_note.strip():  # Ensure title and content are not empty
-        st.session_state["notes"].append({"title": new_title.strip(), "content": new_note.strip()})
-        save_notes(st.session_state["notes"])  # Save notes to file
+        store.add(new_title.strip(), new_note.strip())
         st.success("Note added!")
     else:
         st.warning("Please enter both a title and content for the note.")
 
-# Sorting options
+# Sorting, search and paging options
 sort_order = st.radio("Sort Notes By:", ("Oldest to Newest", "Newest to Oldest"))
+newest_first = sort_order == "Newest to Oldest"
+query = st.text_input("Search notes:", placeholder="Words from the title or content")
+page_size = st.selectbox("Notes per page:", PAGE_SIZES)
+
+with profiling.section("query"):
+    if query.strip():
+        matches = get_note_index().search(query, newest_first=newest_first)
+        total = len(matches)
+    else:
+        matches = None
+        total = store.count()
+
+page_count = max(1, -(-total // page_size))
+page_number = st.number_input("Page:", min_value=1, max_value=page_count, value=1) if page_count > 1 else 1
+offset = (page_number - 1) * page_size
+
+# Only the notes of the current page are loaded and rendered
+with profiling.section("page fetch"):
+    if matches is None:
+        notes = store.page(offset, page_size, newest_first=newest_first)
+    else:
+        notes = store.get_many(matches[offset:offset + page_size])
 
 # Display the list of notes
-if st.session_state["notes"]:
+if notes:
     st.divider()
     st.subheader("Your Notes:")
-    notes = st.session_state["notes"]
-    if sort_order == "Newest to Oldest":
-        notes = reversed(notes)
-    for i, note in enumerate(notes, start=1):
+    st.caption(f"Page {page_number} of {page_count} ({total} notes)")
+    for i, note in enumerate(notes, start=offset + 1):
         col1, col2 = st.columns([4, 1])
         with col1:
             st.write(f"**{i}. {note['title']}**")
             st.write(note["content"])
         with col2:
-            if st.button("Remove", key=f"remove_{i}"):
-                remove_note(i - 1)
+            if st.button("Remove", key=f"remove_{note['id']}"):
+                store.remove(note["id"])
                 st.rerun()
+elif query.strip():
+    st.info("No notes match your search.")
 else:
     st.info("No notes yet. Add your first note!")
\ No newline at end of file
@@ -0,0 +1,172 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import streamlit as st
+
+# ---- Rerun profiling ----
+# Opt-in timing of Streamlit reruns. `rerun` wraps `pg.run()`, page bodies mark named
+# sections with `section`, and cached loaders wrapped with `cached` count their hits and
+# misses. Timings of the last reruns are kept per page in memory (shared by every session
+# of the process) and shown in a sidebar panel with a JSON export.
+#
+# Only a sample of reruns is timed (PROFILE_SAMPLE_RATE); outside of a timed rerun
+# `section` and `cached` cost one attribute lookup.
+
+ENABLED = os.environ.get('PROFILE_RERUNS', '').lower() in ('1', 'true', 'yes', 'on')
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '1.0'))
+# Show the panel to everyone; otherwise only with ?profile=1 in the URL
+SHOW_PANEL = os.environ.get('PROFILE_PANEL', '1').lower() in ('1', 'true', 'yes', 'on')
+# Reruns kept per page for the rolling statistics
+WINDOW = int(os.environ.get('PROFILE_WINDOW', '200'))
+
+_stats = {}
+_lock = threading.Lock()
+_current = threading.local()
+
+
+class PageStats:
+    def __init__(self):
+        self.reruns = 0
+        self.sections = {}
+        self.cache = {}
+
+    def add(self, timings, cache):
+        self.reruns += 1
+        for name, seconds in timings.items():
+            self.sections.setdefault(name, deque(maxlen=WINDOW)).append(seconds)
+        for name, (hits, misses) in cache.items():
+            total = self.cache.setdefault(name, [0, 0])
+            total[0] += hits
+            total[1] += misses
+
+    def summary(self):
+        sections = {}
+        for name, values in self.sections.items():
+            ms = np.asarray(values) * 1e3
+            sections[name] = {
+                'samples': len(ms),
+                'mean_ms': round(float(ms.mean()), 2),
+                'p50_ms': round(float(np.percentile(ms, 50)), 2),
+                'p95_ms': round(float(np.percentile(ms, 95)), 2),
+                'max_ms': round(float(ms.max()), 2),
+                'last_ms': round(float(ms[-1]), 2),
+            }
+        cache = {
+            name: {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 3)}
+            for name, (hits, misses) in self.cache.items()
+        }
+        return {'reruns': self.reruns, 'sections': sections, 'cache': cache}
+
+
+def _active():
+    return getattr(_current, 'timings', None)
+
+
+@contextmanager
+def section(name):
+    """Time a named part of a page body (only inside a sampled rerun)."""
+    timings = _active()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def cached(decorator):
+    """Apply a Streamlit cache decorator and count its hits and misses.
+
+        @profiling.cached(st.cache_data(ttl=600))
+        def load(...): ...
+    """
+    def wrap(func):
+        computed = threading.local()
+
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            computed.flag = True
+            return func(*args, **kwargs)
+
+        cached_func = decorator(compute)
+
+        @functools.wraps(func)
+        def lookup(*args, **kwargs):
+            if _active() is None:
+                return cached_func(*args, **kwargs)
+            computed.flag = False
+            with section(f'{func.__name__}()'):
+                result = cached_func(*args, **kwargs)
+            hits, misses = _current.cache.setdefault(func.__name__, [0, 0])
+            _current.cache[func.__name__] = [hits, misses + 1] if computed.flag else [hits + 1, misses]
+            return result
+
+        lookup.clear = cached_func.clear
+        return lookup
+
+    return wrap
+
+
+@contextmanager
+def rerun(page):
+    """Time one rerun of `page` (a sampled fraction of them) and record it."""
+    if not ENABLED or _active() is not None or random.random() >= SAMPLE_RATE:
+        yield
+        return
+    _current.timings = {}
+    _current.cache = {}
+    started = time.perf_counter()
+    completed = False
+    try:
+        yield
+        completed = True
+    finally:
+        timings, cache = _current.timings, _current.cache
+        timings['total'] = time.perf_counter() - started
+        del _current.timings, _current.cache
+        # reruns interrupted by st.rerun() or st.stop() are not representative
+        if completed:
+            with _lock:
+                _stats.setdefault(page, PageStats()).add(timings, cache)
+
+
+def summaries():
+    with _lock:
+        return {page: stats.summary() for page, stats in _stats.items()}
+
+
+def panel(page):
+    """Sidebar panel with the rolling statistics of `page` and a JSON export of all pages."""
+    if not ENABLED or not (SHOW_PANEL or st.query_params.get('profile') == '1'):
+        return
+    all_pages = summaries()
+    with st.sidebar.expander('Profiling', expanded=False):
+        stats = all_pages.get(page)
+        if stats is None:
+            st.caption(f'No profiled reruns of this page yet (sample rate {SAMPLE_RATE:.0%}).')
+        else:
+            st.caption(f"{stats['reruns']} profiled reruns, last {WINDOW} kept, sample rate {SAMPLE_RATE:.0%}")
+            st.dataframe(
+                [{'section': name, **values} for name, values in stats['sections'].items()],
+                hide_index=True,
+            )
+            if stats['cache']:
+                st.dataframe(
+                    [{'cache': name, **values} for name, values in stats['cache'].items()],
+                    hide_index=True,
+                )
+        st.download_button(
+            'Export JSON',
+            json.dumps({'pid': os.getpid(), 'pages': all_pages}, indent=2),
+            file_name='rerun-profile.json',
+            mime='application/json',
+        )
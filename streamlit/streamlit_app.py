@@ -1,5 +1,8 @@
 import streamlit as st
 
+import profiling
+import warmup
+
 pages = [
     st.Page("pages/home.py", title="Home", icon=":material/home:"),
     st.Page("pages/graph.py", title="Graphs", icon=":material/monitoring:"),
@@ -9,8 +12,14 @@ pages = [
     #st.Page("pages/customers.py", title="Customers", icon=":material/person:"),
 ]
 
+# imports and shared caches of the other pages load in the background (see warmup.py)
+warmup.start()
+
 pg = st.navigation(pages, position="sidebar", expanded=True)
 
 st.set_page_config(layout="wide")
 
-pg.run()
\ No newline at end of file
+# the first render of each page is logged, reruns are timed when PROFILE_RERUNS is set (see profiling.py)
+with warmup.first_render(pg.title), profiling.rerun(pg.title):
+    pg.run()
+profiling.panel(pg.title)
@@ -0,0 +1,116 @@
+import compileall
+import importlib
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+from contextlib import contextmanager
+
+# ---- Cold start ----
+# Page scripts only run when a page is opened, and the first run in a new process pays for
+# importing pandas, pydeck and plotly and for loading the datasets. To keep that off the
+# first visitors of a new replica:
+#
+#   python warmup.py compile        at image build: precompile the app and its packages
+#                                   (the image sets PYTHONDONTWRITEBYTECODE, so nothing is
+#                                   written at runtime)
+#   python warmup.py run <app> ...  instead of `streamlit run <app> ...`: start the server
+#                                   and warm imports and shared caches in a background thread
+#
+# The first render of every page is timed and logged per process (see `first_render`).
+
+ENABLED = os.environ.get('STREAMLIT_WARMUP', '1').lower() in ('1', 'true', 'yes', 'on')
+
+# Modules the pages import (the graph page imports yfinance and plotly on first use)
+MODULES = ['pandas', 'numpy', 'pydeck', 'plotly.graph_objects', 'yfinance', 'meteorite_data', 'note_store']
+
+log = logging.getLogger(__name__)
+
+_started = None
+_first_renders = {}
+_lock = threading.Lock()
+_process_start = time.time()
+
+
+def precompile(paths=None):
+    """Write .pyc files for the app directory and the installed packages."""
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    ok = True
+    for path in paths or [app_dir, sysconfig.get_paths()['purelib']]:
+        ok = compileall.compile_dir(path, quiet=1, workers=0) and ok
+    return ok
+
+
+def warm():
+    """Import the pages' modules and fill the caches shared by all sessions."""
+    started = time.perf_counter()
+    for name in MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            log.warning('warmup: could not import %s', name)
+    import meteorite_data
+
+    if os.path.exists(meteorite_data.DATA_FILE):
+        path = meteorite_data.DATA_FILE
+        args = (path, os.path.getmtime(path), meteorite_data.PIPELINE_VERSION)
+        meteorite_data.load_meteorites(*args)
+        meteorite_data.load_pyramid(*args)
+    log.info('warmup done in %.2f s', time.perf_counter() - started)
+
+
+def start():
+    """Run `warm` in a background thread, once per process."""
+    global _started
+    with _lock:
+        if not ENABLED or _started is not None:
+            return
+        _started = threading.Thread(target=warm, name='warmup', daemon=True)
+    _started.start()
+
+
+# ---- First render timing ----
+
+@contextmanager
+def first_render(page):
+    """Time the first rerun of `page` in this process and log it."""
+    if page in _first_renders:
+        yield
+        return
+    started = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - started
+    with _lock:
+        if page in _first_renders:
+            return
+        _first_renders[page] = {
+            'seconds': round(seconds, 3),
+            # since the server started (with `warmup.py run`), i.e. how long after a
+            # scale-out the page was ready
+            'uptime_s': round(time.time() - _process_start, 3),
+        }
+    log.info('first render of %s: %.3f s (%.1f s after start)', page, seconds, time.time() - _process_start)
+
+
+def first_renders():
+    with _lock:
+        return dict(_first_renders)
+
+
+if __name__ == '__main__':
+    command = sys.argv[1:2]
+    if command == ['compile']:
+        sys.exit(0 if precompile() else 1)
+    if command != ['run']:
+        sys.exit('usage: python warmup.py compile | run <app.py> [streamlit options]')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s: %(message)s')
+    # before the warmup thread: some of streamlit's imports look at partially imported modules
+    from streamlit.web import cli
+    # the module the app imports, not this __main__ copy, so it sees the warmup as started
+    import warmup
+
+    warmup.start()
+    sys.argv = ['streamlit', *sys.argv[1:]]
+    sys.exit(cli.main())